@@ -1 +1,11 @@
-from .main import create_module, register, unregister
+# main is imported on first use, so that the thin client (module_validator.client)
+# can import this package without loading the registry and the database.
+_MAIN_EXPORTS = ("create_module", "register", "unregister")
+
+
+def __getattr__(name):
+    if name in _MAIN_EXPORTS:
+        from . import main
+
+        return getattr(main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
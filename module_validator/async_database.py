@@ -0,0 +1,326 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from loguru import logger
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .database import (
+    POOL_OPTIONS,
+    CommandEntry,
+    ModuleEntry,
+    RevisionEntry,
+    RoutingTable,
+    _is_memory_database,
+    apply_sqlite_pragmas,
+    migrate,
+    sqlite_pragmas,
+    upsert_statement,
+)
+from .query_stats import get_query_stats
+
+# Async drivers used for the synchronous database URLs in global.yaml.
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def async_url(database_url):
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if url.get_driver_name() in ASYNC_DRIVERS.values() or backend not in ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def get_async_engine(database_url, pool=None, sqlite=None):
+    """Async counterpart of database.get_engine, shared per database URL."""
+    url = async_url(database_url)
+    pragmas = sqlite_pragmas(sqlite)
+    if _is_memory_database(database_url):
+        engine = create_async_engine(url)
+        apply_sqlite_pragmas(engine.sync_engine, pragmas)
+        return engine
+
+    options = {POOL_OPTIONS[key]: value for key, value in (pool or {}).items() if key in POOL_OPTIONS}
+    key = (url.render_as_string(hide_password=False), tuple(sorted(options.items())), pragmas)
+    with _engines_lock:
+        if key not in _engines:
+            logger.debug(f"Creating async engine for {url} with pool options {options}")
+            _engines[key] = create_async_engine(url, **options)
+            apply_sqlite_pragmas(_engines[key].sync_engine, pragmas)
+        return _engines[key]
+
+
+class AsyncRoutingTable(RoutingTable):
+    """RoutingTable whose refreshes run on the event loop of an AsyncDatabase."""
+
+    def __init__(self, db, refresh_interval=1.0):
+        super().__init__(db, refresh_interval)
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        async with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            revision = await self.db.get_revision()
+            if revision is None or revision != self.revision:
+                async with self.db.session() as session:
+                    commands = (await session.scalars(select(CommandEntry))).all()
+                    modules = (await session.scalars(select(ModuleEntry))).all()
+                self.commands = {command.name: command for command in commands}
+                self.modules = {module.name: module for module in modules}
+                self.revision = revision
+            self._next_check = time.monotonic() + self.refresh_interval
+
+    async def get_command(self, name):
+        if time.monotonic() >= self._next_check:
+            await self._refresh()
+        return self.commands.get(name)
+
+    async def get_module(self, name):
+        if time.monotonic() >= self._next_check:
+            await self._refresh()
+        return self.modules.get(name)
+
+    async def resolve(self, command_name):
+        command = await self.get_command(command_name)
+        return command.module_name if command else None
+
+
+class AsyncDatabase:
+    """
+    Database with the same module and command API, for asyncio code.
+
+    Every method is a coroutine running on SQLAlchemy's asyncio extension with an
+    async driver (aiosqlite for SQLite URLs), so lookups made by concurrent
+    commands do not block the event loop. Sessions are scoped the same way as in
+    Database, with `async with db.session():`. Query stats are recorded the
+    same way too, on the engine's sync_engine.
+    """
+
+    engine = None
+
+    def __init__(self, config):
+        logger.debug(f"Connecting to database: {config}")
+        settings = config if isinstance(config, dict) else config.global_config
+        database = settings.get("database") or {}
+        self.engine = get_async_engine(
+            settings["database_url"], database.get("pool"), database.get("sqlite")
+        )
+        self.Session = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        self._current_session = ContextVar(f"async_session_{id(self)}", default=None)
+        self.routes = AsyncRoutingTable(self, database.get("routing_refresh_interval", 1.0))
+        if database.get("stats"):
+            self.enable_stats()
+
+    @property
+    def stats(self):
+        return get_query_stats(self.engine.sync_engine)
+
+    def enable_stats(self):
+        # Row counts of SELECTs are only tracked for Database sessions.
+        return self.stats.enable()
+
+    @asynccontextmanager
+    async def session(self):
+        session = self._current_session.get()
+        if session is not None:
+            yield session
+            return
+
+        session = self.Session()
+        token = self._current_session.set(session)
+        try:
+            yield session
+            await session.commit()
+            if session.info.pop("routes_changed", False):
+                self.routes.invalidate()
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            self._current_session.reset(token)
+            await session.close()
+
+    async def create_tables(self):
+        async with self.engine.begin() as connection:
+            return await connection.run_sync(migrate)
+
+    async def close(self):
+        await self.engine.dispose()
+
+    async def get_revision(self):
+        try:
+            async with self.session() as session:
+                return (
+                    await session.scalar(
+                        select(RevisionEntry.value).where(RevisionEntry.id == 1)
+                    )
+                ) or 0
+        except SQLAlchemyError:
+            return None
+
+    async def _bump_revision(self, session):
+        result = await session.execute(
+            update(RevisionEntry)
+            .where(RevisionEntry.id == 1)
+            .values(value=RevisionEntry.value + 1)
+        )
+        if result.rowcount == 0:
+            session.add(RevisionEntry(id=1, value=1))
+            await session.flush()
+        session.info["routes_changed"] = True
+
+    async def add_module(self, name, version, entry_point, config=None):
+        await self.add_modules(
+            [{"name": name, "version": version, "entry_point": entry_point, "config": config}]
+        )
+
+    async def get_module(self, name):
+        async with self.session() as session:
+            return (
+                await session.scalars(
+                    select(ModuleEntry).where(ModuleEntry.name == name).limit(1)
+                )
+            ).first()
+
+    async def update_module(self, name, version=None, entry_point=None, config=None):
+        values = {
+            key: value
+            for key, value in (("version", version), ("entry_point", entry_point), ("config", config))
+            if value
+        }
+        async with self.session() as session:
+            result = await session.execute(
+                update(ModuleEntry)
+                .where(ModuleEntry.name == name)
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            if result.rowcount:
+                await self._bump_revision(session)
+
+    async def delete_module(self, name):
+        await self.delete_modules([name])
+
+    async def list_modules(self):
+        async with self.session() as session:
+            return (await session.scalars(select(ModuleEntry))).all()
+
+    async def add_modules(self, modules):
+        if not modules:
+            return
+        async with self.session() as session:
+            await session.execute(insert(ModuleEntry), list(modules))
+            await self._bump_revision(session)
+
+    async def upsert_modules(self, modules):
+        if not modules:
+            return
+        async with self.session() as session:
+            await session.execute(
+                *upsert_statement(
+                    self.engine.dialect.name,
+                    ModuleEntry,
+                    modules,
+                    ["version", "entry_point", "config"],
+                )
+            )
+            await self._bump_revision(session)
+
+    async def delete_modules(self, names):
+        async with self.session() as session:
+            result = await session.execute(
+                delete(ModuleEntry).where(ModuleEntry.name.in_(list(names)))
+            )
+            if result.rowcount:
+                await self._bump_revision(session)
+            return result.rowcount
+
+    async def add_command(self, name, module_name, description=None):
+        await self.add_commands(
+            [{"name": name, "module_name": module_name, "description": description}]
+        )
+
+    async def get_command(self, name):
+        async with self.session() as session:
+            return (
+                await session.scalars(
+                    select(CommandEntry).where(CommandEntry.name == name).limit(1)
+                )
+            ).first()
+
+    async def update_command(self, name, module_name=None, description=None):
+        values = {
+            key: value
+            for key, value in (("module_name", module_name), ("description", description))
+            if value
+        }
+        async with self.session() as session:
+            result = await session.execute(
+                update(CommandEntry)
+                .where(CommandEntry.name == name)
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            if result.rowcount:
+                await self._bump_revision(session)
+
+    async def delete_command(self, name):
+        await self.delete_commands([name])
+
+    async def list_commands(self):
+        async with self.session() as session:
+            return (await session.scalars(select(CommandEntry))).all()
+
+    async def list_module_commands(self, module_name):
+        async with self.session() as session:
+            return (
+                await session.scalars(
+                    select(CommandEntry.name)
+                    .where(CommandEntry.module_name == module_name)
+                    .order_by(CommandEntry.name)
+                )
+            ).all()
+
+    async def delete_module_commands(self, module_name):
+        async with self.session() as session:
+            result = await session.execute(
+                delete(CommandEntry).where(CommandEntry.module_name == module_name)
+            )
+            if result.rowcount:
+                await self._bump_revision(session)
+            return result.rowcount
+
+    async def add_commands(self, commands):
+        if not commands:
+            return
+        async with self.session() as session:
+            await session.execute(insert(CommandEntry), list(commands))
+            await self._bump_revision(session)
+
+    async def upsert_commands(self, commands):
+        if not commands:
+            return
+        async with self.session() as session:
+            await session.execute(
+                *upsert_statement(
+                    self.engine.dialect.name, CommandEntry, commands, ["module_name", "description"]
+                )
+            )
+            await self._bump_revision(session)
+
+    async def delete_commands(self, names):
+        async with self.session() as session:
+            result = await session.execute(
+                delete(CommandEntry).where(CommandEntry.name.in_(list(names)))
+            )
+            if result.rowcount:
+                await self._bump_revision(session)
+            return result.rowcount
@@ -40,12 +40,24 @@ def update_setup_py(module_name, module_path):
 
 
 def add_command(db):
-    name = input("Enter command name: ").strip()
-    module_name = input("Enter module name: ").strip()
-    description = input("Enter command description (optional): ").strip()
+    commands = {}
+    while True:
+        name = input("Enter command name (leave empty to finish): ").strip()
+        if not name:
+            break
+        if name in commands or db.get_command(name) is not None:
+            overwrite = input(f"Command '{name}' already exists. Overwrite? (y/n): ")
+            if overwrite.strip().lower() != "y":
+                print(f"Skipped command '{name}'.")
+                continue
+        module_name = input("Enter module name: ").strip()
+        description = input("Enter command description (optional): ").strip()
+        commands[name] = {"name": name, "module_name": module_name, "description": description or None}
 
-    db.add_command(name, module_name, description)
-    print(f"Command '{name}' added successfully.")
+    # Written in one transaction; only commands confirmed above are overwritten.
+    db.upsert_commands(list(commands.values()))
+    for name in commands:
+        print(f"Command '{name}' added successfully.")
 
 
 def list_commands(db):
@@ -64,12 +76,41 @@ def delete_command(db):
     print(f"Command '{name}' deleted.")
 
 
-def register_module():
-    module_name = input("Enter the name of the module to register: ").strip()
-    if not module_name:
+def register_module(db):
+    module_names = [
+        name.strip()
+        for name in input("Enter the names of the modules to register (comma separated): ").split(",")
+        if name.strip()
+    ]
+    if not module_names:
         print("Module name cannot be empty.")
         return
 
+    modules = [
+        {"name": module_name, "version": None, "entry_point": register_module_files(module_name)}
+        for module_name in module_names
+    ]
+
+    with open("setup.py", "r") as file:
+        original_setup = file.read()
+    try:
+        # The database is written first and only committed once every setup.py
+        # edit succeeded; on any failure setup.py is restored.
+        with db.session():
+            db.upsert_modules(modules)
+            for module in modules:
+                if not update_setup_py(module["name"], module["entry_point"]):
+                    raise RuntimeError(f"Failed to update setup.py for module {module['name']}")
+                print(f"Updated setup.py with new module: {module['name']}")
+    except Exception as e:
+        with open("setup.py", "w") as file:
+            file.write(original_setup)
+        print(f"{e}; no modules were registered.")
+        return
+    print(f"Registered modules: {', '.join(module_names)}")
+
+
+def register_module_files(module_name):
     custom_module = input("Is this a custom module? (y/n): ").strip().lower() == "y"
     print(custom_module)
     if custom_module:
@@ -81,14 +122,7 @@ def register_module():
         os.makedirs(module_dir, exist_ok=True)
         print(f"Find the module file  {module_file}")
 
-    module_path = f"module_validator.modules.{module_name}.{module_name}:process"
-
-    # Update setup.py
-    if update_setup_py(module_name, module_path):
-        print(f"Updated setup.py with new module: {module_name}")
-    else:
-        print("Failed to update setup.py")
-        return
+    return f"module_validator.modules.{module_name}.{module_name}:process"
 
 
 def run_module():
@@ -106,9 +140,10 @@ def main():
         print("1. Add command")
         print("2. List commands")
         print("3. Delete command")
-        print("4. Exit")
+        print("4. Register modules")
+        print("5. Exit")
 
-        choice = input("Enter your choice (1-4): ").strip()
+        choice = input("Enter your choice (1-5): ").strip()
 
         if choice == "1":
             add_command(db)
@@ -117,6 +152,8 @@ def main():
         elif choice == "3":
             delete_command(db)
         elif choice == "4":
+            register_module(db)
+        elif choice == "5":
             break
         else:
             print("Invalid choice. Please try again.")
@@ -0,0 +1,119 @@
+"""
+Thin client for the inference daemon.
+
+This module only imports the standard library, so forwarding a command to a
+running daemon does not pay for SQLAlchemy, the registry or the modules.
+Without a daemon the command runs in-process through module_validator.main,
+which is only imported then.
+"""
+import ast
+import asyncio
+import base64
+import json
+import os
+import sys
+import tempfile
+from typing import Any, Dict
+
+DEFAULT_SOCKET_PATH = os.getenv(
+    "MODULE_VALIDATOR_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"module_validator-{os.getuid()}.sock"),
+)
+# Audio payloads are passed as base64 strings, so lines can get large.
+STREAM_LIMIT = 64 * 1024 * 1024
+# Seconds to wait for the daemon to accept a connection, and for the answer to
+# a request. A hung daemon fails the command instead of blocking it forever.
+CONNECT_TIMEOUT = 2.0
+REQUEST_TIMEOUT = float(os.getenv("MODULE_VALIDATOR_REQUEST_TIMEOUT", "300"))
+# Commands that always run in the calling process.
+LOCAL_COMMANDS = ("daemon", "modules", "stats", "config")
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("utf-8")
+    return str(value)
+
+
+def parse_params(text: str) -> Dict[str, Any]:
+    """Parses the params argument, a Python dict literal such as "{'task_string': 'en-fr'}"."""
+    params = ast.literal_eval(text)
+    if not isinstance(params, dict):
+        raise ValueError(f"params must be a dict, not {type(params).__name__}")
+    return params
+
+
+async def send_request(
+    request: Dict[str, Any], socket_path: str = None, timeout: float = None
+) -> Dict[str, Any]:
+    """
+    Sends one request to the daemon and returns its response. Raises
+    asyncio.TimeoutError if the daemon does not accept the connection within
+    CONNECT_TIMEOUT seconds or answer within `timeout` (REQUEST_TIMEOUT).
+    """
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_unix_connection(socket_path or DEFAULT_SOCKET_PATH, limit=STREAM_LIMIT),
+        CONNECT_TIMEOUT,
+    )
+    try:
+        writer.write(json.dumps(request, default=_encode).encode() + b"\n")
+        await writer.drain()
+        line = await asyncio.wait_for(
+            reader.readline(), REQUEST_TIMEOUT if timeout is None else timeout
+        )
+        return json.loads(line)
+    finally:
+        writer.close()
+
+
+async def is_running(socket_path: str = None) -> bool:
+    socket_path = socket_path or DEFAULT_SOCKET_PATH
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        response = await send_request({"op": "ping"}, socket_path, timeout=CONNECT_TIMEOUT)
+    except (ConnectionError, FileNotFoundError, ValueError, asyncio.TimeoutError):
+        return False
+    return response.get("result") == "pong"
+
+
+async def forward_command(command_name, data, params, socket_path: str = None):
+    response = await send_request(
+        {"op": "execute", "command": command_name, "data": data, "params": params},
+        socket_path,
+    )
+    if "error" in response:
+        print(f"Daemon error: {response['error']}")
+    else:
+        print(f"Command '{command_name}' executed. Result: {response['result']}")
+    return response
+
+
+async def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command and command not in LOCAL_COMMANDS and await is_running():
+        data = sys.argv[2] if len(sys.argv) > 2 else ""
+        try:
+            params = parse_params(sys.argv[3]) if len(sys.argv) > 3 else {}
+        except (ValueError, SyntaxError) as e:
+            print(f"Invalid params {sys.argv[3]!r}: {e}")
+            return 1
+        try:
+            response = await forward_command(command, data, params)
+        except asyncio.TimeoutError:
+            print(f"The daemon did not answer within {REQUEST_TIMEOUT:g} seconds")
+            return 1
+        return 1 if "error" in response else 0
+
+    from module_validator.main import main as run_locally
+
+    return await run_locally()
+
+
+def cli():
+    """Entry point of the module_validator console script."""
+    sys.exit(asyncio.run(main()))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1 @@
+from .inference_module_config import Config
@@ -1,55 +1,68 @@
-import json
 import argparse
-from pydantic import BaseModel
-from typing import Dict, Any, Union, TypeVar, List
+from pydantic import BaseModel, PrivateAttr
+from typing import Dict, Any, Mapping, Optional, Union, TypeVar
+
+from module_validator.config.layered_config import LayeredConfig
 
 T = TypeVar("T")
 
 
 class GenericConfig(BaseModel):
+    """
+    Base of the subnet configs. The values an instance is created with form
+    its yaml layer; _parse_env and _parse_args add the env and cli layers on
+    top, and _get resolves dotted keys through them (see LayeredConfig). All
+    of this is per instance, so subnet configs do not share state.
+    Assigning a field replaces it in the yaml layer as well, so attribute
+    access and _get agree.
+    """
+
     config: Dict[str, T] = {}
+    _layers: LayeredConfig = PrivateAttr(default_factory=LayeredConfig)
 
-    @classmethod
-    def __init__(cls, data: Union[BaseModel, Dict[str, Any]]):
-        config_data = data.model_dump() if isinstance(data, BaseModel) else data
+    def __init__(self, data: Union[BaseModel, Dict[str, Any], None] = None, **kwargs):
+        if isinstance(data, BaseModel):
+            config_data = data.model_dump()
+        else:
+            config_data = {**(data or {}), **kwargs}
         super().__init__(**config_data)
-        cls.config = cls._merge(config_data, cls.config) if cls.config else config_data
+        self._layers = LayeredConfig(yaml=config_data)
 
-    @classmethod
-    def _get(cls, key: str, default: Any = None) -> Any:
-        keys = key.split(".")
-        value = cls.config
-        for k in keys:
-            if isinstance(value, dict):
-                value = value.get(k)
-            else:
-                return default
-            if value is None:
-                return default
-        return value
+    def __setattr__(self, name: str, value: Any):
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:
+            value = getattr(self, name)
+            if isinstance(value, BaseModel):
+                value = value.model_dump()
+            self._layers = self._layers.with_layer(
+                "yaml", {**self._layers.layer("yaml"), name: value}
+            )
 
-    @classmethod
-    def _set(cls, key: str, value: Any):
-        keys = key.split(".")
-        d = cls.config
-        for k in keys[:-1]:
-            if k not in d or not isinstance(d[k], dict):
-                d[k] = {}
-            d = d[k]
-        d[keys[-1]] = value
+    def _get(self, key: str, default: Any = None) -> Any:
+        return self._layers.get(key, default)
 
-    @classmethod
+    def _set(self, key: str, value: Any, layer: str = "cli"):
+        self._layers = self._layers.set(key, value, layer)
+
+    def _merge_layer(self, new_config: Mapping[str, Any], layer: str = "yaml") -> LayeredConfig:
+        """Merges `new_config` into one layer; dicts it does not touch are shared, not copied."""
+        self._layers = self._layers.with_layer(
+            layer, self._merge(new_config, self._layers.layer(layer))
+        )
+        return self._layers
+
+    @staticmethod
     def _merge(
-        cls, new_config: Dict[str, Any], old_config: Dict[str, Any]
+        new_config: Mapping[str, Any], old_config: Mapping[str, Any]
     ) -> Dict[str, Any]:
-        merged_config = old_config.copy()
+        merged_config = dict(old_config)
         for key, value in new_config.items():
             if (
-                isinstance(value, dict)
+                isinstance(value, Mapping)
                 and key in merged_config
-                and isinstance(merged_config[key], dict)
+                and isinstance(merged_config[key], Mapping)
             ):
-                merged_config[key] = cls._merge(value, merged_config[key])
+                merged_config[key] = GenericConfig._merge(value, merged_config[key])
             else:
                 merged_config[key] = value
         return merged_config
@@ -62,11 +75,11 @@ class GenericConfig(BaseModel):
         config._parse_args(args)
         return config
 
-    @classmethod
-    def _parse_args(cls, args: argparse.Namespace):
-        for arg, value in vars(args).items():
-            if value is not None:
-                cls._set(arg, value)
+    def _parse_args(self, args: argparse.Namespace):
+        self._merge_layer(LayeredConfig.from_args(args), "cli")
+
+    def _parse_env(self, prefix: str, environ: Optional[Mapping[str, str]] = None):
+        self._merge_layer(LayeredConfig.from_env(prefix, environ), "env")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,68 @@
+from typing import Any, Dict, Mapping
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, ConfigView):
+        return value
+    if isinstance(value, Mapping):
+        return ConfigView(value)
+    return value
+
+
+class ConfigView(dict):
+    """
+    Read-only configuration mapping, built once when the configuration is
+    (re)loaded.
+
+    Nested sections are ConfigViews too, and get() also takes dotted keys:
+    view.get("model.batch_size") is a single lookup in a flattened index of
+    every path of the tree, built bottom-up from the sections' own indexes.
+    Lists are left as they are. Use to_dict() for a mutable copy.
+    """
+
+    __slots__ = ("_flat",)
+
+    def __init__(self, data: Mapping = ()):
+        super().__init__((key, _freeze(value)) for key, value in dict(data or ()).items())
+        flat = {}
+        for key, value in dict.items(self):
+            if isinstance(value, ConfigView):
+                for path, item in value._flat.items():
+                    flat[f"{key}.{path}"] = item
+            flat[key] = value
+        self._flat = flat
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self._flat.get(key, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            key: value.to_dict() if isinstance(value, ConfigView) else value
+            for key, value in self.items()
+        }
+
+    def __reduce__(self):
+        return (ConfigView, (self.to_dict(),))
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("ConfigView is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+
+def diff_views(old: ConfigView, new: ConfigView) -> ConfigView:
+    """
+    The parts of `new` that differ from `old`, nested like the configs.
+    Keys that were removed map to None.
+    """
+    changes = {}
+    for key in old.keys() | new.keys():
+        before, after = dict.get(old, key), dict.get(new, key)
+        if before == after:
+            continue
+        if isinstance(before, ConfigView) and isinstance(after, ConfigView):
+            changes[key] = diff_views(before, after)
+        else:
+            changes[key] = after
+    return ConfigView(changes)
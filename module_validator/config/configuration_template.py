@@ -21,8 +21,7 @@ class Config(GenericConfig):
         self._set(key, value)
         
     def merge(self, new_config: Dict[str, T]) -> Dict[str, Any]:
-        self.config = self._merge(new_config, self.config)
-        return self.config
+        return self._merge_layer(new_config).to_dict()
 
     def load_config(self, parser: argparse.ArgumentParser, args: argparse.Namespace) -> 'Config':
         return self._load_config(parser, args)
@@ -37,7 +36,7 @@ class Config(GenericConfig):
         lines = [
         """{{{environment_generation}}}"""
         ]
-        return self._add_env(self.config)
+        return self._add_env(self._layers.to_dict())
 
     def add_args(self, parser: argparse.ArgumentParser) -> argparse.ArgumentParser:
         """{{{argument_generation}}}"""
@@ -1,50 +1,297 @@
+import hashlib
 import os
+import pickle
+import tempfile
+import threading
 import yaml
-from typing import Dict, Any, List
+from typing import Callable, Dict, Any, List, Optional
 from loguru import logger
 
+from module_validator.config.config_view import ConfigView, diff_views
+from module_validator.entry_points import CACHE_DIR
+
+SNAPSHOT_VERSION = 1
+
+
+def _write_pickle(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
 
 class Config:
-    def __init__(self, config_dir: str = None):
+    """
+    Global and per-module configuration of one environment, read from
+    `{config_dir}/{environment}/*.yaml`.
+
+    Parsed configs are saved in a compiled snapshot in the cache directory,
+    keyed on the mtimes of the environment directory and its YAML files, so
+    later loads read one pickle instead of parsing YAML. Any change to the
+    YAML files invalidates it; `compile` rebuilds it ahead of time.
+
+    Lazy mode (one-shot commands) loads the snapshot as well when it is up to
+    date. When it is stale, load_configs only parses global.yaml, and a
+    module's file is parsed the first time its config is asked for, then
+    memoized, so processes that serve a single module do not pay for the other
+    modules' files. Lazy mode never writes the snapshot.
+
+    get_config returns a ConfigView of the merged global and module config,
+    computed once per module and recomputed only when the configuration is
+    reloaded (or global_config / module_configs are replaced).
+
+    check_for_changes re-parses only the YAML files whose mtime changed since
+    they were loaded, and calls the callbacks subscribed to a module with the
+    keys of its merged config that changed, as callback(module_name, changes).
+    watch runs it periodically in a background thread.
+    """
+
+    def __init__(self, config_dir: str = None, snapshot: bool = True, lazy: bool = False):
         logger.info("Loading configuration...")
         self.config_dir = config_dir or "module_validator/config/"
         self.environment = os.getenv("MODULE_VALIDATOR_ENV", "development")
+        self.snapshot = snapshot
+        self.lazy = lazy
+        self._views = {}
         self.global_config = {}
         self.module_configs = {}
+        self._sources = None
+        # mtime of every YAML file the current configuration was parsed from.
+        self._mtimes = {}
+        self._subscribers: Dict[Optional[str], List[Callable]] = {}
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def global_config(self) -> Dict[str, Any]:
+        return self._global_config
+
+    @global_config.setter
+    def global_config(self, value: Dict[str, Any]):
+        self._global_config = value
+        self._views = {}
+
+    @property
+    def module_configs(self) -> Dict[str, Dict[str, Any]]:
+        return self._module_configs
+
+    @module_configs.setter
+    def module_configs(self, value: Dict[str, Dict[str, Any]]):
+        self._module_configs = value
+        self._views = {}
+
+    @property
+    def env_dir(self) -> str:
+        return os.path.join(self.config_dir, self.environment)
+
+    @property
+    def snapshot_path(self) -> str:
+        key = hashlib.sha1(os.path.abspath(self.env_dir).encode()).hexdigest()[:12]
+        return os.path.join(CACHE_DIR, f"config-{self.environment}-{key}.pickle")
 
     def load_configs(self):
         logger.info(f"Loading configuration for environment '{self.environment}'...")
 
-        env_dir = os.path.join(self.config_dir, self.environment)
+        env_dir = self.env_dir
         logger.debug(f"Environment directory: {env_dir}")
         if not os.path.exists(env_dir):
             raise ValueError(
                 f"Configuration for environment '{self.environment}' not found."
             )
 
-        # Load global config
-        global_config_path = os.path.join(env_dir, "global.yaml")
-        if os.path.exists(global_config_path):
-            with open(global_config_path, "r") as f:
-                self.global_config = yaml.safe_load(f)
+        if self.snapshot and self._load_snapshot():
+            return
+        if self.lazy:
+            self._parse_global_config()
+            return
+        self._parse_configs()
+        if self.snapshot:
+            self._write_snapshot()
+
+    def compile(self) -> str:
+        """Parses the YAML files and writes the snapshot. Returns its path."""
+        if not os.path.exists(self.env_dir):
+            raise ValueError(
+                f"Configuration for environment '{self.environment}' not found."
+            )
+        self._parse_configs()
+        self._write_snapshot()
+        return self.snapshot_path
+
+    def _parse_configs(self):
+        env_dir = self.env_dir
+        # Taken before parsing, so that a file changed meanwhile invalidates the snapshot.
+        files = sorted(filename for filename in os.listdir(env_dir) if filename.endswith(".yaml"))
+        self._sources = (files, self._fingerprint(files))
+
+        self._parse_global_config()
 
         # Load module-specific configs
-        for filename in os.listdir(env_dir):
-            if filename.endswith(".yaml") and filename != "global.yaml":
+        module_configs = {}
+        for filename in files:
+            if filename != "global.yaml":
                 module_name = filename[:-5]  # Remove '.yaml' from the end
-                with open(os.path.join(env_dir, filename), "r") as f:
-                    self.module_configs[module_name] = yaml.safe_load(f)
+                module_configs[module_name] = self._parse_module_config(module_name)
+        self.module_configs = module_configs
+
+    def _mtime(self, filename: str) -> Optional[int]:
+        try:
+            return os.stat(os.path.join(self.env_dir, filename)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _parse_global_config(self):
+        global_config_path = os.path.join(self.env_dir, "global.yaml")
+        self._mtimes["global.yaml"] = self._mtime("global.yaml")
+        if os.path.exists(global_config_path):
+            with open(global_config_path, "r") as f:
+                self.global_config = yaml.safe_load(f) or {}
+
+    def _parse_module_config(self, module_name: str) -> Dict[str, Any]:
+        if os.path.basename(module_name) != module_name:
+            return {}
+        filename = f"{module_name}.yaml"
+        self._mtimes[filename] = self._mtime(filename)
+        try:
+            with open(os.path.join(self.env_dir, filename), "r") as f:
+                return yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            return {}
+
+    def _fingerprint(self, filenames: List[str]) -> Optional[Dict[str, int]]:
+        # The directory mtime changes when a YAML file is added or removed.
+        paths = [self.env_dir] + [os.path.join(self.env_dir, filename) for filename in filenames]
+        try:
+            return {path: os.stat(path).st_mtime_ns for path in paths}
+        except FileNotFoundError:
+            return None
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = pickle.load(f)
+            if (
+                snapshot.get("version") != SNAPSHOT_VERSION
+                or self._fingerprint(snapshot["files"]) != snapshot["fingerprint"]
+            ):
+                return False
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError, TypeError):
+            return False
+        logger.debug(f"Loaded configuration snapshot {self.snapshot_path}")
+        self.global_config = snapshot["global_config"]
+        self.module_configs = snapshot["module_configs"]
+        self._mtimes = {
+            filename: snapshot["fingerprint"][os.path.join(self.env_dir, filename)]
+            for filename in snapshot["files"]
+        }
+        return True
+
+    def _write_snapshot(self):
+        files, fingerprint = self._sources
+        if fingerprint is None:
+            return
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "files": files,
+            "fingerprint": fingerprint,
+            "global_config": self.global_config,
+            "module_configs": self.module_configs,
+        }
+        try:
+            _write_pickle(self.snapshot_path, snapshot)
+        except OSError as e:
+            logger.warning(f"Could not write configuration snapshot {self.snapshot_path}: {e}")
+
+    def subscribe(self, module_name: Optional[str], callback: Callable):
+        """Calls callback(module_name, changes) when the config of a module (None: global) changes."""
+        callbacks = self._subscribers.setdefault(module_name, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self, module_name: Optional[str], callback: Callable):
+        callbacks = self._subscribers.get(module_name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    def check_for_changes(self) -> Dict[Optional[str], ConfigView]:
+        """
+        Re-parses the YAML files that changed and notifies the subscribers.
+        Returns the changed keys of every subscribed module.
+        """
+        filenames = set(self._mtimes)
+        if not self.lazy:
+            try:
+                filenames.update(f for f in os.listdir(self.env_dir) if f.endswith(".yaml"))
+            except FileNotFoundError:
+                return {}
+        changed = [f for f in sorted(filenames) if self._mtime(f) != self._mtimes.get(f)]
+        if not changed:
+            return {}
+
+        with self._reload_lock:
+            before = {name: self.get_config(name) for name in self._subscribers}
+            for filename in changed:
+                logger.info(f"Reloading configuration file {filename}")
+                if filename == "global.yaml":
+                    self._parse_global_config()
+                else:
+                    module_name = filename[:-5]
+                    self._module_configs[module_name] = self._parse_module_config(module_name)
+                    self._views = {}
+            changes = {}
+            for name, old in before.items():
+                diff = diff_views(old, self.get_config(name))
+                if diff:
+                    changes[name] = diff
+
+        for name, diff in changes.items():
+            for callback in list(self._subscribers.get(name, [])):
+                try:
+                    callback(name, diff)
+                except Exception as e:
+                    logger.warning(f"Config subscriber of {name or 'global'} failed: {e}")
+        return changes
+
+    def watch(self, interval: float = 2.0) -> threading.Thread:
+        """Checks for changed configuration files every `interval` seconds until stop_watching."""
+        if self._watcher is not None:
+            return self._watcher
+
+        def run():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.check_for_changes()
+                except Exception as e:
+                    logger.warning(f"Error checking configuration for changes: {e}")
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=run, name="config-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self):
+        self._stop_watching.set()
+        self._watcher = None
 
     def get_global_config(self) -> Dict[str, Any]:
         return self.global_config
 
     def get_module_config(self, module_name: str) -> Dict[str, Any]:
+        if self.lazy and module_name not in self.module_configs:
+            self.module_configs[module_name] = self._parse_module_config(module_name)
         return self.module_configs.get(module_name, {})
 
     def get_config(self, module_name: str = None) -> Dict[str, Any]:
-        if module_name:
-            return {**self.global_config, **self.get_module_config(module_name)}
-        return self.global_config
+        view = self._views.get(module_name)
+        if view is None:
+            if module_name:
+                merged = {**self.global_config, **self.get_module_config(module_name)}
+            else:
+                merged = self.global_config
+            view = self._views[module_name] = ConfigView(merged)
+        return view
 
     def get_requirements(self, module_name: str = None) -> List[str]:
         global_reqs = self.global_config.get("global_requirements", [])
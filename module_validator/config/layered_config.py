@@ -0,0 +1,167 @@
+import argparse
+import os
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import yaml
+
+# Layer names, from the lowest to the highest priority.
+LAYERS = ("defaults", "yaml", "env", "cli")
+
+_MISSING = object()
+
+
+def _walk(mapping: Mapping, keys: Tuple[str, ...]) -> Any:
+    value = mapping
+    for key in keys:
+        if not isinstance(value, Mapping):
+            return _MISSING
+        value = value.get(key, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _assoc(mapping: Mapping, keys: Tuple[str, ...], value: Any) -> Dict[str, Any]:
+    """Copy of `mapping` with `value` at `keys`; only the dicts along the path are copied."""
+    updated = dict(mapping)
+    head = keys[0]
+    if len(keys) == 1:
+        updated[head] = value
+    else:
+        child = mapping.get(head)
+        updated[head] = _assoc(child if isinstance(child, Mapping) else {}, keys[1:], value)
+    return updated
+
+
+def _nest(flat: Dict[str, Any]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for key, value in flat.items():
+        nested = _assoc(nested, tuple(key.split(".")), value)
+    return nested
+
+
+class LayeredConfig(Mapping):
+    """
+    Configuration resolved through named layers (defaults < yaml < env < cli).
+
+    Layers are never merged into one tree. A lookup walks them from the
+    highest priority down, and a section present in several layers is
+    returned as a LayeredConfig over those sections, so no lookup copies
+    anything. with_layer and set return new configs that share every
+    untouched dict with the original: set copies only the dicts on the path
+    of the key in its layer. Configs are therefore cheap to derive from one
+    another and safe to share between threads. Resolved keys are memoized,
+    so repeated lookups are a single dict hit.
+    """
+
+    __slots__ = ("_layers", "_cache")
+
+    def __init__(self, layers: Optional[Dict[str, Mapping]] = None, **named_layers: Mapping):
+        layers = {**(layers or {}), **named_layers}
+        unknown = set(layers) - set(LAYERS)
+        if unknown:
+            raise ValueError(f"Unknown config layers: {', '.join(sorted(unknown))}")
+        # (name, mapping) pairs from the highest priority down; empty layers are skipped.
+        self._layers: Tuple[Tuple[str, Mapping], ...] = tuple(
+            (name, layers[name]) for name in reversed(LAYERS) if layers.get(name)
+        )
+        self._cache: Dict[str, Any] = {}
+
+    @classmethod
+    def _from_sections(cls, sections: Tuple[Tuple[str, Mapping], ...]) -> "LayeredConfig":
+        config = cls.__new__(cls)
+        config._layers = sections
+        config._cache = {}
+        return config
+
+    @staticmethod
+    def from_env(prefix: str, environ: Mapping = None) -> Dict[str, Any]:
+        """
+        Env layer from variables named PREFIX_SECTION__KEY, values parsed as YAML
+        scalars: MV_MODEL__BATCH_SIZE=16 sets model.batch_size to 16.
+        """
+        environ = os.environ if environ is None else environ
+        start = f"{prefix}_"
+        return _nest(
+            {
+                name[len(start):].lower().replace("__", "."): yaml.safe_load(value)
+                for name, value in environ.items()
+                if name.startswith(start) and len(name) > len(start)
+            }
+        )
+
+    @staticmethod
+    def from_args(args: argparse.Namespace) -> Dict[str, Any]:
+        """CLI layer from parsed arguments; dest names may be dotted, None values are left out."""
+        return _nest({arg: value for arg, value in vars(args).items() if value is not None})
+
+    def layer(self, name: str) -> Mapping:
+        for layer_name, mapping in self._layers:
+            if layer_name == name:
+                return mapping
+        return {}
+
+    def with_layer(self, name: str, mapping: Mapping) -> "LayeredConfig":
+        """Copy of this config with the `name` layer replaced; the other layers are shared."""
+        layers = {layer_name: layer for layer_name, layer in self._layers}
+        layers[name] = mapping
+        return LayeredConfig(layers)
+
+    def set(self, key: str, value: Any, layer: str = "cli") -> "LayeredConfig":
+        """Copy of this config with `key` set in `layer`."""
+        return self.with_layer(layer, _assoc(self.layer(layer), tuple(key.split(".")), value))
+
+    def _resolve(self, key: str) -> Any:
+        keys = tuple(key.split("."))
+        sections = []
+        for name, mapping in self._layers:
+            value = _walk(mapping, keys)
+            if value is _MISSING:
+                continue
+            if not isinstance(value, Mapping):
+                # A scalar hides the layers below it; sections above it still win.
+                if not sections:
+                    return value
+                break
+            sections.append((name, value))
+        if not sections:
+            return _MISSING
+        return LayeredConfig._from_sections(tuple(sections))
+
+    def _lookup(self, key: str) -> Any:
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._cache[key] = self._resolve(key)
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is _MISSING or value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._lookup(key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for _, mapping in reversed(self._layers):
+            for key in mapping:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Merged copy of every layer, for serialization."""
+        return {
+            key: value.to_dict() if isinstance(value, LayeredConfig) else value
+            for key, value in ((key, self.get(key)) for key in self)
+        }
+
+    def __repr__(self) -> str:
+        return f"LayeredConfig({self.to_dict()!r})"
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+from .client import DEFAULT_SOCKET_PATH, STREAM_LIMIT, _encode, is_running
+from .query_stats import snapshot_all
+
+
+class InferenceDaemon:
+    """
+    Long-lived process that keeps the registry modules and their models warm and
+    executes commands sent by thin clients over a Unix domain socket.
+
+    Every request and response is a single line of JSON:
+        {"op": "execute", "command": "...", "data": "...", "params": {...}}
+        {"op": "ready"}  ->  {"result": {"<module>": "cold|warming|ready|failed"}}
+        {"op": "reload", "module": "..."}  ->  {"result": ["<reloaded module>", ...]}
+        {"op": "reload", "clear_failures": true}  ->  {"result": ["<retried module>", ...]}
+        {"op": "stats", "kind": "db"}  ->  {"result": [<query_stats snapshot>, ...]}
+        {"result": ...} | {"error": "..."}
+
+    An unknown command, or a command whose module is not loaded, is answered
+    with {"error": "Command '<name>' not found"} (or "Module ...").
+
+    With `warmup` enabled the daemon warms every registry module in the background
+    as soon as it starts; commands for a module that is still warming up wait
+    until it is ready.
+
+    With `watch_interval` set the registry reloads modules whose code changed
+    every that many seconds, without dropping the modules that did not change,
+    and modules are reconfigured when their YAML configuration changes.
+    A reload can also be requested with the reload op; without a module name it
+    reloads whatever changed. With clear_failures it forgets the cached import
+    failures instead, so modules skipped at startup are imported on first use.
+
+    Executed commands are recorded in `journal` (a journal.RequestJournal) when
+    one is given.
+    """
+
+    def __init__(
+        self,
+        registry,
+        db,
+        socket_path: str = None,
+        warmup: bool = False,
+        watch_interval: Optional[float] = None,
+        journal=None,
+    ):
+        self.registry = registry
+        self.db = db
+        self.socket_path = socket_path or DEFAULT_SOCKET_PATH
+        self.warmup = warmup
+        self.watch_interval = watch_interval
+        self.journal = journal
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.warmup_task: Optional[asyncio.Future] = None
+
+    async def handle_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        # Imported here to avoid a circular import with main.
+        from module_validator.main import CommandNotFound, execute_command
+
+        op = request.get("op", "execute")
+        if op == "ping":
+            return {"result": "pong"}
+        if op == "ready":
+            return {"result": self.registry.readiness_status()}
+        if op == "reload":
+            loop = asyncio.get_running_loop()
+            if request.get("clear_failures"):
+                return {"result": self.registry.retry_failed_modules()}
+            name = request.get("module")
+            if name:
+                reloaded = await loop.run_in_executor(None, self.registry.reload_module, name)
+                return {"result": [name] if reloaded else []}
+            return {"result": await loop.run_in_executor(None, self.registry.check_for_changes)}
+        if op == "stats":
+            if request.get("kind", "db") != "db":
+                return {"error": f"Unknown stats: {request['kind']}"}
+            return {"result": snapshot_all()}
+        if op == "execute":
+            try:
+                result = await execute_command(
+                    self.registry,
+                    self.db,
+                    request["command"],
+                    request.get("data", ""),
+                    request.get("params") or {},
+                    self.journal,
+                )
+            except CommandNotFound as e:
+                return {"error": str(e)}
+            return {"result": result}
+        return {"error": f"Unknown operation: {op}"}
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while line := await reader.readline():
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except Exception as e:
+                    logger.exception(f"Error handling daemon request: {e}")
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response, default=_encode).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            if await is_running(self.socket_path):
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(
+            self.handle_connection, path=self.socket_path, limit=STREAM_LIMIT
+        )
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Inference daemon listening on {self.socket_path}")
+        if self.warmup:
+            self.warmup_task = asyncio.get_running_loop().run_in_executor(
+                None, self.registry.warmup_modules
+            )
+        if self.watch_interval:
+            self.registry.watch(self.watch_interval)
+            self.registry.config.watch(self.watch_interval)
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
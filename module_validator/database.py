@@ -1,11 +1,20 @@
 # module_validator/database.py
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import create_engine, delete, event, func, insert, inspect, select, text, update, Column, Index, Integer, Float, LargeBinary, String, DateTime, JSON
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
 from loguru import logger
 
+from .query_stats import get_query_stats
+
 Base = declarative_base()
 
 
@@ -16,7 +25,8 @@ class ModuleEntry(Base):
     name = Column(String, unique=True, nullable=False)
     version = Column(String)
     entry_point = Column(String, nullable=False)
-    config = Column(JSON)
+    # A None config is stored as SQL NULL, so upserts can tell it apart from a config.
+    config = Column(JSON(none_as_null=True))
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -26,6 +36,8 @@ class ModuleEntry(Base):
 
 class CommandEntry(Base):
     __tablename__ = "commands"
+    # Covers "commands of module X": the lookup and the listed names come from the index.
+    __table_args__ = (Index("ix_commands_module_name_name", "module_name", "name"),)
 
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, nullable=False)
@@ -38,101 +50,613 @@ class CommandEntry(Base):
         return f"<CommandEntry(name={self.name}, module_name={self.module_name})>"
 
 
+class RequestEntry(Base):
+    """Append-only journal of executed commands, written in batches by journal.RequestJournal."""
+
+    __tablename__ = "requests"
+
+    id = Column(Integer, primary_key=True)
+    command = Column(String, nullable=False)
+    module_name = Column(String)
+    task_string = Column(String)
+    status = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    latency_ms = Column(Float)
+    input_size = Column(Integer)
+    output_size = Column(Integer)
+    error = Column(String)
+
+    def __repr__(self):
+        return f"<RequestEntry(command={self.command}, status={self.status}, latency_ms={self.latency_ms})>"
+
+
+class ResultCacheEntry(Base):
+    """Persistent tier of result_cache.ResultCache, keyed by a hash of the request."""
+
+    __tablename__ = "result_cache"
+
+    key = Column(String, primary_key=True)
+    module_name = Column(String, nullable=False)
+    value = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(Float, nullable=False, index=True)
+    expires_at = Column(Float, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<ResultCacheEntry(module_name={self.module_name}, size={self.size})>"
+
+
+class MetricRollup:
+    """Aggregate of the latencies of one module and task string over one time bucket."""
+
+    bucket = Column(Integer, primary_key=True)  # Start of the bucket, in epoch seconds
+    module_name = Column(String, primary_key=True)
+    task_string = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sketch = Column(JSON, nullable=False)  # metrics.QuantileSketch.to_dict()
+
+    def __repr__(self):
+        return f"<{type(self).__name__}(bucket={self.bucket}, module_name={self.module_name}, count={self.count})>"
+
+
+class MinuteRollup(MetricRollup, Base):
+    __tablename__ = "metrics_minute"
+
+
+class HourRollup(MetricRollup, Base):
+    __tablename__ = "metrics_hour"
+
+
+class DayRollup(MetricRollup, Base):
+    __tablename__ = "metrics_day"
+
+
+class RevisionEntry(Base):
+    """Single row counter bumped by every write to the modules and commands tables."""
+
+    __tablename__ = "revision"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<RevisionEntry(value={self.value})>"
+
+
+class SchemaVersionEntry(Base):
+    """Single row holding the schema version a database was migrated to."""
+
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer, nullable=False)
+
+
+def _index_commands_by_module(connection):
+    for index in CommandEntry.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+def _add_request_task_strings(connection):
+    columns = {column["name"] for column in inspect(connection).get_columns("requests")}
+    if "task_string" not in columns:
+        connection.execute(text("ALTER TABLE requests ADD COLUMN task_string VARCHAR"))
+
+
+def _create_result_cache(connection):
+    ResultCacheEntry.__table__.create(connection, checkfirst=True)
+    # Rows of older versions hold pickles, which result_cache no longer loads.
+    connection.execute(delete(ResultCacheEntry))
+
+
+# Steps that bring a database created by an older version up to SCHEMA_VERSION.
+# Databases from before the schema_version table are at version 1.
+MIGRATIONS = {
+    2: _index_commands_by_module,
+    3: _add_request_task_strings,
+    4: _create_result_cache,
+}
+SCHEMA_VERSION = max(MIGRATIONS)
+
+
+def migrate(connection):
+    """
+    Creates missing tables and applies the pending MIGRATIONS in place. Every
+    step must be safe to run on a database created with the current schema.
+    """
+    Base.metadata.create_all(connection)
+    version = connection.scalar(select(SchemaVersionEntry.value).where(SchemaVersionEntry.id == 1))
+    if version is None:
+        version = 1
+        connection.execute(insert(SchemaVersionEntry).values(id=1, value=version))
+    for step in sorted(step for step in MIGRATIONS if step > version):
+        logger.info(f"Migrating database schema to version {step}")
+        MIGRATIONS[step](connection)
+        connection.execute(
+            update(SchemaVersionEntry).where(SchemaVersionEntry.id == 1).values(value=step)
+        )
+    return max(version, SCHEMA_VERSION)
+
+
+class RoutingTable:
+    """
+    In-memory snapshot of the commands and modules tables.
+
+    Lookups are dict hits. The snapshot is reloaded when the revision counter
+    in the database moves, which is checked at most every `refresh_interval`
+    seconds, so writes made by other processes show up within that interval.
+    Writes made through the owning Database invalidate it immediately.
+    """
+
+    def __init__(self, db, refresh_interval=1.0):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.revision = None
+        self.commands = {}
+        self.modules = {}
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._next_check = 0.0
+        self.revision = None
+
+    def _refresh(self):
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            revision = self.db.get_revision()
+            if revision is None or revision != self.revision:
+                with self.db.session() as session:
+                    commands = session.scalars(select(CommandEntry)).all()
+                    modules = session.scalars(select(ModuleEntry)).all()
+                self.commands = {command.name: command for command in commands}
+                self.modules = {module.name: module for module in modules}
+                self.revision = revision
+            self._next_check = time.monotonic() + self.refresh_interval
+
+    def get_command(self, name):
+        if time.monotonic() >= self._next_check:
+            self._refresh()
+        return self.commands.get(name)
+
+    def get_module(self, name):
+        if time.monotonic() >= self._next_check:
+            self._refresh()
+        return self.modules.get(name)
+
+    def resolve(self, command_name):
+        """Returns the name of the module that serves `command_name`."""
+        command = self.get_command(command_name)
+        return command.module_name if command else None
+
+
+# Pool settings accepted in the database.pool section of global.yaml.
+POOL_OPTIONS = {
+    "size": "pool_size",
+    "max_overflow": "max_overflow",
+    "timeout": "pool_timeout",
+    "recycle": "pool_recycle",
+    "pre_ping": "pool_pre_ping",
+}
+
+# PRAGMA presets for the database.sqlite.profile setting. Keys set next to the
+# profile override it. See utils/benchmark_sqlite_profiles.py for their cost.
+SQLITE_PROFILES = {
+    # SQLite defaults: rollback journal, every commit fsyncs.
+    "default": {},
+    # Readers never block the writer, commits still fsync.
+    "safe": {"journal_mode": "WAL", "synchronous": "FULL", "busy_timeout": 5000},
+    # Only checkpoints fsync. A power loss can drop the last commits but never
+    # corrupts the database.
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+    },
+    # No fsync at all, for throwaway development databases.
+    "fast": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -65536,
+        "mmap_size": 268435456,
+    },
+}
+SQLITE_PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _is_memory_database(url):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def sqlite_pragmas(settings=None):
+    """Resolves a database.sqlite section into the PRAGMAs to run on each connection."""
+    settings = dict(settings or {})
+    profile = settings.pop("profile", "default")
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile: {profile}")
+    unknown = set(settings) - set(SQLITE_PRAGMAS)
+    if unknown:
+        raise ValueError(f"Unknown SQLite settings: {', '.join(sorted(unknown))}")
+    pragmas = {**SQLITE_PROFILES[profile], **settings}
+    return tuple((name, pragmas[name]) for name in SQLITE_PRAGMAS if name in pragmas)
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    if not pragmas or engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def get_engine(database_url, pool=None, sqlite=None):
+    """
+    Returns the engine shared by every Database connected to `database_url`.
+
+    In-memory SQLite databases only exist on their own engine, so they are never
+    shared and ignore the pool settings. The PRAGMAs of the `sqlite` settings
+    are applied to every new SQLite connection.
+    """
+    pool = pool or {}
+    pragmas = sqlite_pragmas(sqlite)
+    if _is_memory_database(database_url):
+        engine = create_engine(database_url)
+        apply_sqlite_pragmas(engine, pragmas)
+        return engine
+
+    options = {POOL_OPTIONS[key]: value for key, value in pool.items() if key in POOL_OPTIONS}
+    key = (database_url, tuple(sorted(options.items())), pragmas)
+    with _engines_lock:
+        if key not in _engines:
+            logger.debug(f"Creating engine for {database_url} with pool options {options}")
+            _engines[key] = create_engine(database_url, **options)
+            apply_sqlite_pragmas(_engines[key], pragmas)
+        return _engines[key]
+
+
+# Dialects whose insert() supports ON CONFLICT DO UPDATE.
+UPSERT_DIALECTS = {"sqlite": sqlite, "postgresql": postgresql}
+
+
+def upsert_insert(dialect_name, model):
+    """The dialect specific insert() of `model`, which has on_conflict_do_update."""
+    dialect = UPSERT_DIALECTS.get(dialect_name)
+    if dialect is None:
+        raise NotImplementedError(f"Upserts are not supported on {dialect_name}")
+    return dialect.insert(model)
+
+
+def upsert_statement(dialect_name, model, rows, update_columns):
+    """
+    Builds an INSERT ... ON CONFLICT (name) DO UPDATE (ON DUPLICATE KEY UPDATE
+    on MySQL) for `rows` that only overwrites the `update_columns` present in
+    the rows. A None value keeps the stored one, so registering a module
+    without a version does not erase it. Returns the statement and the rows
+    with their timestamps filled in.
+    """
+    now = datetime.utcnow()
+    rows = [{"created_at": now, "updated_at": now, **row} for row in rows]
+    if dialect_name in ("mysql", "mariadb"):
+        statement = mysql.insert(model)
+        new_values = statement.inserted
+    else:
+        statement = upsert_insert(dialect_name, model)
+        new_values = statement.excluded
+    set_ = {"updated_at": new_values.updated_at}
+    for column in update_columns:
+        values = [row.get(column) for row in rows if column in row]
+        if all(value is None for value in values):
+            continue
+        if any(value is None for value in values):
+            set_[column] = func.coalesce(new_values[column], model.__table__.c[column])
+        else:
+            set_[column] = new_values[column]
+    if dialect_name in ("mysql", "mariadb"):
+        return statement.on_duplicate_key_update(set_), rows
+    return statement.on_conflict_do_update(index_elements=[model.name], set_=set_), rows
+
+
 class Database:
+    """
+    Module and command tables on top of a pooled engine shared per database URL.
+
+    Every method runs in the session of the enclosing `with db.session():` block
+    when there is one, so a request can do all of its lookups in one session:
+
+        with db.session():
+            command = db.get_command(name)
+            module = db.get_module(command.module_name)
+
+    Outside of such a block each call opens and closes its own session.
+
+    The add_*, upsert_* and delete_* methods that take lists write all their
+    rows in a single statement and transaction. Upserts use INSERT ... ON
+    CONFLICT (name) DO UPDATE and are available on SQLite and PostgreSQL.
+
+    SQLite connections are tuned by the database.sqlite section, a profile
+    from SQLITE_PROFILES plus individual PRAGMA overrides:
+
+        database:
+          sqlite:
+            profile: balanced
+            busy_timeout: 10000
+
+    `routes` is a RoutingTable over the same tables for hot-path lookups that
+    should not touch the database; its refresh interval is read from the
+    database.routing_refresh_interval setting.
+
+    With database.stats set, or after enable_stats(), the latency, rows and
+    pool wait of every statement are recorded in `stats`, the
+    query_stats.QueryStats of the engine.
+    """
+
     engine = None
 
     def __init__(self, config):
         logger.debug(f"Connecting to database: {config}")
-        if isinstance(config, dict):
-            self.engine = create_engine(config["database_url"])
-        else:
-            self.engine = create_engine(config.global_config["database_url"])
-        self.Session = sessionmaker(bind=self.engine)
+        settings = config if isinstance(config, dict) else config.global_config
+        database = settings.get("database") or {}
+        self.engine = get_engine(
+            settings["database_url"], database.get("pool"), database.get("sqlite")
+        )
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        self._current_session = ContextVar(f"session_{id(self)}", default=None)
+        self.routes = RoutingTable(
+            self, (settings.get("database") or {}).get("routing_refresh_interval", 1.0)
+        )
+        if database.get("stats"):
+            self.enable_stats()
 
-    def create_tables(self):
-        Base.metadata.create_all(self.engine)
+    @property
+    def stats(self):
+        return get_query_stats(self.engine)
+
+    def enable_stats(self):
+        self.stats.track_sessions(self.Session)
+        return self.stats.enable()
+
+    @contextmanager
+    def session(self):
+        session = self._current_session.get()
+        if session is not None:
+            yield session
+            return
 
-    def add_module(self, name, version, entry_point, config=None):
         session = self.Session()
-        module = ModuleEntry(
-            name=name, version=version, entry_point=entry_point, config=config
+        token = self._current_session.set(session)
+        try:
+            yield session
+            session.commit()
+            if session.info.pop("routes_changed", False):
+                self.routes.invalidate()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self._current_session.reset(token)
+            session.close()
+
+    def create_tables(self):
+        with self.engine.begin() as connection:
+            return migrate(connection)
+
+    def get_schema_version(self):
+        """Schema version the database was migrated to, None if it was never migrated."""
+        try:
+            with self.session() as session:
+                return session.scalar(
+                    select(SchemaVersionEntry.value).where(SchemaVersionEntry.id == 1)
+                )
+        except SQLAlchemyError:
+            return None
+
+    def schema_is_current(self):
+        version = self.get_schema_version()
+        return version is not None and version >= SCHEMA_VERSION
+
+    def get_revision(self):
+        """Current value of the revision counter, None if the table does not exist."""
+        try:
+            with self.session() as session:
+                return session.scalar(select(RevisionEntry.value).where(RevisionEntry.id == 1)) or 0
+        except SQLAlchemyError:
+            return None
+
+    def _bump_revision(self, session):
+        result = session.execute(
+            update(RevisionEntry)
+            .where(RevisionEntry.id == 1)
+            .values(value=RevisionEntry.value + 1)
         )
-        session.add(module)
-        session.commit()
-        session.close()
+        if result.rowcount == 0:
+            session.add(RevisionEntry(id=1, value=1))
+            session.flush()
+        session.info["routes_changed"] = True
+
+    def add_module(self, name, version, entry_point, config=None):
+        with self.session() as session:
+            module = ModuleEntry(
+                name=name, version=version, entry_point=entry_point, config=config
+            )
+            session.add(module)
+            self._bump_revision(session)
+            session.flush()
 
     def get_module(self, name):
-        session = self.Session()
-        module = session.query(ModuleEntry).filter_by(name=name).first()
-        session.close()
-        return module
+        with self.session() as session:
+            return session.scalars(
+                select(ModuleEntry).where(ModuleEntry.name == name).limit(1)
+            ).first()
 
     def update_module(self, name, version=None, entry_point=None, config=None):
-        session = self.Session()
-        module = session.query(ModuleEntry).filter_by(name=name).first()
-        if module:
-            if version:
-                module.version = version
-            if entry_point:
-                module.entry_point = entry_point
-            if config:
-                module.config = config
-            session.commit()
-        session.close()
+        values = {
+            key: value
+            for key, value in (("version", version), ("entry_point", entry_point), ("config", config))
+            if value
+        }
+        with self.session() as session:
+            result = session.execute(
+                update(ModuleEntry)
+                .where(ModuleEntry.name == name)
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            if result.rowcount:
+                self._bump_revision(session)
 
     def delete_module(self, name):
-        session = self.Session()
-        module = session.query(ModuleEntry).filter_by(name=name).first()
-        if module:
-            session.delete(module)
-            session.commit()
-        session.close()
+        with self.session() as session:
+            module = session.query(ModuleEntry).filter_by(name=name).first()
+            if module:
+                session.delete(module)
+                self._bump_revision(session)
+                session.flush()
 
     def list_modules(self):
-        session = self.Session()
-        modules = session.query(ModuleEntry).all()
-        session.close()
-        return modules
+        with self.session() as session:
+            return session.query(ModuleEntry).all()
 
-    def create_tables(self):
-        Base.metadata.create_all(self.engine)
+    def add_modules(self, modules):
+        """Inserts dicts with name, version, entry_point and config keys."""
+        if not modules:
+            return
+        with self.session() as session:
+            session.execute(insert(ModuleEntry), list(modules))
+            self._bump_revision(session)
+
+    def upsert_modules(self, modules):
+        if not modules:
+            return
+        with self.session() as session:
+            session.execute(
+                *upsert_statement(
+                    self.engine.dialect.name,
+                    ModuleEntry,
+                    modules,
+                    ["version", "entry_point", "config"],
+                )
+            )
+            self._bump_revision(session)
+
+    def delete_modules(self, names):
+        with self.session() as session:
+            result = session.execute(delete(ModuleEntry).where(ModuleEntry.name.in_(list(names))))
+            if result.rowcount:
+                self._bump_revision(session)
+            return result.rowcount
 
     def add_command(self, name, module_name, description=None):
-        session = self.Session()
-        command = CommandEntry(
-            name=name, module_name=module_name, description=description
-        )
-        session.add(command)
-        session.commit()
-        session.close()
+        with self.session() as session:
+            command = CommandEntry(
+                name=name, module_name=module_name, description=description
+            )
+            session.add(command)
+            self._bump_revision(session)
+            session.flush()
 
     def get_command(self, name):
-        session = self.Session()
-        command = session.query(CommandEntry).filter_by(name=name).first()
-        session.close()
-        return command
+        with self.session() as session:
+            return session.scalars(
+                select(CommandEntry).where(CommandEntry.name == name).limit(1)
+            ).first()
 
     def update_command(self, name, module_name=None, description=None):
-        session = self.Session()
-        command = session.query(CommandEntry).filter_by(name=name).first()
-        if command:
-            if module_name:
-                command.module_name = module_name
-            if description:
-                command.description = description
-            session.commit()
-        session.close()
+        values = {
+            key: value
+            for key, value in (("module_name", module_name), ("description", description))
+            if value
+        }
+        with self.session() as session:
+            result = session.execute(
+                update(CommandEntry)
+                .where(CommandEntry.name == name)
+                .values(updated_at=datetime.utcnow(), **values)
+            )
+            if result.rowcount:
+                self._bump_revision(session)
 
     def delete_command(self, name):
-        session = self.Session()
-        command = session.query(CommandEntry).filter_by(name=name).first()
-        if command:
-            session.delete(command)
-            session.commit()
-        session.close()
+        with self.session() as session:
+            command = session.query(CommandEntry).filter_by(name=name).first()
+            if command:
+                session.delete(command)
+                self._bump_revision(session)
+                session.flush()
 
     def list_commands(self):
-        session = self.Session()
-        commands = session.query(CommandEntry).all()
-        session.close()
-        return commands
+        with self.session() as session:
+            return session.query(CommandEntry).all()
+
+    def list_module_commands(self, module_name):
+        """Names of the commands routed to `module_name`, read from the module_name index."""
+        with self.session() as session:
+            return session.scalars(
+                select(CommandEntry.name)
+                .where(CommandEntry.module_name == module_name)
+                .order_by(CommandEntry.name)
+            ).all()
+
+    def delete_module_commands(self, module_name):
+        with self.session() as session:
+            result = session.execute(
+                delete(CommandEntry).where(CommandEntry.module_name == module_name)
+            )
+            if result.rowcount:
+                self._bump_revision(session)
+            return result.rowcount
+
+    def add_commands(self, commands):
+        """Inserts dicts with name, module_name and description keys."""
+        if not commands:
+            return
+        with self.session() as session:
+            session.execute(insert(CommandEntry), list(commands))
+            self._bump_revision(session)
+
+    def upsert_commands(self, commands):
+        if not commands:
+            return
+        with self.session() as session:
+            session.execute(
+                *upsert_statement(
+                    self.engine.dialect.name, CommandEntry, commands, ["module_name", "description"]
+                )
+            )
+            self._bump_revision(session)
+
+    def delete_commands(self, names):
+        with self.session() as session:
+            result = session.execute(delete(CommandEntry).where(CommandEntry.name.in_(list(names))))
+            if result.rowcount:
+                self._bump_revision(session)
+            return result.rowcount
+
+    def add_requests(self, requests):
+        """Appends journal rows in one transaction; they do not affect the routing table."""
+        if not requests:
+            return
+        with self.session() as session:
+            session.execute(insert(RequestEntry), list(requests))
+
+    def list_requests(self, command=None, limit=100):
+        with self.session() as session:
+            query = select(RequestEntry).order_by(RequestEntry.id.desc()).limit(limit)
+            if command:
+                query = query.where(RequestEntry.command == command)
+            return session.scalars(query).all()
@@ -0,0 +1,299 @@
+import hashlib
+import importlib
+import importlib.metadata
+import json
+import os
+import site
+import sys
+import tempfile
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+INDEX_VERSION = 3
+CACHE_DIR = os.getenv(
+    "MODULE_VALIDATOR_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "module_validator"),
+)
+ENVIRONMENT_KEY = hashlib.sha1(sys.prefix.encode()).hexdigest()[:12]
+# Metadata files that `setup.py develop` / `egg_info` rewrite in place,
+# which does not change the mtime of their folder.
+METADATA_FILES = ("entry_points.txt", "METADATA", "PKG-INFO")
+
+
+def _write_json(path: str, data) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class IndexedEntryPoint(NamedTuple):
+    name: str
+    value: str
+    group: str
+    dist: str
+    version: str
+
+    @property
+    def module(self) -> str:
+        return self.value.split(":")[0].strip()
+
+    @property
+    def attr(self) -> Optional[str]:
+        _, _, attr = self.value.partition(":")
+        return attr.split("[")[0].strip() or None
+
+    def load(self):
+        target = importlib.import_module(self.module)
+        if self.attr:
+            for part in self.attr.split("."):
+                target = getattr(target, part)
+        return target
+
+
+def _site_packages() -> List[str]:
+    paths = list(getattr(site, "getsitepackages", lambda: [])())
+    if site.ENABLE_USER_SITE:
+        paths.append(site.getusersitepackages())
+    return paths
+
+
+class EntryPointIndex:
+    """
+    On-disk index of the entry points installed in the current environment.
+
+    The index is keyed on the mtimes of the site-packages folders, which change
+    when a package is installed, upgraded or removed, and of the dist-info and
+    egg-info folders the entry points came from and their metadata files, which
+    catch metadata regenerated in place. Other sys.path entries, such as the
+    working directory, are not scanned, so the index does not depend on where
+    the process was started. It is rebuilt with importlib.metadata when the
+    fingerprint changes.
+    """
+
+    def __init__(self, path: str = None, paths: List[str] = None):
+        self.paths = paths
+        self.path = path or os.path.join(CACHE_DIR, f"entry_points-{ENVIRONMENT_KEY}.json")
+        self.entries: Optional[List[IndexedEntryPoint]] = None
+        # Metadata folders the entries were read from, set by rebuild.
+        self.sources: List[str] = []
+
+    def _search_paths(self) -> List[str]:
+        # "" is the working directory, whose contents vary from run to run.
+        return [path for path in (self.paths if self.paths is not None else sys.path) if path]
+
+    def _site_dirs(self, sources: List[str]) -> List[str]:
+        if self.paths is not None:
+            site_dirs = set(self._search_paths())
+        else:
+            site_dirs = set(_site_packages()) & set(self._search_paths())
+        site_dirs.update(os.path.dirname(source) for source in sources)
+        return sorted(site_dirs)
+
+    def fingerprint(self, sources: List[str]) -> Dict[str, List[int]]:
+        fingerprint = {path: self._stat(path) for path in self._site_dirs(sources)}
+        for source in sources:
+            fingerprint[source] = self._stat(source)
+            for filename in METADATA_FILES:
+                file_path = os.path.join(source, filename)
+                stat = self._stat(file_path)
+                if stat is not None:
+                    fingerprint[file_path] = stat
+        return fingerprint
+
+    @staticmethod
+    def _stat(path: str) -> Optional[List[int]]:
+        # The size catches rewrites that land within the filesystem's mtime granularity.
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def load(self) -> List[IndexedEntryPoint]:
+        if self.entries is not None:
+            return self.entries
+
+        try:
+            with open(self.path, "r") as f:
+                index = json.load(f)
+            if (
+                index.get("version") == INDEX_VERSION
+                and index.get("fingerprint") == self.fingerprint(index["sources"])
+            ):
+                self.sources = index["sources"]
+                self.entries = [IndexedEntryPoint(*entry) for entry in index["entries"]]
+                return self.entries
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+
+        logger.debug(f"Rebuilding entry point index: {self.path}")
+        self.entries = self.rebuild()
+        self._write(self.fingerprint(self.sources))
+        return self.entries
+
+    def rebuild(self) -> List[IndexedEntryPoint]:
+        entries = []
+        sources = set()
+        seen = set()
+        for dist in importlib.metadata.distributions(path=self._search_paths()):
+            dist_name = dist.metadata["Name"] or ""
+            for entry_point in dist.entry_points:
+                # The first distribution on the search path wins, like the import system.
+                key = (entry_point.group, entry_point.name)
+                if key in seen:
+                    continue
+                seen.add(key)
+                source = getattr(dist, "_path", None)
+                if source is not None:
+                    sources.add(os.path.abspath(str(source)))
+                entries.append(
+                    IndexedEntryPoint(
+                        entry_point.name,
+                        entry_point.value,
+                        entry_point.group,
+                        dist_name,
+                        dist.version or "",
+                    )
+                )
+        self.sources = sorted(sources)
+        return entries
+
+    def _write(self, fingerprint: Dict[str, List[int]]):
+        index = {
+            "version": INDEX_VERSION,
+            "fingerprint": fingerprint,
+            "sources": self.sources,
+            "entries": [list(entry) for entry in self.entries],
+        }
+        try:
+            _write_json(self.path, index)
+        except OSError as e:
+            logger.warning(f"Could not write entry point index {self.path}: {e}")
+
+    def invalidate(self):
+        self.entries = None
+
+    def iter_entry_points(self, group: str, dist: str = None) -> List[IndexedEntryPoint]:
+        return [
+            entry
+            for entry in self.load()
+            if entry.group == group and (dist is None or entry.dist == dist)
+        ]
+
+
+class FailedEntryPointCache:
+    """
+    Negative cache of entry points that failed to import.
+
+    Only deterministic failures (CACHED_ERRORS) are remembered, together with
+    the name and version of the distribution that provides the entry point and
+    the mtime and size of the module's source file. The entry point is skipped
+    until one of those changes or the cache is cleared, which is what to do
+    after installing a missing dependency (`module_validator modules
+    clear-failures`). Other errors are retried on the next load.
+    """
+
+    CACHED_ERRORS = (ImportError, AttributeError)
+
+    def __init__(self, path: str = None, paths: List[str] = None):
+        self.path = path or os.path.join(CACHE_DIR, f"failed_entry_points-{ENVIRONMENT_KEY}.json")
+        self.paths = paths
+        self.failures: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self.failures is None:
+            try:
+                with open(self.path, "r") as f:
+                    self.failures = json.load(f)
+            except (OSError, ValueError):
+                self.failures = {}
+        return self.failures
+
+    @staticmethod
+    def _key(entry_point: IndexedEntryPoint) -> str:
+        return f"{entry_point.group}:{entry_point.name}"
+
+    def source_fingerprint(self, entry_point: IndexedEntryPoint) -> Optional[List[int]]:
+        """
+        mtime and size of the module's source file, found the way the import
+        system would without importing anything. None if there is no such file.
+        """
+        parts = entry_point.module.split(".")
+        for path in self.paths if self.paths is not None else sys.path:
+            module_path = os.path.join(path or ".", *parts)
+            for candidate in (os.path.join(module_path, "__init__.py"), module_path + ".py"):
+                try:
+                    stat = os.stat(candidate)
+                except OSError:
+                    continue
+                return [stat.st_mtime_ns, stat.st_size]
+        return None
+
+    def _identity(self, entry_point: IndexedEntryPoint) -> List[Any]:
+        return [
+            entry_point.value,
+            entry_point.dist,
+            entry_point.version,
+            self.source_fingerprint(entry_point),
+        ]
+
+    def get_failure(self, entry_point: IndexedEntryPoint) -> Optional[str]:
+        with self._lock:
+            failure = self._load().get(self._key(entry_point))
+        if failure and failure.get("identity") == self._identity(entry_point):
+            return failure["error"]
+        return None
+
+    def record_failure(self, entry_point: IndexedEntryPoint, error: BaseException) -> bool:
+        """Remembers a failure if it is deterministic. Returns whether it was recorded."""
+        if not isinstance(error, self.CACHED_ERRORS):
+            return False
+        identity = self._identity(entry_point)
+        with self._lock:
+            self._load()[self._key(entry_point)] = {
+                "identity": identity,
+                "error": f"{type(error).__name__}: {error}",
+            }
+            self._dirty = True
+        return True
+
+    def record_success(self, entry_point: IndexedEntryPoint):
+        with self._lock:
+            if self._load().pop(self._key(entry_point), None) is not None:
+                self._dirty = True
+
+    def clear(self):
+        with self._lock:
+            self.failures = {}
+            self._dirty = True
+        self.save()
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                _write_json(self.path, self.failures)
+                self._dirty = False
+            except OSError as e:
+                logger.warning(f"Could not write failed entry point cache {self.path}: {e}")
+
+
+_default_index = None
+
+
+def get_index() -> EntryPointIndex:
+    global _default_index
+    if _default_index is None:
+        _default_index = EntryPointIndex()
+    return _default_index
+
+
+def iter_entry_points(group: str, dist: str = None) -> List[IndexedEntryPoint]:
+    return get_index().iter_entry_points(group, dist)
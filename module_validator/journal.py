@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+def payload_size(value: Any) -> int:
+    """Approximate size in bytes of a command input or result, without serializing it."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(payload_size(key) + payload_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return 8
+
+
+class RequestJournal:
+    """
+    Writes a row to the requests table for every executed command.
+
+    record() only puts the row on a bounded in-memory queue and never blocks: when
+    the queue is full the row is dropped and counted in `dropped`. A background
+    thread commits the queued rows in a single transaction once `batch_size` rows
+    are waiting or `flush_interval` seconds have passed since the first of them.
+
+    Written batches are also added to `metrics` (a metrics.MetricsStore) when
+    one is given, which keeps the latency rollups up to date.
+
+    The journal does not create or migrate tables; the daemon runs
+    Database.create_tables once at startup.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000,
+        metrics=None,
+    ):
+        self.db = db
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(max_queue)
+        self.dropped = 0
+        self.written = 0
+        self._thread = None
+
+    def record(
+        self,
+        command: str,
+        status: str,
+        started_at: datetime,
+        latency_ms: float = None,
+        module_name: str = None,
+        input_size: int = None,
+        output_size: int = None,
+        error: str = None,
+        task_string: str = None,
+    ) -> bool:
+        row = {
+            "command": command,
+            "module_name": module_name,
+            "task_string": task_string,
+            "status": status,
+            "started_at": started_at,
+            "latency_ms": latency_ms,
+            "input_size": input_size,
+            "output_size": output_size,
+            "error": error,
+        }
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="request-journal", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 10.0):
+        """Writes the rows that are still queued and stops the writer thread."""
+        if self._thread is None:
+            self.flush()
+            return
+        self.queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def flush(self):
+        rows = []
+        while True:
+            try:
+                row = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                rows.append(row)
+        self._write(rows)
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        if not rows:
+            return
+        try:
+            self.db.add_requests(rows)
+            self.written += len(rows)
+        except Exception as e:
+            self.dropped += len(rows)
+            logger.warning(f"Could not write {len(rows)} journal rows: {e}")
+            return
+        if self.metrics is not None:
+            try:
+                self.metrics.record_many(rows)
+            except Exception as e:
+                logger.warning(f"Could not update metrics rollups: {e}")
+
+    def _run(self):
+        while True:
+            row = self.queue.get()
+            if row is None:
+                return
+            rows = [row]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+            self._write(rows)
+            if stop:
+                self.flush()
+                return
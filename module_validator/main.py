@@ -1,12 +1,28 @@
 import asyncio
 import sys
 import argparse
-import importlib
+import inspect
+import time
 import traceback
+from datetime import datetime
 from typing import Callable
-import pkg_resources
+from module_validator.async_database import AsyncDatabase
+from module_validator.client import (
+    LOCAL_COMMANDS,
+    REQUEST_TIMEOUT,
+    forward_command,
+    is_running,
+    parse_params,
+    send_request,
+)
 from module_validator.config import Config
+from module_validator.daemon import InferenceDaemon
+from module_validator.entry_points import FailedEntryPointCache, iter_entry_points
+from module_validator.journal import RequestJournal, payload_size
+from module_validator.manifest import load_manifest
+from module_validator.metrics import MetricsStore
 from module_validator.module import Module
+from module_validator.query_stats import format_snapshots
 from module_validator.registry import ModuleRegistry
 from module_validator.database import Database
 
@@ -15,21 +31,50 @@ def default_output(output: str) -> None:
     print("This is the default output", output)
 
 
-async def execute_command(registry, db, command_name, data, params):
-    command = db.get_command(command_name)
+class CommandNotFound(LookupError):
+    """The command, or the module behind it, is not available."""
+
+
+async def execute_command(registry, db, command_name, data, params, journal=None):
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+
+    def record(status, module_name=None, result=None, error=None):
+        if journal is not None:
+            journal.record(
+                command_name,
+                status,
+                started_at,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                module_name=module_name,
+                input_size=payload_size(data),
+                output_size=payload_size(result),
+                error=error,
+                task_string=params.get("task_string"),
+            )
+
+    command = db.routes.get_command(command_name)
+    if inspect.isawaitable(command):
+        command = await command
     if not command:
-        print(f"Command '{command_name}' not found.")
-        return
+        record("command_not_found")
+        raise CommandNotFound(f"Command '{command_name}' not found")
 
     module = registry.get_module(command.module_name)
     if not module:
-        print(f"Module '{command.module_name}' not found.")
-        return
+        record("module_not_found", command.module_name)
+        raise CommandNotFound(f"Module '{command.module_name}' not found")
 
-    data = {"data": {"input": data, **params}}
+    request = {"data": {"input": data, **params}}
 
-    result = await module(data)
+    try:
+        result = await module(request)
+    except Exception as e:
+        record("error", command.module_name, error=f"{type(e).__name__}: {e}")
+        raise
+    record("ok", command.module_name, result)
     print(f"Command '{command_name}' executed. Result: {result}")
+    return result
 
 
 def debug_entry_points():
@@ -41,12 +86,66 @@ def debug_entry_points():
         "module_validator.command",
     ]:
         print(f"\nGroup: {group}")
-        for ep in pkg_resources.iter_entry_points(group=group):
-            print(f"  {ep.name} = {ep.module_name}:{ep.attrs[0]}")
+        for ep in iter_entry_points(group=group):
+            print(f"  {ep.name} = {ep.value}")
+
+
+def list_module_manifests():
+    print("Inference modules:")
+    for ep in iter_entry_points(group="module_validator.inference"):
+        manifest = load_manifest(ep)
+        if manifest is None:
+            print(f"  {ep.name}: no manifest")
+            continue
+        print(
+            f"  {ep.name}: tasks={', '.join(manifest.task_strings) or '-'} "
+            f"max_batch_size={manifest.max_batch_size} thread_safe={manifest.thread_safe} "
+            f"memory={manifest.resident_memory_mb or '?'}MB device={manifest.device}"
+        )
+
+
+async def clear_failed_modules():
+    # A running daemon holds the cache in memory, so it has to do the clearing.
+    if await is_running():
+        response = await send_request({"op": "reload", "clear_failures": True})
+        if "error" in response:
+            print(f"Daemon error: {response['error']}")
+            return 1
+        print(f"Cleared failed modules; the daemon will retry: {', '.join(response['result']) or '-'}")
+        return 0
+    FailedEntryPointCache().clear()
+    print("Cleared failed modules; they are retried on the next load.")
+    return 0
+
+
+async def print_stats(kind):
+    if kind != "db":
+        print(f"Unknown stats '{kind}'. Available: db")
+        return 1
+    # Stats live in the process that runs the queries, which is the daemon.
+    if not await is_running():
+        print("No daemon is running; start one with `module_validator daemon`.")
+        return 1
+    response = await send_request({"op": "stats", "kind": kind})
+    if "error" in response:
+        print(f"Daemon error: {response['error']}")
+        return 1
+    print(format_snapshots(response["result"]))
+    return 0
+
+
+def compile_config(action):
+    if action != "compile":
+        print("Usage: python -m module_validator.main config compile")
+        return 1
+    config = Config()
+    path = config.compile()
+    print(f"Compiled configuration for environment '{config.environment}' to {path}")
+    return 0
 
 
 def create_module(outputer_type: str, outputer: str):
-    eps = importlib.metadata.entry_points().select(group="module-validator.module")
+    eps = iter_entry_points(group="module-validator.module")
     outputers = {entrypoint.name: entrypoint for entrypoint in eps}
     try:
         outputer = outputers[outputer].load()
@@ -77,30 +176,94 @@ def parseargs():
     return parser.parse_args()
 
 
+def open_journal(db, config, daemon):
+    """
+    The daemon journals through a background writer and compacts the metrics.
+    A one-shot command writes its journal row and rollups synchronously when
+    the journal is closed, and never compacts. Nothing is journaled into a
+    database the daemon has not migrated yet, which would only fail.
+    """
+    if not daemon and not db.schema_is_current():
+        print("The database schema is not migrated yet (the daemon migrates it); not journaling.")
+        return None
+    settings = dict(config.get_global_config().get("metrics") or {})
+    if not daemon:
+        settings["compact_interval"] = None
+    journal = RequestJournal(db, metrics=MetricsStore(db, **settings))
+    return journal.start() if daemon else journal
+
+
 async def main():
     print("Starting main function")
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    data = sys.argv[2] if len(sys.argv) > 2 else ""
+    try:
+        params = parse_params(sys.argv[3]) if len(sys.argv) > 3 else {}
+    except (ValueError, SyntaxError) as e:
+        print(f"Invalid params {sys.argv[3]!r}: {e}")
+        return 1
+
+    # Thin client: hand the command to a warm daemon when one is running.
+    # module_validator.client does this without importing this module.
+    if command and command not in LOCAL_COMMANDS and await is_running():
+        try:
+            response = await forward_command(command, data, params)
+        except asyncio.TimeoutError:
+            print(f"The daemon did not answer within {REQUEST_TIMEOUT:g} seconds")
+            return 1
+        return 1 if "error" in response else 0
+
+    if command == "modules":
+        if data == "clear-failures":
+            return await clear_failed_modules()
+        list_module_manifests()
+        return 0
+
+    if command == "stats":
+        return await print_stats(data or "db")
+
+    if command == "config":
+        return compile_config(data)
+
     debug_entry_points()
 
+    journal = None
     try:
-        config = Config()
+        # One-shot commands only read the config of the module they run.
+        config = Config(lazy=command != "daemon")
         config.load_configs()
         db = Database(config.get_global_config())
-        registry = ModuleRegistry(config, db)
+        # Command execution looks commands up without blocking the event loop.
+        async_db = AsyncDatabase(config.get_global_config())
+        journal = open_journal(db, config, daemon=command == "daemon")
+        registry = ModuleRegistry(config, db, lazy=True)
         registry.load_modules()
-        if len(sys.argv) < 2:
+        if command is None:
             print("Usage: python -m module_validator.main <command> [data] [params]")
+            print("       python -m module_validator.main daemon")
+            print("       python -m module_validator.main modules [clear-failures]")
+            print("       python -m module_validator.main stats db")
+            print("       python -m module_validator.main config compile")
             return
+        elif command == "daemon":
+            # Create and migrate the schema once, here rather than in every CLI process.
+            db.create_tables()
+            await InferenceDaemon(
+                registry, async_db, warmup=True, watch_interval=2.0, journal=journal
+            ).serve_forever()
         else:
-            command = sys.argv[1]
-            data = sys.argv[2] if len(sys.argv) > 2 else ""
-            params = eval(sys.argv[3]) if len(sys.argv) > 3 else {}
-
-            await execute_command(registry, db, command, data, params)
+            await execute_command(registry, async_db, command, data, params, journal)
 
+    except CommandNotFound as e:
+        print(f"{e}.")
+        return 1
     except Exception as e:
         print(f"An error occurred: {e}")
         print("Traceback:")
         traceback.print_exc()
+    finally:
+        if journal is not None:
+            journal.close()
 
     return 0
 
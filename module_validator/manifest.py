@@ -0,0 +1,78 @@
+import os
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import yaml
+from loguru import logger
+
+from .entry_points import IndexedEntryPoint
+
+MANIFEST_FILENAME = "manifest.yaml"
+
+
+class ModuleManifest(NamedTuple):
+    """
+    Static description of an inference module, read without importing it.
+
+    The manifest is a `manifest.yaml` shipped as package data next to the module
+    behind the entry point:
+        task_strings: [text2text, speech2text]
+        max_batch_size: 32
+        thread_safe: false
+        resident_memory_mb: 9500
+        device: cuda
+    A package that provides several entry points can key the fields by entry
+    point name instead.
+    """
+
+    task_strings: Tuple[str, ...] = ()
+    max_batch_size: int = 1
+    thread_safe: bool = False
+    resident_memory_mb: Optional[int] = None
+    device: str = "cpu"
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ModuleManifest":
+        unknown = set(data) - set(cls._fields)
+        if unknown:
+            raise ValueError(f"Unknown manifest fields: {', '.join(sorted(unknown))}")
+        data = dict(data)
+        if "task_strings" in data:
+            data["task_strings"] = tuple(data["task_strings"] or ())
+        return cls(**data)
+
+
+def find_manifest(entry_point: IndexedEntryPoint, paths: List[str] = None) -> Optional[str]:
+    """
+    Finds the manifest of an entry point by walking the search path the way the
+    import system would, without importing the module or its parent packages.
+    """
+    parts = entry_point.module.split(".")
+    for path in paths if paths is not None else sys.path:
+        module_path = os.path.join(path or ".", *parts)
+        if os.path.isdir(module_path):
+            package_dir = module_path
+        elif os.path.isfile(module_path + ".py"):
+            package_dir = os.path.dirname(module_path)
+        else:
+            continue
+        manifest_path = os.path.join(package_dir, MANIFEST_FILENAME)
+        return manifest_path if os.path.isfile(manifest_path) else None
+    return None
+
+
+def load_manifest(
+    entry_point: IndexedEntryPoint, paths: List[str] = None
+) -> Optional[ModuleManifest]:
+    manifest_path = find_manifest(entry_point, paths)
+    if manifest_path is None:
+        return None
+    try:
+        with open(manifest_path, "r") as f:
+            data = yaml.safe_load(f) or {}
+        if isinstance(data.get(entry_point.name), dict):
+            data = data[entry_point.name]
+        return ModuleManifest.from_dict(data)
+    except (OSError, yaml.YAMLError, ValueError, TypeError) as e:
+        logger.warning(f"Invalid manifest for module {entry_point.name} at {manifest_path}: {e}")
+        return None
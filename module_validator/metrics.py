@@ -0,0 +1,271 @@
+import calendar
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from loguru import logger
+from sqlalchemy import case, delete, select
+
+from .database import DayRollup, HourRollup, MinuteRollup, RequestEntry, upsert_insert
+
+# Bucket width in seconds and rollup table of every resolution.
+RESOLUTIONS = {
+    "minute": (60, MinuteRollup),
+    "hour": (3600, HourRollup),
+    "day": (86400, DayRollup),
+}
+# Seconds each resolution, and the raw requests journal, are kept for.
+DEFAULT_RETENTION = {
+    "requests": 7 * 86400,
+    "minute": 2 * 86400,
+    "hour": 90 * 86400,
+    "day": 5 * 365 * 86400,
+}
+SKETCH_ACCURACY = 0.01
+
+
+class QuantileSketch:
+    """
+    Quantile sketch with logarithmic bins (as in DDSketch): every quantile is
+    within `accuracy` relative error of the true value, and two sketches merge
+    by adding their bin counts, which is what lets rollups be updated in place.
+    """
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY, bins: Dict[int, int] = None, zeros: int = 0):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = dict(bins or {})
+        self.zeros = zeros
+        self.count = zeros + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"zeros": self.zeros, "bins": {str(index): count for index, count in self.bins.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], accuracy: float = SKETCH_ACCURACY) -> "QuantileSketch":
+        bins = {int(index): count for index, count in data.get("bins", {}).items()}
+        return cls(accuracy, bins, data.get("zeros", 0))
+
+
+def _epoch(timestamp) -> float:
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, datetime):
+        # Journal timestamps are naive UTC.
+        return calendar.timegm(timestamp.utctimetuple()) + timestamp.microsecond / 1e6
+    return float(timestamp)
+
+
+class _Aggregate:
+    __slots__ = ("count", "sum", "min", "max", "sketch")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sketch.add(value)
+
+
+class MetricsStore:
+    """
+    Latency metrics per module and task string, rolled up by minute, hour and day.
+
+    record_many aggregates a batch of samples in memory and merges it into the
+    three rollup tables in one transaction, so a query over a week reads at most
+    168 hour rows per task string instead of the raw journal. Only successful
+    requests are rolled up. Every row is merged with one INSERT ... ON CONFLICT
+    DO UPDATE that adds to the count and sum in place and only applies if the
+    row's count is still the one its sketch was merged with, so processes that
+    record at the same time never lose each other's samples. At most every
+    `compact_interval` seconds, compact deletes the rollups and journal rows
+    that are older than their `retention`, which keeps the database file bounded.
+    With `compact_interval` None compact only runs when it is called.
+    """
+
+    def __init__(
+        self, db, retention: Dict[str, float] = None, compact_interval: Optional[float] = 3600.0
+    ):
+        unknown = set(retention or {}) - set(DEFAULT_RETENTION)
+        if unknown:
+            raise ValueError(f"Unknown metrics retention: {', '.join(sorted(unknown))}")
+        self.db = db
+        self.retention = {**DEFAULT_RETENTION, **(retention or {})}
+        self.compact_interval = compact_interval
+        self._next_compaction = 0.0
+
+    def record(self, module_name: str, task_string: str, latency_ms: float, started_at=None):
+        self.record_many(
+            [{"module_name": module_name, "task_string": task_string, "latency_ms": latency_ms, "started_at": started_at}]
+        )
+
+    def record_many(self, samples: Iterable[Dict[str, Any]]):
+        """
+        Adds samples with module_name, task_string, latency_ms and started_at
+        keys, such as journal rows. Samples whose status is not "ok" are skipped.
+        """
+        groups: Dict[tuple, _Aggregate] = {}
+        for sample in samples:
+            latency_ms = sample.get("latency_ms")
+            if latency_ms is None or sample.get("status", "ok") != "ok":
+                continue
+            epoch = _epoch(sample.get("started_at"))
+            module_name = sample.get("module_name") or ""
+            task_string = sample.get("task_string") or ""
+            for resolution, (width, _) in RESOLUTIONS.items():
+                key = (resolution, int(epoch // width * width), module_name, task_string)
+                aggregate = groups.get(key)
+                if aggregate is None:
+                    aggregate = groups[key] = _Aggregate()
+                aggregate.add(latency_ms)
+        if not groups:
+            return
+
+        with self.db.session() as session:
+            dialect_name = session.get_bind().dialect.name
+            for (resolution, bucket, module_name, task_string), aggregate in groups.items():
+                model = RESOLUTIONS[resolution][1]
+                key = (bucket, module_name, task_string)
+                # False when another process merged into the row since it was read.
+                while not self._merge(session, dialect_name, model, key, aggregate):
+                    pass
+
+        if self.compact_interval is not None and time.monotonic() >= self._next_compaction:
+            self.compact()
+
+    def _merge(self, session, dialect_name, model, key, aggregate: _Aggregate) -> bool:
+        """Merges `aggregate` into the rollup row `key`. Returns False if the row changed concurrently."""
+        row = session.get(model, key, populate_existing=True)
+        seen = 0 if row is None else row.count
+        sketch = QuantileSketch() if row is None else QuantileSketch.from_dict(row.sketch)
+        sketch.merge(aggregate.sketch)
+        bucket, module_name, task_string = key
+        statement = upsert_insert(dialect_name, model).values(
+            bucket=bucket,
+            module_name=module_name,
+            task_string=task_string,
+            count=aggregate.count,
+            sum=aggregate.sum,
+            min=aggregate.min,
+            max=aggregate.max,
+            sketch=sketch.to_dict(),
+        )
+        excluded = statement.excluded
+        statement = statement.on_conflict_do_update(
+            index_elements=[model.bucket, model.module_name, model.task_string],
+            set_={
+                "count": model.count + excluded["count"],
+                "sum": model.sum + excluded["sum"],
+                "min": case((excluded["min"] < model.min, excluded["min"]), else_=model.min),
+                "max": case((excluded["max"] > model.max, excluded["max"]), else_=model.max),
+                "sketch": excluded["sketch"],
+            },
+            where=model.count == seen,
+        )
+        return session.execute(statement).rowcount == 1
+
+    def compact(self, now: float = None) -> int:
+        """Deletes the rollups and journal rows past their retention. Returns the number of rows."""
+        now = time.time() if now is None else now
+        deleted = 0
+        with self.db.session() as session:
+            for resolution, (width, model) in RESOLUTIONS.items():
+                # A bucket is kept until its end falls out of the retention window.
+                cutoff = now - self.retention[resolution] - width
+                deleted += session.execute(delete(model).where(model.bucket < cutoff)).rowcount
+            cutoff = datetime.utcfromtimestamp(now - self.retention["requests"])
+            deleted += session.execute(
+                delete(RequestEntry).where(RequestEntry.started_at < cutoff)
+            ).rowcount
+        self._next_compaction = time.monotonic() + (self.compact_interval or 0.0)
+        if deleted:
+            logger.debug(f"Compacted {deleted} metrics and journal rows")
+        return deleted
+
+    def query(
+        self,
+        module_name: str,
+        task_string: str = None,
+        resolution: str = "hour",
+        since=None,
+        until=None,
+        quantiles: Sequence[float] = (0.5, 0.95, 0.99),
+    ) -> List[Dict[str, Any]]:
+        """
+        Per-bucket latency stats of a module between `since` and `until`
+        (datetimes or epoch seconds). Without a task string the task strings
+        of the module are merged.
+        """
+        width, model = RESOLUTIONS[resolution]
+        statement = select(model).where(model.module_name == module_name).order_by(model.bucket)
+        if task_string is not None:
+            statement = statement.where(model.task_string == task_string)
+        if since is not None:
+            statement = statement.where(model.bucket >= int(_epoch(since) // width * width))
+        if until is not None:
+            statement = statement.where(model.bucket < _epoch(until))
+        with self.db.session() as session:
+            rows = session.scalars(statement).all()
+
+        buckets: Dict[int, _Aggregate] = {}
+        for row in rows:
+            aggregate = buckets.get(row.bucket)
+            if aggregate is None:
+                aggregate = buckets[row.bucket] = _Aggregate()
+            aggregate.count += row.count
+            aggregate.sum += row.sum
+            aggregate.min = min(aggregate.min, row.min)
+            aggregate.max = max(aggregate.max, row.max)
+            aggregate.sketch.merge(QuantileSketch.from_dict(row.sketch))
+
+        results = []
+        for bucket, aggregate in buckets.items():
+            result = {
+                "bucket": datetime.utcfromtimestamp(bucket),
+                "count": aggregate.count,
+                "mean": aggregate.sum / aggregate.count,
+                "min": aggregate.min,
+                "max": aggregate.max,
+            }
+            for q in quantiles:
+                # Sketch quantiles are approximate; keep them inside the exact range.
+                value = aggregate.sketch.quantile(q)
+                result[f"p{q * 100:g}"] = min(max(value, aggregate.min), aggregate.max)
+            results.append(result)
+        return results
@@ -3,6 +3,7 @@ from setuptools import setup
 setup(
     name="translation_module",
     version="1",
+    package_data={"": ["manifest.yaml"]},
     entry_points={
         "module_validator.translation": ["translation=module_validator.modules.translation.translation.Translation:process"],
     }
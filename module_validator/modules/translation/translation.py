@@ -1,5 +1,8 @@
 import io
+import os
+import wave
 import scipy
+import threading
 import torch
 import base64
 import torchaudio
@@ -7,7 +10,7 @@ import torchaudio
 from loguru import logger
 from typing import Optional
 from functools import lru_cache
-from typing import Dict, Tuple, Union
+from typing import Any, Dict, Tuple, Union
 from transformers import AutoProcessor, SeamlessM4Tv2Model
 from pydub import AudioSegment
 
@@ -16,12 +19,13 @@ from .data_models import TARGET_LANGUAGES, TASK_STRINGS, TranslationRequest, Tra
 translation_config = TranslationConfig()
 
 class Translation:
-    def __init__(self):
+    def __init__(self, config: Optional[TranslationConfig] = None):
         """
         Initializes a new instance of the Translation class.
 
         Args:
-            translation_config (TranslationConfig): The configuration object for translation.
+            config (TranslationConfig, optional): The configuration object for translation.
+                Defaults to the module level translation_config.
 
         Initializes the following instance variables:
             - translation_config (TranslationConfig): The configuration object for translation.
@@ -34,10 +38,11 @@ class Translation:
             - task_string (None): The task string for translation.
             - source_language (None): The source language for translation.
             - target_language (None): The target language for translation.
+            - lock (threading.Lock): Serializes requests, process keeps per-request state on the instance.
         """
-        self.translation_config = translation_config
-        self.processor = AutoProcessor.from_pretrained(translation_config.model_name_or_card)
-        self.model = SeamlessM4Tv2Model.from_pretrained(translation_config.model_name_or_card)
+        self.translation_config = config or translation_config
+        self.processor = AutoProcessor.from_pretrained(self.translation_config.model_name_or_card)
+        self.model = SeamlessM4Tv2Model.from_pretrained(self.translation_config.model_name_or_card)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model.to(self.device)
         self.target_languages: Dict[str, str] = TARGET_LANGUAGES
@@ -46,6 +51,18 @@ class Translation:
         self.task_string = None
         self.source_language = None
         self.target_language = None
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        """
+        Releases the processor and model weights held by this instance.
+
+        The instance can not process requests after it has been closed.
+        """
+        self.processor = None
+        self.model = None
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
 
     @lru_cache(maxsize=128)
     def _get_language(self, language: str) -> str:
@@ -133,6 +150,7 @@ class Translation:
         Raises:
             None
         """
+        os.makedirs("./module_validator/modules/translation/in", exist_ok=True)
         with open("./module_validator/modules/translation/in/audio_request.wav", "wb") as f:
             f.write(base64.b64decode(input_data))
         return "./module_validator/modules/translation/in/audio_request.wav"
@@ -359,9 +377,129 @@ def speech2speech(translation: Translation, miner_request: Optional[TranslationR
     return translation.process(translation_request)
 
 
-def process(translation_request: TranslationRequest):
-    translation = Translation()
-    translation.process(miner_request=translation_request)
+def instance_key(config: Dict[str, Any]) -> str:
+    """
+    Registry hook returning the key Translation instances are shared under.
+
+    Args:
+        config (Dict[str, Any]): The merged global and translation module configuration.
+
+    Returns:
+        str: The model card of the configured model.
+    """
+    return _translation_config(config).model_name_or_card
+
+
+def construct(config: Dict[str, Any]) -> Translation:
+    """
+    Registry hook that builds a Translation instance and loads its weights.
+
+    Args:
+        config (Dict[str, Any]): The merged global and translation module configuration.
+
+    Returns:
+        Translation: The constructed Translation object.
+    """
+    return Translation(_translation_config(config))
+
+
+def warmup_inputs(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Registry hook declaring one cheap representative request per task string.
+
+    Running them once initializes the kernels, tokenizer and allocator used by
+    _generate_text and _generate_audio before the module is marked ready.
+
+    Args:
+        config (Dict[str, Any]): The merged global and translation module configuration.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The warmup request data keyed by task string.
+    """
+    text = "Hello."
+    audio = _silent_wav_base64()
+    return {
+        task_string: {
+            "data": {
+                "input": audio if task_string.startswith("speech") else text,
+                "task_string": task_string,
+                "source_language": "English",
+                "target_language": "French",
+            }
+        }
+        for task_string in ("text2text", "text2speech", "speech2text", "speech2speech")
+    }
+
+
+def _silent_wav_base64(seconds: float = 0.5, sample_rate: int = 16000) -> str:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def configure(translation: Translation, changes: Dict[str, Any]) -> bool:
+    """
+    Registry hook deciding whether an instance survives a config change.
+
+    Every TranslationConfig field is read when the processor and weights are
+    loaded, so a change to any of them needs a new instance. Other keys of the
+    model section are not used by the instance.
+
+    Args:
+        translation (Translation): The instance constructed from the previous configuration.
+        changes (Dict[str, Any]): The changed keys of the merged configuration; removed keys map to None.
+
+    Returns:
+        bool: True if the instance is still valid, False if the registry has to construct a new one.
+    """
+    if "model" not in changes:
+        return True
+    model_changes = changes["model"]
+    if model_changes is None:
+        return False
+    return not set(model_changes) & set(TranslationConfig.model_fields)
+
+
+def close(translation: Translation) -> None:
+    """
+    Registry hook that frees the weights of an instance.
+    """
+    translation.close()
+
+
+def _translation_config(config: Dict[str, Any]) -> TranslationConfig:
+    model_config = (config or {}).get("model") or {}
+    return TranslationConfig(
+        **{key: value for key, value in model_config.items() if key in TranslationConfig.model_fields}
+    )
+
+
+@lru_cache(maxsize=None)
+def _default_translation() -> Translation:
+    return Translation()
+
+
+def process(translation_request: Union[TranslationRequest, Dict[str, Any]], instance: Optional[Translation] = None):
+    """
+    Entry point of the translation inference module.
+
+    Args:
+        translation_request (Union[TranslationRequest, Dict[str, Any]]): The request, or a dictionary with its data.
+        instance (Optional[Translation], optional): The Translation instance managed by the registry.
+            Defaults to a single instance constructed on first use.
+
+    Returns:
+        str: The base64 encoded output of the translation.
+    """
+    if isinstance(translation_request, dict):
+        translation_request = TranslationRequest(translation_request.get("data", translation_request))
+    translation = instance or _default_translation()
+    with translation.lock:
+        return translation.process(miner_request=translation_request)
     
 
 if __name__ == "__main__":
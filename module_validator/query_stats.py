@@ -0,0 +1,236 @@
+import bisect
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+# Bucket upper bounds: 10 µs to ~10 s for latencies, 0 to 65536 for row counts.
+LATENCY_BOUNDS_MS = [0.01 * 2**i for i in range(21)]
+ROW_BOUNDS = [0] + [2**i for i in range(17)]
+STATEMENT_KINDS = {"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def statement_kind(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    kind = words[0].upper() if words else ""
+    return kind if kind in STATEMENT_KINDS else "OTHER"
+
+
+class Histogram:
+    """Fixed-bucket histogram; record() is a bisect and a few additions."""
+
+    def __init__(self, bounds: List[float]):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th value, capped at the maximum."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class QueryStats:
+    """
+    Per-statement latency, row counts and pool wait times of one engine.
+
+    Nothing is attached to the engine until enable() is called, so an engine
+    without stats pays nothing. Latencies are timed around every cursor
+    execution and pool waits around every connection checkout. Rows are the
+    driver's rowcount for INSERT, UPDATE and DELETE; rows returned by SELECTs
+    are counted in the sessions passed to track_sessions, whose results are
+    buffered for that.
+
+    Only weak references to the engine and the session factories are kept, so
+    tracking them does not keep a disposed Database alive.
+    """
+
+    def __init__(self, engine):
+        self._engine = weakref.ref(engine)
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._sessions = weakref.WeakSet()
+        self.reset()
+
+    @property
+    def engine(self):
+        return self._engine()
+
+    def reset(self):
+        with self._lock:
+            self.latency_ms: Dict[str, Histogram] = {}
+            self.rows: Dict[str, Histogram] = {}
+            self.pool_wait_ms = Histogram(LATENCY_BOUNDS_MS)
+
+    def _record(self, histograms, bounds, kind, value):
+        with self._lock:
+            histogram = histograms.get(kind)
+            if histogram is None:
+                histogram = histograms[kind] = Histogram(bounds)
+            histogram.record(value)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        latency_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        kind = statement_kind(statement)
+        self._record(self.latency_ms, LATENCY_BOUNDS_MS, kind, latency_ms)
+        if kind in ("INSERT", "UPDATE", "DELETE") and cursor.rowcount >= 0:
+            self._record(self.rows, ROW_BOUNDS, kind, cursor.rowcount)
+
+    def _handle_error(self, context):
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+
+    def _do_orm_execute(self, orm_execute_state):
+        if not orm_execute_state.is_select:
+            return None
+        result = orm_execute_state.invoke_statement()
+        frozen = result.freeze()
+        self._record(self.rows, ROW_BOUNDS, "SELECT", len(frozen.data))
+        return frozen()
+
+    def _timed_raw_connection(self, raw_connection):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return raw_connection(*args, **kwargs)
+            finally:
+                wait_ms = (time.perf_counter() - start) * 1000
+                with self._lock:
+                    self.pool_wait_ms.record(wait_ms)
+
+        return timed
+
+    def enable(self):
+        if self.enabled:
+            return self
+        event.listen(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(self.engine, "handle_error", self._handle_error)
+        # Every Connection checks out its DBAPI connection through raw_connection.
+        self.engine.raw_connection = self._timed_raw_connection(self.engine.raw_connection)
+        for session_factory in list(self._sessions):
+            event.listen(session_factory, "do_orm_execute", self._do_orm_execute)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        if not self.enabled or self.engine is None:
+            return self
+        event.remove(self.engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(self.engine, "handle_error", self._handle_error)
+        del self.engine.raw_connection
+        for session_factory in list(self._sessions):
+            event.remove(session_factory, "do_orm_execute", self._do_orm_execute)
+        self.enabled = False
+        return self
+
+    def track_sessions(self, session_factory):
+        """Counts the rows returned by SELECTs run in sessions of `session_factory`."""
+        if session_factory in self._sessions:
+            return
+        self._sessions.add(session_factory)
+        if self.enabled:
+            event.listen(session_factory, "do_orm_execute", self._do_orm_execute)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                "url": self.engine.url.render_as_string(hide_password=True),
+                "enabled": self.enabled,
+                "statements": {
+                    kind: {
+                        "latency_ms": histogram.snapshot(),
+                        "rows": self.rows[kind].snapshot() if kind in self.rows else None,
+                    }
+                    for kind, histogram in sorted(self.latency_ms.items())
+                },
+                "pool_wait_ms": self.pool_wait_ms.snapshot(),
+            }
+
+
+_stats: "weakref.WeakKeyDictionary[object, QueryStats]" = weakref.WeakKeyDictionary()
+_stats_lock = threading.Lock()
+
+
+def get_query_stats(engine) -> QueryStats:
+    """The QueryStats of `engine`, shared by every Database using it."""
+    with _stats_lock:
+        stats = _stats.get(engine)
+        if stats is None:
+            stats = _stats[engine] = QueryStats(engine)
+        return stats
+
+
+def snapshot_all() -> List[Dict[str, Dict]]:
+    with _stats_lock:
+        # Holding the engines keeps them alive while they are snapshotted.
+        stats = list(_stats.items())
+    return [query_stats.snapshot() for _, query_stats in stats if query_stats.enabled]
+
+
+def _format_number(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def format_snapshots(snapshots: List[Dict[str, Dict]]) -> str:
+    if not snapshots:
+        return "Query stats are disabled. Set database.stats: true to collect them."
+    columns = ["count", "mean", "p50", "p95", "p99", "max"]
+    lines = []
+    for snapshot in snapshots:
+        lines.append(f"Engine {snapshot['url']}")
+        lines.append(f"  {'statement':<10} {'metric':<10} " + " ".join(f"{c:>10}" for c in columns))
+        rows = []
+        for kind, histograms in snapshot["statements"].items():
+            rows.append((kind, "ms", histograms["latency_ms"]))
+            if histograms["rows"]:
+                rows.append((kind, "rows", histograms["rows"]))
+        rows.append(("pool", "wait ms", snapshot["pool_wait_ms"]))
+        for kind, metric, values in rows:
+            lines.append(
+                f"  {kind:<10} {metric:<10} "
+                + " ".join(f"{_format_number(values[c]):>10}" for c in columns)
+            )
+    return "\n".join(lines)
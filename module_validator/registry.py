@@ -1,48 +1,915 @@
-import importlib.metadata
 import os
+import asyncio
 import importlib
+import importlib.util
+import functools
+import hashlib
+import inspect
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
 from .database import Database
 from .config import Config
-import pkg_resources
+from .entry_points import FailedEntryPointCache, get_index, iter_entry_points
+from .manifest import load_manifest
+from .result_cache import ResultCache, cache_key, content_digest, dumps
+from .workers import ModuleWorker, WorkerRetired
 import sys
 
 
+def _warm_worker_process(module_name, attr, warmup_inputs):
+    """
+    Initializer of warmed process pools: imports the module and runs its
+    warmup inputs in the worker, before the worker takes its first call.
+    """
+    try:
+        function = importlib.import_module(module_name)
+        for part in attr.split("."):
+            function = getattr(function, part)
+        for task_string, data in warmup_inputs.items():
+            start = time.perf_counter()
+            result = function(data)
+            if inspect.isawaitable(result):
+                asyncio.run(result)
+            print(
+                f"Warmed up worker {os.getpid()} of {module_name} for {task_string} "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+    except Exception as e:
+        # A failed warmup must not break the pool; the call reports the error.
+        print(f"Failed to warm up worker {os.getpid()} of {module_name}: {e}")
+
+
+def _worker_pid():
+    return os.getpid()
+
+
 class ModuleRegistry:
-    def __init__(self, config: Config, db: Database = None):
+    """
+    Loads the inference modules registered in the module_validator.inference
+    entry point group.
+
+    A Python module behind an entry point can let the registry manage a long-lived
+    instance for it by defining lifecycle hooks next to the entry point function:
+        construct(config) -> instance   loads the weights, called once per process
+        instance_key(config) -> str     instances are shared per key (default: name)
+        close(instance)                 optional, frees the weights
+    The entry point function is then called with the instance as `instance=`.
+
+    Modules can declare cheap representative requests to run before they are
+    marked ready, one per task string:
+        warmup_inputs(config) -> {task_string: data}
+    Modules with an instance can define warmup(instance) instead. Calls made
+    through get_module while a warmup is running wait until the module is ready.
+
+    get_module always returns an awaitable callable. Synchronous entry points are
+    run in a per-module executor configured by the module's performance section:
+        performance:
+          executor: thread      # thread | process
+          num_workers: 2
+    Process pools call the bare entry point function, so every worker process
+    builds its own instance. Warming such a module warms the pool's workers, which
+    run the warmup inputs as they start, and never constructs an instance in
+    this process. Without a configured num_workers, modules whose
+    manifest (see manifest.ModuleManifest) says they are not thread-safe get a
+    single worker. get_manifest reads the manifest without importing the module.
+
+    In isolated mode the registry never imports a module itself: each module runs
+    in its own worker process (see workers.ModuleWorker), and large strings and
+    arrays, such as audio, are handed over through shared memory.
+
+    Eager loading imports the modules in parallel and gives up on a module after
+    `load_timeout` seconds. Entry points that fail to import are recorded in a
+    negative cache and skipped until the version of their package changes.
+
+    Loaded modules can be reloaded in place. check_for_changes compares the
+    source files of every loaded module, and the installed entry points, with
+    the ones it was loaded from and calls reload_module for the modules that
+    changed; watch runs it periodically in a background thread. A reload
+    imports and constructs the new version next to the old one, then swaps it
+    in. Calls already running finish on the old instance, which is closed
+    afterwards, and modules that did not change keep their instances.
+
+    When the configuration is watched (see Config.watch), a loaded module is
+    told about changes to its config, which arrive as only the changed keys.
+    Modules with an instance can apply them in place with
+        configure(instance, changes) -> bool   True if the instance is still valid
+    otherwise the instance is replaced by one constructed from the new config,
+    and the old one is closed once its running calls return, as on a reload.
+    Modules without an instance get configure(changes). Modules running in
+    isolated workers pick up config changes on their next reload.
+
+    Modules whose config sets `cache_results` (or inherit it from
+    default_module_settings) have their results cached for `cache_ttl` seconds
+    in a result_cache.ResultCache, keyed by the module, its version, source
+    files and config, and the call's arguments. Reloading or reconfiguring a
+    module therefore starts from an empty cache for it. Calls with arguments that can not be hashed by
+    content (other than str, bytes, numbers, containers, arrays and tensors)
+    are not cached.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        db: Database = None,
+        lazy: bool = False,
+        load_timeout: float = 60.0,
+        failed_entry_points: FailedEntryPointCache = None,
+        isolated: bool = False,
+        result_cache: ResultCache = None,
+    ):
         self.config = config
         self.db = db or Database(config.get_global_config())
+        self.lazy = lazy
+        self.isolated = isolated
+        self.load_timeout = load_timeout
+        self.failed_entry_points = failed_entry_points or FailedEntryPointCache()
         self.modules = {}
+        self.entry_points = {}
+        self.instances = {}
+        self.instance_keys = {}
+        self.executors = {}
+        self.workers = {}
+        self.readiness = {}
+        self.warmup_errors = {}
+        self.loaded_entry_points = {}
+        self.fingerprints = {}
+        self.manifests = {}
+        self.in_flight = {}
+        self.retired = {}
+        self._instance_lock = threading.RLock()
+        self._construct_locks = {}
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self._result_cache = result_cache
+        # Pending writes to the result cache table, referenced until they finish.
+        self._cache_writes = set()
+        self._versions = {}
 
     def load_modules(self):
         print("Starting to load modules...")
-        entry_points = list(
-            pkg_resources.iter_entry_points(group="module_validator.inference")
-        )
+        entry_points = iter_entry_points(group="module_validator.inference")
         print(f"Found {len(entry_points)} entry points")
 
+        loadable = []
         for entry_point in entry_points:
-            print(
-                f"Attempting to load: {entry_point.name} = {entry_point.module_name}:{entry_point.attrs[0]}"
-            )
+            error = self.failed_entry_points.get_failure(entry_point)
+            if error:
+                print(
+                    f"Skipping module {entry_point.name}: {entry_point.dist} "
+                    f"{entry_point.version} failed to load before ({error})"
+                )
+            else:
+                loadable.append(entry_point)
+
+        if self.lazy or self.isolated:
+            # Only record the entry point metadata, the import happens on the
+            # first get_module call for that name, or in the worker process.
+            for entry_point in loadable:
+                self.entry_points[entry_point.name] = entry_point
+            print(f"Deferred loading of {len(loadable)} modules")
+            return
+
+        # Import in parallel so startup costs the slowest import, not the sum.
+        pool = ThreadPoolExecutor(
+            max_workers=max(len(loadable), 1), thread_name_prefix="module-loader"
+        )
+        futures = {
+            pool.submit(self._import_entry_point, entry_point): entry_point
+            for entry_point in loadable
+        }
+        done, not_done = wait(futures, timeout=self.load_timeout)
+        pool.shutdown(wait=False)
+
+        for future, entry_point in futures.items():
+            if future in not_done:
+                # Timeouts are not cached, get_module retries the import later.
+                print(
+                    f"Timed out loading module {entry_point.name} after {self.load_timeout}s"
+                )
+                self.entry_points[entry_point.name] = entry_point
+            elif future.result():
+                self.modules[entry_point.name] = future.result()
+        self.failed_entry_points.save()
+
+    def retry_failed_modules(self):
+        """
+        Clears the cached import failures, so that the modules load_modules
+        skipped are imported again on their next get_module. Returns their names.
+        """
+        self.failed_entry_points.clear()
+        known = set(self.modules) | set(self.entry_points) | set(self.loaded_entry_points)
+        retried = []
+        for entry_point in iter_entry_points(group="module_validator.inference"):
+            if entry_point.name not in known:
+                self.entry_points[entry_point.name] = entry_point
+                retried.append(entry_point.name)
+        return retried
+
+    def _import_entry_point(self, entry_point):
+        print(
+            f"Attempting to load: {entry_point.name} = {entry_point.value}"
+        )
+        try:
+            module = importlib.import_module(entry_point.module)
+            print(f"Successfully imported module: {entry_point.module}")
+
+            module_function = getattr(module, entry_point.attr)
+            print(f"Successfully got attribute: {entry_point.attr}")
+
+            print(f"Successfully registered module: {entry_point.name}")
+            self.failed_entry_points.record_success(entry_point)
+            self.loaded_entry_points[entry_point.name] = entry_point
+            self.fingerprints[entry_point.name] = self._fingerprint(entry_point.module)
+            self.config.subscribe(entry_point.name, self._configure_module)
+            return module_function
+        except Exception as e:
+            print(f"Failed to load module {entry_point.name}: {e}")
+            print(f"Exception type: {type(e).__name__}")
+            print(f"Module search path: {sys.path}")
+            self.failed_entry_points.record_failure(entry_point, e)
+            return None
+
+    def _resolve(self, name):
+        module = self.modules.get(name)
+        if module is None and name in self.entry_points:
+            module = self._import_entry_point(self.entry_points.pop(name))
+            if module:
+                self.modules[name] = module
+            self.failed_entry_points.save()
+        return module
+
+    def get_module(self, name):
+        if self.isolated:
+            worker = self._get_worker(name)
+            if worker is None:
+                return None
+            module = worker.call
+
+            async def call(*args, **kwargs):
+                loop = asyncio.get_running_loop()
+                while True:
+                    # Looked up per call, so that a reloaded module's new worker is used.
+                    worker = self._get_worker(name)
+                    try:
+                        return await loop.run_in_executor(
+                            None, functools.partial(worker.call, *args, **kwargs)
+                        )
+                    except WorkerRetired:
+                        continue
+
+            return self._gate_on_readiness(name, module, self._cache_results(name, call))
+
+        module = self._resolve(name)
+        if module is None:
+            return None
+
+        if inspect.iscoroutinefunction(module):
+
+            async def call(*args, **kwargs):
+                return await self.modules.get(name, module)(*args, **kwargs)
+
+        else:
+
+            async def call(*args, **kwargs):
+                # The current version and instance are bound per call: a reload
+                # during the call does not close the instance until it returns.
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor(name)
+                bind_instance = not isinstance(executor, ProcessPoolExecutor)
+                if bind_instance and self.instance_keys.get(name) not in self.instances:
+                    # The first call constructs the instance; loading a model must not block the loop.
+                    function, instance = await loop.run_in_executor(None, self._acquire, name)
+                else:
+                    function, instance = self._acquire(name, bind_instance)
+                try:
+                    return await loop.run_in_executor(
+                        executor, functools.partial(function, *args, **kwargs)
+                    )
+                finally:
+                    self._release(instance)
+
+        return self._gate_on_readiness(name, module, self._cache_results(name, call))
+
+    def _acquire(self, name, bind_instance=True):
+        function = self._resolve(name)
+        if not (bind_instance and self._get_hooks(function)):
+            return function, None
+        while True:
+            instance = self.construct_module(name)
+            if instance is None:
+                return function, None
+            with self._instance_lock:
+                # The instance may have been replaced since it was constructed.
+                if self.instances.get(self.instance_keys.get(name)) is instance:
+                    self.in_flight[id(instance)] = self.in_flight.get(id(instance), 0) + 1
+                    return functools.partial(function, instance=instance), instance
+
+    def _release(self, instance):
+        if instance is None:
+            return
+        with self._instance_lock:
+            count = self.in_flight.pop(id(instance)) - 1
+            if count:
+                self.in_flight[id(instance)] = count
+                return
+            retired = self.retired.pop(id(instance), None)
+        if retired is not None:
+            self._close_instance(*retired)
+
+    def _retire(self, hooks, instance):
+        """Closes a replaced instance, or defers it until its last call returns."""
+        with self._instance_lock:
+            if self.in_flight.get(id(instance)):
+                self.retired[id(instance)] = (hooks, instance)
+                return
+        self._close_instance(hooks, instance)
+
+    def _close_instance(self, hooks, instance):
+        if hooks is not None and hasattr(hooks, "close"):
+            print(f"Closing replaced instance of {hooks.__name__}")
+            hooks.close(instance)
+
+    @property
+    def result_cache(self):
+        if self._result_cache is None:
+            settings = self.config.get_global_config().get("result_cache") or {}
+            self._result_cache = ResultCache(self.db, **settings)
+        return self._result_cache
+
+    def _cache_settings(self, name):
+        config = self.config.get_config(name)
+        defaults = config.get("default_module_settings") or {}
+        enabled = config.get("cache_results", defaults.get("cache_results", False))
+        return bool(enabled), config.get("cache_ttl", defaults.get("cache_ttl", 3600))
+
+    def _module_version(self, name):
+        """
+        Version of the loaded entry point plus a hash of its source file mtimes
+        and one of its config outside the performance section, so results
+        cached under an older config are not served after it changed.
+        """
+        fingerprint = self.fingerprints.get(name)
+        config = self.config.get_config(name)
+        cached = self._versions.get(name)
+        if cached is not None and cached[0] is fingerprint and cached[1] is config:
+            return cached[2]
+        entry_point = self.loaded_entry_points.get(name) or self.entry_points.get(name)
+        digest = hashlib.sha1(repr(sorted((fingerprint or {}).items())).encode()).hexdigest()
+        settings = {key: value for key, value in config.items() if key != "performance"}
+        config_digest = content_digest(settings) or hashlib.sha256(repr(settings).encode()).hexdigest()
+        version = f"{getattr(entry_point, 'version', '')}:{digest[:16]}:{config_digest[:16]}"
+        self._versions[name] = (fingerprint, config, version)
+        return version
+
+    def _cache_results(self, name, call):
+        enabled, ttl = self._cache_settings(name)
+        if not enabled:
+            return call
+        cache = self.result_cache
+
+        async def cached_call(*args, **kwargs):
+            key = cache_key(name, self._module_version(name), args, kwargs)
+            if key is None:
+                return await call(*args, **kwargs)
+            try:
+                return cache.get_memory(key)
+            except KeyError:
+                pass
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(None, cache.get, key)
+            except KeyError:
+                pass
+            result = await call(*args, **kwargs)
+            try:
+                data = dumps(result)
+            except (TypeError, ValueError):
+                return result
+            cache.put_memory(key, data, time.time() + ttl)
+            write = loop.run_in_executor(None, cache.write, key, name, data, ttl)
+            self._cache_writes.add(write)
+            write.add_done_callback(functools.partial(self._cache_write_done, name))
+            return result
+
+        return cached_call
+
+    def _cache_write_done(self, name, write):
+        self._cache_writes.discard(write)
+        if not write.cancelled() and write.exception() is not None:
+            print(f"Failed to write the cached result of module {name}: {write.exception()}")
+
+    def _gate_on_readiness(self, name, module, call):
+        @functools.wraps(module)
+        async def run_when_ready(*args, **kwargs):
+            event = self.readiness.get(name)
+            if event is not None and not event.is_set():
+                await asyncio.get_running_loop().run_in_executor(None, event.wait)
+            return await call(*args, **kwargs)
+
+        return run_when_ready
+
+    def _get_worker(self, name):
+        with self._instance_lock:
+            if name not in self.workers:
+                entry_point = self.entry_points.get(name)
+                if entry_point is None:
+                    return None
+                self.workers[name] = ModuleWorker(entry_point, self.config.get_config(name))
+                self.loaded_entry_points[name] = entry_point
+                self.fingerprints[name] = self._fingerprint(entry_point.module)
+            return self.workers[name]
+
+    def _get_executor(self, name):
+        executor = self.executors.get(name)
+        if executor is not None:
+            return executor
+        # Built outside the lock: reading the manifest and warmup inputs can be slow.
+        executor = self._new_executor(name)
+        with self._instance_lock:
+            current = self.executors.setdefault(name, executor)
+        if current is not executor:
+            executor.shutdown(wait=False)
+        return current
+
+    def _num_workers(self, name):
+        performance = self.config.get_config(name).get("performance") or {}
+        num_workers = performance.get("num_workers")
+        manifest = self.get_manifest(name)
+        if num_workers is None and manifest is not None and not manifest.thread_safe:
+            num_workers = 1
+        return num_workers
+
+    def _new_executor(self, name):
+        performance = self.config.get_config(name).get("performance") or {}
+        executor_type = performance.get("executor", "thread")
+        num_workers = self._num_workers(name)
+        if executor_type == "process":
+            return ProcessPoolExecutor(max_workers=num_workers, **self._worker_warmup(name))
+        if executor_type == "thread":
+            return ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix=f"module-{name}")
+        raise ValueError(f"Unknown executor type for module {name}: {executor_type}")
+
+    def _worker_warmup(self, name):
+        """Initializer arguments that warm the processes of a module's pool, once warmup was requested."""
+        entry_point = self.loaded_entry_points.get(name)
+        if name not in self.readiness or entry_point is None:
+            return {}
+        hooks = sys.modules.get(getattr(self.modules.get(name), "__module__", None))
+        warmup_inputs = getattr(hooks, "warmup_inputs", None)
+        inputs = warmup_inputs(self.config.get_config(name)) if warmup_inputs else {}
+        return {
+            "initializer": _warm_worker_process,
+            "initargs": (entry_point.module, entry_point.attr, inputs),
+        }
+
+    def _uses_process_pool(self, name, module):
+        if inspect.iscoroutinefunction(module):
+            return False
+        performance = self.config.get_config(name).get("performance") or {}
+        return performance.get("executor", "thread") == "process"
+
+    def _warm_process_pool(self, name, executor, num_workers):
+        """
+        Starts the `num_workers` workers of a module's process pool (None: the
+        pool's default of one per CPU); each runs the warmup inputs first.
+        """
+        num_workers = num_workers or os.cpu_count() or 1
+        pids = {future.result() for future in [
+            executor.submit(_worker_pid) for _ in range(num_workers)
+        ]}
+        print(f"Warmed up module {name} in {len(pids)} worker processes")
+
+    def get_manifest(self, name):
+        if name not in self.manifests:
+            entry_point = self.loaded_entry_points.get(name) or self.entry_points.get(name)
+            self.manifests[name] = load_manifest(entry_point) if entry_point else None
+        return self.manifests[name]
+
+    def list_manifests(self):
+        return {name: self.get_manifest(name) for name in self.list_modules()}
+
+    def _configure_module(self, name, changes):
+        """
+        Called by the config watcher with the keys of a module's config that
+        changed. The module's instance gets the changes outside the performance
+        section. A change to the performance section replaces the module's
+        executor, and so does any change for a module running in a process
+        pool, whose workers built their instances from the old config.
+        """
+        module = self.modules.get(name)
+        hooks = self._get_hooks(module) if module else None
+        instance_changes = {key: value for key, value in changes.items() if key != "performance"}
+        if hooks is not None:
+            if instance_changes:
+                self._reconfigure_instance(name, module, hooks, instance_changes)
+        else:
+            module_hooks = sys.modules.get(getattr(module, "__module__", None))
+            if module_hooks is not None and callable(getattr(module_hooks, "configure", None)):
+                print(f"Reconfiguring module {name}: {', '.join(changes)}")
+                module_hooks.configure(changes)
+        in_pool = module is not None and self._uses_process_pool(name, module)
+        if "performance" in changes or (in_pool and instance_changes):
+            self._replace_executor(name, module)
+
+    def _replace_executor(self, name, module):
+        """
+        Drops a module's executor so that the next call creates one from the
+        current config. A warmed module moving to a process pool gets the new
+        pool warmed up before it is swapped in, so calls never wait for cold
+        workers, and keeps the old executor if the new pool fails to start.
+        """
+        replacement = None
+        if name in self.readiness and module is not None and self._uses_process_pool(name, module):
+            replacement = self._new_executor(name)
             try:
-                module = importlib.import_module(entry_point.module_name)
-                print(f"Successfully imported module: {entry_point.module_name}")
+                self._warm_process_pool(name, replacement, self._num_workers(name))
+            except Exception as e:
+                print(f"Failed to start a new process pool for module {name}: {e}")
+                replacement.shutdown(wait=False)
+                return
+        with self._instance_lock:
+            executor = self.executors.pop(name, None)
+            if replacement is not None:
+                self.executors[name] = replacement
+        if executor is not None:
+            # Running calls finish on the old executor; new calls use the new one.
+            executor.shutdown(wait=False)
+
+    def _reconfigure_instance(self, name, module, hooks, changes):
+        """
+        Passes config changes to the instance of a module, or replaces the
+        instance when it can not apply them. A warmed module keeps serving from
+        the old instance until the new one is constructed and warmed up.
+        """
+        with self._instance_lock:
+            key = self.instance_keys.get(name)
+            instance = self.instances.get(key)
+        if instance is None:
+            return
+        configure = getattr(hooks, "configure", None)
+        if callable(configure) and configure(instance, changes):
+            print(f"Reconfigured instance of module {name}: {', '.join(changes)}")
+            return
+
+        print(f"Replacing instance of module {name}: {', '.join(changes)}")
+        new_key = self._instance_key(name, hooks)
+        replacement = None
+        try:
+            if name in self.readiness and (new_key == key or new_key not in self.instances):
+                replacement = hooks.construct(self.config.get_config(name))
+                self._run_warmup(name, module, replacement)
+        except Exception as e:
+            print(f"Failed to reconfigure module {name}: {e}")
+            if replacement is not None:
+                self._close_instance(hooks, replacement)
+            return
+        with self._instance_lock:
+            if self.instances.get(key) is instance:
+                del self.instances[key]
+            self.instance_keys.pop(name, None)
+            if replacement is not None:
+                self.instances[new_key] = replacement
+                self.instance_keys[name] = new_key
+        self._retire(hooks, instance)
+
+    def _get_hooks(self, module_function):
+        hooks = sys.modules.get(getattr(module_function, "__module__", None))
+        if hooks is not None and callable(getattr(hooks, "construct", None)):
+            return hooks
+        return None
+
+    def _instance_key(self, name, hooks):
+        key = name
+        if hasattr(hooks, "instance_key"):
+            key = hooks.instance_key(self.config.get_config(name))
+        return (hooks.__name__, key)
+
+    def construct_module(self, name):
+        module = self._resolve(name)
+        hooks = self._get_hooks(module) if module else None
+        if hooks is None:
+            return None
+
+        key = self._instance_key(name, hooks)
+        with self._instance_lock:
+            instance = self.instances.get(key)
+            if instance is not None:
+                self.instance_keys[name] = key
+                return instance
+            construct_lock = self._construct_locks.setdefault(key, threading.Lock())
+        # Only callers of the same instance wait for the construction; the
+        # registry lock stays free for every other module meanwhile.
+        with construct_lock:
+            with self._instance_lock:
+                instance = self.instances.get(key)
+            if instance is None:
+                print(f"Constructing instance of module {name}: {key[1]}")
+                instance = hooks.construct(self.config.get_config(name))
+            with self._instance_lock:
+                instance = self.instances.setdefault(key, instance)
+                self.instance_keys[name] = key
+                self._construct_locks.pop(key, None)
+            return instance
+
+    def _readiness_event(self, name):
+        with self._instance_lock:
+            return self.readiness.setdefault(name, threading.Event())
+
+    def warmup_module(self, name):
+        event = self._readiness_event(name)
+        instance = None
+        try:
+            if self.isolated:
+                worker = self._get_worker(name)
+                if worker is None:
+                    raise ValueError(f"Module '{name}' not found")
+                worker.start(warmup=True)
+                return None
 
-                module_function = getattr(module, entry_point.attrs[0])
-                print(f"Successfully got attribute: {entry_point.attrs[0]}")
+            module = self._resolve(name)
+            if module is None:
+                raise ValueError(f"Module '{name}' not found")
+            if self._uses_process_pool(name, module):
+                # Calls run in the pool's processes; loading the model here would be wasted.
+                self._warm_process_pool(name, self._get_executor(name), self._num_workers(name))
+            else:
+                instance = self.construct_module(name)
+                self._run_warmup(name, module, instance)
+            self.warmup_errors.pop(name, None)
+        except Exception as e:
+            print(f"Failed to warm up module {name}: {e}")
+            self.warmup_errors[name] = f"{type(e).__name__}: {e}"
+        finally:
+            event.set()
+        return instance
 
-                self.modules[entry_point.name] = module_function
-                print(f"Successfully registered module: {entry_point.name}")
+    def _run_warmup(self, name, module, instance):
+        hooks = sys.modules.get(module.__module__)
+        if hasattr(hooks, "warmup_inputs"):
+            if instance is not None:
+                module = functools.partial(module, instance=instance)
+            warmup_inputs = hooks.warmup_inputs(self.config.get_config(name))
+            for task_string, data in warmup_inputs.items():
+                start = time.perf_counter()
+                result = module(data)
+                if inspect.isawaitable(result):
+                    asyncio.run(result)
+                print(
+                    f"Warmed up module {name} for {task_string} "
+                    f"in {time.perf_counter() - start:.2f}s"
+                )
+        elif instance is not None and hasattr(hooks, "warmup"):
+            print(f"Warming up module {name}")
+            hooks.warmup(instance)
+
+    def warmup_modules(self, names=None):
+        names = names or self.list_modules()
+        # Create every event first so that calls made during warmup wait for it.
+        for name in names:
+            self._readiness_event(name)
+        for name in names:
+            self.warmup_module(name)
+
+    def is_ready(self, name):
+        event = self.readiness.get(name)
+        return event is not None and event.is_set() and name not in self.warmup_errors
+
+    def wait_ready(self, name, timeout=None):
+        self._readiness_event(name).wait(timeout)
+        return self.is_ready(name)
+
+    async def wait_until_ready(self, name, timeout=None):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.wait_ready, name, timeout)
+
+    def readiness_status(self):
+        status = {}
+        for name in self.list_modules():
+            event = self.readiness.get(name)
+            if event is None:
+                status[name] = "cold"
+            elif not event.is_set():
+                status[name] = "warming"
+            elif name in self.warmup_errors:
+                status[name] = "failed"
+            else:
+                status[name] = "ready"
+        return status
+
+    def close_module(self, name):
+        module = self.modules.get(name)
+        hooks = self._get_hooks(module) if module else None
+        if hooks is None:
+            return False
+
+        with self._instance_lock:
+            key = self.instance_keys.pop(name, None) or self._instance_key(name, hooks)
+            instance = self.instances.pop(key, None)
+        if instance is None:
+            return False
+        if hasattr(hooks, "close"):
+            print(f"Closing instance of module {name}")
+            hooks.close(instance)
+        return True
+
+    def _fingerprint(self, module_name):
+        """
+        Modification times of the source files a module was loaded from: its
+        package directory, or the file itself for a top-level module.
+        """
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except (ImportError, ValueError):
+            return {}
+        if spec is None:
+            return {}
+        if spec.submodule_search_locations:
+            roots = list(spec.submodule_search_locations)
+        elif spec.has_location and spec.origin:
+            if "." not in module_name:
+                return {spec.origin: os.stat(spec.origin).st_mtime_ns}
+            roots = [os.path.dirname(spec.origin)]
+        else:
+            return {}
+
+        fingerprint = {}
+        for root in roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+                for filename in filenames:
+                    if filename.endswith(".py"):
+                        path = os.path.join(dirpath, filename)
+                        try:
+                            fingerprint[path] = os.stat(path).st_mtime_ns
+                        except FileNotFoundError:
+                            continue
+        return fingerprint
+
+    def check_for_changes(self):
+        """
+        Reloads the loaded modules whose source files or installed entry point
+        changed, and picks up newly installed entry points. Returns the names
+        of the reloaded modules.
+        """
+        get_index().invalidate()
+        installed = {
+            entry_point.name: entry_point
+            for entry_point in iter_entry_points(group="module_validator.inference")
+        }
+        for name, entry_point in installed.items():
+            if name not in self.modules and name not in self.loaded_entry_points:
+                self.entry_points[name] = entry_point
+
+        reloaded = []
+        for name, loaded in list(self.loaded_entry_points.items()):
+            entry_point = installed.get(name, loaded)
+            if entry_point == loaded and self._fingerprint(loaded.module) == self.fingerprints.get(name):
+                continue
+            print(f"Detected changes in module {name}")
+            if self.reload_module(name, entry_point):
+                reloaded.append(name)
+        return reloaded
+
+    def reload_module(self, name, entry_point=None):
+        """
+        Imports a new version of a loaded module and swaps it in atomically.
+        The old version keeps serving until the new one is constructed and
+        warmed up, and stays in place if the new one fails to load.
+        """
+        with self._reload_lock:
+            entry_point = entry_point or self.loaded_entry_points.get(name)
+            if entry_point is None:
+                raise ValueError(f"Module '{name}' is not loaded")
+            self.manifests.pop(name, None)
+            if self.isolated:
+                return self._reload_worker(name, entry_point)
+
+            # Forget every module of the package so that the import reads it from disk.
+            stale_files = set(self.fingerprints.get(name, {}))
+            stale_modules = {
+                module_name: module
+                for module_name, module in list(sys.modules.items())
+                if getattr(module, "__file__", None) in stale_files
+                or module_name == entry_point.module
+            }
+            for module_name in stale_modules:
+                sys.modules.pop(module_name, None)
+            importlib.invalidate_caches()
+
+            module = self._import_entry_point(entry_point)
+            if module is None:
+                sys.modules.update(stale_modules)
+                # Remember the broken version so it is not retried until it changes again.
+                self.loaded_entry_points[name] = entry_point
+                self.fingerprints[name] = self._fingerprint(entry_point.module)
+                self.failed_entry_points.save()
+                return False
+
+            hooks = self._get_hooks(module)
+            instance = None
+            # Process pool workers build their own instances; the new pool is warmed below.
+            in_pool = self._uses_process_pool(name, module)
+            try:
+                if hooks is not None and not in_pool:
+                    instance = hooks.construct(self.config.get_config(name))
+                if name in self.readiness and not in_pool:
+                    self._run_warmup(name, module, instance)
             except Exception as e:
-                print(f"Failed to load module {entry_point.name}: {e}")
-                print(f"Exception type: {type(e).__name__}")
-                print(f"Module search path: {sys.path}")
+                print(f"Failed to reload module {name}: {e}")
+                for module_name in set(sys.modules) & set(stale_modules):
+                    sys.modules.pop(module_name)
+                sys.modules.update(stale_modules)
+                if instance is not None:
+                    self._close_instance(hooks, instance)
+                return False
 
-    def get_module(self, name):
-        return self.modules.get(name)
+            with self._instance_lock:
+                old_module = self.modules.get(name)
+                old_hooks = stale_modules.get(getattr(old_module, "__module__", None))
+                old_instance = None
+                if old_hooks is not None and callable(getattr(old_hooks, "construct", None)):
+                    old_key = self.instance_keys.pop(name, None) or self._instance_key(name, old_hooks)
+                    old_instance = self.instances.pop(old_key, None)
+                self.modules[name] = module
+                if instance is not None:
+                    key = self._instance_key(name, hooks)
+                    self.instances[key] = instance
+                    self.instance_keys[name] = key
+                executor = self.executors.get(name)
+                if isinstance(executor, ProcessPoolExecutor):
+                    del self.executors[name]
+            if isinstance(executor, ProcessPoolExecutor):
+                # Pool processes imported the old code; running tasks still finish.
+                executor.shutdown(wait=False)
+            if old_instance is not None:
+                self._retire(old_hooks, old_instance)
+            if in_pool and name in self.readiness:
+                self._warm_process_pool(name, self._get_executor(name), self._num_workers(name))
+            self.failed_entry_points.save()
+            print(f"Reloaded module {name}")
+            return True
+
+    def _reload_worker(self, name, entry_point):
+        worker = ModuleWorker(entry_point, self.config.get_config(name))
+        try:
+            worker.start(warmup=name in self.readiness)
+        except Exception as e:
+            print(f"Failed to reload module {name}: {e}")
+            return False
+        with self._instance_lock:
+            old_worker = self.workers.get(name)
+            self.workers[name] = worker
+            self.entry_points[name] = entry_point
+            self.loaded_entry_points[name] = entry_point
+            self.fingerprints[name] = self._fingerprint(entry_point.module)
+        if old_worker is not None:
+            threading.Thread(
+                target=old_worker.retire, name=f"retire-{name}", daemon=True
+            ).start()
+        print(f"Reloaded module {name}")
+        return True
+
+    def watch(self, interval=2.0):
+        """Checks for changed modules every `interval` seconds until close."""
+        if self._watcher is not None:
+            return self._watcher
+
+        def run():
+            while not self._stop_watching.wait(interval):
+                try:
+                    self.check_for_changes()
+                except Exception as e:
+                    print(f"Error checking modules for changes: {e}")
+
+        self._stop_watching.clear()
+        self._watcher = threading.Thread(target=run, name="module-watcher", daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def close(self):
+        self._stop_watching.set()
+        self._watcher = None
+        with self._instance_lock:
+            instances, self.instances = self.instances, {}
+            self.instance_keys = {}
+            executors, self.executors = self.executors, {}
+            workers, self.workers = self.workers, {}
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+        for worker in workers.values():
+            worker.stop()
+        for (hooks_name, key), instance in instances.items():
+            hooks = sys.modules.get(hooks_name)
+            if hooks is not None and hasattr(hooks, "close"):
+                print(f"Closing instance {key}")
+                hooks.close(instance)
 
     def list_modules(self):
-        return list(self.modules.keys())
+        return list(self.modules.keys()) + [
+            name for name in self.entry_points if name not in self.modules
+        ]
 
     def _load_module(self, name, entry_point):
         try:
@@ -56,16 +923,25 @@ class ModuleRegistry:
         module = self._load_module(name, entry_point)
         if module:
             self.modules[name] = module
-            self.db.add_module(name, version, entry_point, config)
+            self.db.upsert_modules(
+                [{"name": name, "version": version, "entry_point": entry_point, "config": config}]
+            )
             if hasattr(module, "configure"):
                 module.configure(config or {})
             return True
         return False
 
     def unregister_module(self, name):
-        if name in self.modules:
-            del self.modules[name]
-            self.db.delete_module(name)
+        if name in self.modules or name in self.entry_points:
+            self.close_module(name)
+            worker = self.workers.pop(name, None)
+            if worker is not None:
+                worker.stop()
+            self.modules.pop(name, None)
+            self.entry_points.pop(name, None)
+            with self.db.session():
+                self.db.delete_module(name)
+                self.db.delete_module_commands(name)
             return True
         return False
 
@@ -0,0 +1,306 @@
+import base64
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+
+from .database import UPSERT_DIALECTS, ResultCacheEntry, upsert_insert
+
+
+def _is_ndarray(value: Any) -> bool:
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _is_tensor(value: Any) -> bool:
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+class _Uncacheable(TypeError):
+    pass
+
+
+def _feed(digest, value: Any):
+    """Adds a type-tagged encoding of `value` to `digest`, by content only."""
+    if value is None or isinstance(value, (bool, int, float)):
+        digest.update(f"{type(value).__name__}:{value!r};".encode("ascii"))
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        digest.update(f"str:{len(data)}:".encode("ascii"))
+        digest.update(data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = value.tobytes() if isinstance(value, memoryview) else bytes(value)
+        digest.update(f"bytes:{len(data)}:".encode("ascii"))
+        digest.update(data)
+    elif isinstance(value, dict):
+        digest.update(f"dict:{len(value)}:".encode("ascii"))
+        for key in value:
+            if not (key is None or isinstance(key, (str, bool, int, float))):
+                raise _Uncacheable(type(key).__name__)
+        for key in sorted(value, key=lambda key: (type(key).__name__, repr(key))):
+            _feed(digest, key)
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}:{len(value)}:".encode("ascii"))
+        for item in value:
+            _feed(digest, item)
+    elif _is_ndarray(value):
+        import numpy
+
+        digest.update(f"ndarray:{value.dtype.str}:{value.shape}:".encode("ascii"))
+        digest.update(numpy.ascontiguousarray(value).tobytes())
+    elif _is_tensor(value):
+        import torch
+
+        tensor = value.detach().cpu().contiguous()
+        digest.update(f"tensor:{tensor.dtype}:{tuple(tensor.shape)}:".encode("ascii"))
+        digest.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    else:
+        # repr() of other objects is neither complete nor stable across processes.
+        raise _Uncacheable(type(value).__name__)
+
+
+def content_digest(value: Any) -> Optional[str]:
+    """
+    SHA-256 of a value built from str, bytes, numbers, None, dicts, lists,
+    tuples, arrays and tensors. Returns None for anything else.
+    """
+    digest = hashlib.sha256()
+    try:
+        _feed(digest, value)
+    except _Uncacheable:
+        return None
+    return digest.hexdigest()
+
+
+def cache_key(module_name: str, module_version: str, args: tuple, kwargs: dict) -> Optional[str]:
+    """
+    Content hash of a module call: module, version, arguments and params.
+    Arrays and tensors are hashed by dtype, shape and data. Returns None when
+    an argument can not be hashed by content, and the call is not cached.
+    """
+    return content_digest([module_name, module_version, list(args), kwargs])
+
+
+def _encode(value: Any) -> Any:
+    """JSON-compatible form of `value`; values JSON has no type for are tagged with "$type"."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        data = value.tobytes() if isinstance(value, memoryview) else bytes(value)
+        return {"$type": "bytes", "data": base64.b64encode(data).decode("ascii")}
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and "$type" not in value:
+            return {key: _encode(item) for key, item in value.items()}
+        for key in value:
+            if not (key is None or isinstance(key, (str, bool, int, float))):
+                raise _Uncacheable(type(key).__name__)
+        return {"$type": "dict", "items": [[key, _encode(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [_encode(item) for item in value]
+    if isinstance(value, tuple):
+        return {"$type": "tuple", "items": [_encode(item) for item in value]}
+    if _is_ndarray(value) or _is_tensor(value):
+        kind = "ndarray" if _is_ndarray(value) else "tensor"
+        array = value if kind == "ndarray" else value.detach().cpu().numpy()
+        if array.dtype.hasobject:
+            raise _Uncacheable("object array")
+        import numpy
+
+        return {
+            "$type": kind,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+            "data": base64.b64encode(numpy.ascontiguousarray(array).tobytes()).decode("ascii"),
+        }
+    raise _Uncacheable(type(value).__name__)
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    kind = value.get("$type")
+    if kind is None:
+        return value
+    if kind == "bytes":
+        return base64.b64decode(value["data"])
+    if kind == "dict":
+        return {key: item for key, item in value["items"]}
+    if kind == "tuple":
+        return tuple(value["items"])
+    import numpy
+
+    array = numpy.frombuffer(base64.b64decode(value["data"]), dtype=value["dtype"])
+    array = array.reshape(value["shape"]).copy()
+    if kind == "tensor":
+        import torch
+
+        return torch.from_numpy(array)
+    return array
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serializes a module result built from the types content_digest accepts.
+    Raises TypeError for anything else.
+    """
+    return json.dumps(_encode(value), separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """
+    Inverse of dumps. Rows of the shared table are only ever parsed as JSON,
+    so a row written by another process can not run code in this one.
+    """
+    return json.loads(data, object_hook=_decode)
+
+
+class ResultCache:
+    """
+    Two tier cache of module results.
+
+    An in-process LRU of `memory_entries` results sits in front of the
+    result_cache table. Both tiers hold results serialized with dumps, so every
+    hit returns a new copy that callers are free to mutate. Entries expire
+    after their TTL in both tiers. The table is kept under `max_rows` rows:
+    every `evict_every` writes the expired rows and then the oldest rows above
+    the limit are deleted. The table is created by database.migrate.
+    """
+
+    def __init__(
+        self,
+        db,
+        memory_entries: int = 1024,
+        max_rows: int = 100000,
+        evict_every: int = 100,
+    ):
+        self.db = db
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self.evict_every = evict_every
+        self.memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get_memory(self, key: str) -> Any:
+        """Returns the value from the in-process tier, or raises KeyError."""
+        with self._lock:
+            expires_at, data = self.memory[key]
+            if expires_at <= time.time():
+                del self.memory[key]
+                raise KeyError(key)
+            self.memory.move_to_end(key)
+            self.hits += 1
+        return loads(data)
+
+    def put_memory(self, key: str, data: bytes, expires_at: float):
+        """Stores a result serialized with dumps in the in-process tier."""
+        with self._lock:
+            self.memory[key] = (expires_at, data)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        """Returns the cached value, or raises KeyError. Falls through to the table."""
+        try:
+            return self.get_memory(key)
+        except KeyError:
+            pass
+        try:
+            with self.db.session() as session:
+                row = session.execute(
+                    select(ResultCacheEntry.value, ResultCacheEntry.expires_at).where(
+                        ResultCacheEntry.key == key, ResultCacheEntry.expires_at > time.time()
+                    )
+                ).first()
+            value = None if row is None else loads(row.value)
+        except Exception as e:
+            logger.warning(f"Could not read the result cache: {e}")
+            row = None
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            raise KeyError(key)
+        self.put_memory(key, row.value, row.expires_at)
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, module_name: str, value: Any, ttl: float):
+        try:
+            data = dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Result of module {module_name} is not cacheable: {e}")
+            return
+        self.put_memory(key, data, time.time() + ttl)
+        self.write(key, module_name, data, ttl)
+
+    def write(self, key: str, module_name: str, data: bytes, ttl: float):
+        """Writes a result serialized with dumps to the table, and evicts every `evict_every` writes."""
+        now = time.time()
+        row = {
+            "key": key,
+            "module_name": module_name,
+            "value": data,
+            "size": len(data),
+            "created_at": now,
+            "expires_at": now + ttl,
+        }
+        try:
+            with self.db.session() as session:
+                dialect_name = session.get_bind().dialect.name
+                if dialect_name in UPSERT_DIALECTS:
+                    statement = upsert_insert(dialect_name, ResultCacheEntry)
+                    statement = statement.on_conflict_do_update(
+                        index_elements=[ResultCacheEntry.key],
+                        set_={
+                            column: statement.excluded[column]
+                            for column in ("value", "size", "created_at", "expires_at")
+                        },
+                    )
+                    session.execute(statement, [row])
+                else:
+                    session.merge(ResultCacheEntry(**row))
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % self.evict_every == 0
+            if evict:
+                self.evict()
+        except Exception as e:
+            logger.warning(f"Could not write the result cache: {e}")
+
+    def evict(self) -> int:
+        """Deletes expired rows, then the oldest rows above max_rows."""
+        with self.db.session() as session:
+            deleted = session.execute(
+                delete(ResultCacheEntry).where(ResultCacheEntry.expires_at <= time.time())
+            ).rowcount
+            excess = session.scalar(select(func.count()).select_from(ResultCacheEntry)) - self.max_rows
+            if excess > 0:
+                oldest = (
+                    select(ResultCacheEntry.key)
+                    .order_by(ResultCacheEntry.created_at)
+                    .limit(excess)
+                    .scalar_subquery()
+                )
+                deleted += session.execute(
+                    delete(ResultCacheEntry).where(ResultCacheEntry.key.in_(oldest))
+                ).rowcount
+        return deleted
+
+    def clear(self, module_name: Optional[str] = None):
+        with self._lock:
+            self.memory.clear()
+        with self.db.session() as session:
+            statement = delete(ResultCacheEntry)
+            if module_name:
+                statement = statement.where(ResultCacheEntry.module_name == module_name)
+            session.execute(statement)
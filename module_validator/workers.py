@@ -0,0 +1,312 @@
+import asyncio
+import functools
+import inspect
+import multiprocessing
+import sys
+import threading
+import traceback
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from loguru import logger
+
+from .entry_points import IndexedEntryPoint
+
+# Creating and mapping a block costs more than pickling smaller payloads
+# through the pipe (see utils/benchmark_worker_payloads.py).
+SHARED_MEMORY_THRESHOLD = 4 * 1024 * 1024
+
+
+class WorkerError(RuntimeError):
+    pass
+
+
+class WorkerRetired(WorkerError):
+    pass
+
+
+class SharedBuffer(NamedTuple):
+    name: str
+    size: int
+    kind: str
+    shape: Optional[Tuple[int, ...]] = None
+    dtype: Optional[str] = None
+
+
+def _is_ndarray(value: Any) -> bool:
+    numpy = sys.modules.get("numpy")
+    return numpy is not None and isinstance(value, numpy.ndarray)
+
+
+def _is_tensor(value: Any) -> bool:
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+def _share_str(value: str) -> SharedBuffer:
+    data = value.encode("utf-8")
+    shm = SharedMemory(create=True, size=max(len(data), 1))
+    shm.buf[: len(data)] = data
+    shm.close()
+    return SharedBuffer(shm.name, len(data), "str")
+
+
+def _share_array(array, kind: str) -> SharedBuffer:
+    import numpy
+
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = numpy.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+    del view
+    shm.close()
+    return SharedBuffer(shm.name, array.nbytes, kind, tuple(array.shape), array.dtype.str)
+
+
+def pack(value: Any) -> Any:
+    """
+    Moves large payloads of a message into shared memory blocks.
+
+    Strings, numpy arrays and torch tensors above SHARED_MEMORY_THRESHOLD are
+    copied into a block and replaced with a SharedBuffer reference. Bytes are
+    always pickled, which measured faster at every size. Results are owned by the
+    receiver, which unlinks them in unpack. Call arguments stay owned by the
+    caller, which unlinks them with release once the call returns or the
+    worker dies, so a crashing worker does not leak them.
+    """
+    if isinstance(value, dict):
+        return {key: pack(item) for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(pack(item) for item in value)
+    if isinstance(value, str) and len(value) >= SHARED_MEMORY_THRESHOLD:
+        return _share_str(value)
+    if _is_ndarray(value) and value.nbytes >= SHARED_MEMORY_THRESHOLD:
+        return _share_array(value, "ndarray")
+    if _is_tensor(value) and value.nelement() * value.element_size() >= SHARED_MEMORY_THRESHOLD:
+        return _share_array(value.detach().cpu().numpy(), "tensor")
+    return value
+
+
+def unpack(value: Any, unlink: bool = True, borrowed: Optional[List[SharedMemory]] = None) -> Any:
+    """
+    Replaces the SharedBuffer references of a message with their payloads.
+
+    Without `borrowed` the payloads are copied out of their blocks, which are
+    then closed (and unlinked with `unlink`). With a `borrowed` list, arrays
+    and tensors are returned as views of their blocks instead, without a copy;
+    the blocks are appended to the list and must be closed with close_borrowed
+    once the views are no longer used. Modules that keep an array argument
+    past their call must copy it.
+    """
+    if isinstance(value, SharedBuffer):
+        shm = SharedMemory(name=value.name)
+        keep_open = False
+        try:
+            if value.kind in ("ndarray", "tensor"):
+                import numpy
+
+                view = numpy.ndarray(value.shape, dtype=value.dtype, buffer=shm.buf)
+                if borrowed is not None:
+                    result = view
+                    borrowed.append(shm)
+                    keep_open = True
+                else:
+                    result = view.copy()
+                del view
+                if value.kind == "tensor":
+                    import torch
+
+                    result = torch.from_numpy(result)
+            else:
+                # Decodes straight from the block, without an intermediate bytes copy.
+                with shm.buf[: value.size] as data:
+                    result = str(data, "utf-8")
+        finally:
+            if not keep_open:
+                shm.close()
+            if unlink:
+                shm.unlink()
+        return result
+    if isinstance(value, dict):
+        return {key: unpack(item, unlink, borrowed) for key, item in value.items()}
+    if type(value) in (list, tuple):
+        return type(value)(unpack(item, unlink, borrowed) for item in value)
+    return value
+
+
+def close_borrowed(borrowed: List[SharedMemory]):
+    """Closes the blocks of views handed out by unpack; a view still referenced keeps its mapping."""
+    for shm in borrowed:
+        try:
+            shm.close()
+        except BufferError:
+            # The module kept a reference to the view. The mapping stays until
+            # the view is collected; the caller unlinks the block either way.
+            logger.warning("A module kept an array argument past its call; copy it to keep it")
+    borrowed.clear()
+
+
+def release(value: Any):
+    """Unlinks the shared memory blocks of a packed message that were not unpacked with unlink."""
+    if isinstance(value, SharedBuffer):
+        try:
+            shm = SharedMemory(name=value.name)
+        except FileNotFoundError:
+            return
+        shm.close()
+        shm.unlink()
+    elif isinstance(value, dict):
+        for item in value.values():
+            release(item)
+    elif type(value) in (list, tuple):
+        for item in value:
+            release(item)
+
+
+def _worker_main(entry_point: IndexedEntryPoint, config: Dict[str, Any], connection, warmup: bool):
+    try:
+        function = entry_point.load()
+        hooks = sys.modules.get(function.__module__)
+        instance = None
+        if callable(getattr(hooks, "construct", None)):
+            instance = hooks.construct(config)
+            function = functools.partial(function, instance=instance)
+        if warmup and hasattr(hooks, "warmup_inputs"):
+            for data in hooks.warmup_inputs(config).values():
+                result = function(data)
+                if inspect.isawaitable(result):
+                    asyncio.run(result)
+        connection.send(("ready", None))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+        return
+
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        borrowed = []
+        try:
+            # Array arguments are views of the caller's blocks, which the
+            # caller unlinks once this call returns.
+            args, kwargs = unpack(message, unlink=False, borrowed=borrowed)
+            result = function(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = asyncio.run(result)
+            del args, kwargs
+            connection.send(("result", pack(result)))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+        finally:
+            result = None
+            close_borrowed(borrowed)
+
+    if instance is not None and hasattr(hooks, "close"):
+        hooks.close(instance)
+
+
+class ModuleWorker:
+    """
+    Runs one inference module in its own spawned process.
+
+    Calls are serialized per worker. Large strings, arrays and tensors travel
+    through shared memory (see pack): the caller copies them into a block once,
+    array arguments reach the module as views of that block, and strings and
+    results are copied out once on the receiving side. A worker that dies is
+    restarted on the next call.
+    """
+
+    def __init__(self, entry_point: IndexedEntryPoint, config: Dict[str, Any] = None):
+        self.entry_point = entry_point
+        self.config = config or {}
+        self.process = None
+        self.connection = None
+        self.retired = False
+        self.lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self.entry_point.name
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def start(self, warmup: bool = False):
+        with self.lock:
+            self._start(warmup)
+
+    def _start(self, warmup: bool = False):
+        if self.is_alive():
+            return
+        context = multiprocessing.get_context("spawn")
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(self.entry_point, self.config, child_connection, warmup),
+            name=f"module-worker-{self.name}",
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        logger.info(f"Started worker process {self.process.pid} for module {self.name}")
+
+        status, error = self._receive()
+        if status == "error":
+            self._stop()
+            raise WorkerError(f"Worker for module {self.name} failed to start:\n{error}")
+
+    def _receive(self):
+        try:
+            return self.connection.recv()
+        except (EOFError, OSError) as e:
+            self._stop()
+            raise WorkerError(f"Worker for module {self.name} exited unexpectedly") from e
+
+    def call(self, *args, **kwargs):
+        with self.lock:
+            if self.retired:
+                raise WorkerRetired(f"Worker for module {self.name} has been replaced")
+            self._start()
+            message = pack((args, kwargs))
+            try:
+                try:
+                    self.connection.send(message)
+                except (BrokenPipeError, OSError) as e:
+                    self._stop()
+                    raise WorkerError(f"Worker for module {self.name} is not reachable") from e
+                status, payload = self._receive()
+            finally:
+                release(message)
+        if status == "error":
+            raise WorkerError(f"Module {self.name} raised in its worker:\n{payload}")
+        return unpack(payload)
+
+    def stop(self, timeout: float = 10.0):
+        with self.lock:
+            self._stop(timeout)
+
+    def retire(self, timeout: float = 10.0):
+        """
+        Stops the worker once its in-flight call is done. Calls that were
+        waiting for the worker raise WorkerRetired instead of restarting it.
+        """
+        self.retired = True
+        self.stop(timeout)
+
+    def _stop(self, timeout: float = 10.0):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+        self.connection.close()
+        self.process = None
+        self.connection = None
@@ -4,8 +4,9 @@ setup(
     name="module_validator",
     version="1",
     packages=find_packages(),
+    package_data={"module_validator.modules": ["*/manifest.yaml"]},
     entry_points={
-        "console_scripts": ["module_validator = module_validator.main:main"],
+        "console_scripts": ["module_validator = module_validator.client:cli"],
         "module_validator.module": [
             "default = module_validator.main:default_output",
             "register = module_validator.main:register",
@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+from module_validator.database import Database
+
+
+class FakeRegistry:
+    """Registry with one module, "echo", which returns the data of its request."""
+
+    def get_module(self, name):
+        async def echo(data):
+            if data["data"]["input"] == "fail":
+                raise RuntimeError("boom")
+            return data["data"]
+
+        return echo if name == "echo" else None
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Gives every test a migrated database in a temporary directory, with the
+    "say" command routed to the "echo" module of FakeRegistry. It is a file
+    database because writer and executor threads need one; in-memory
+    databases are per thread.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.settings = {"database_url": f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"}
+        self.db = Database(self.settings)
+        self.addCleanup(self.db.engine.dispose)
+        self.db.create_tables()
+        self.db.add_command("say", "echo")
@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from module_validator.async_database import AsyncDatabase, async_url
+from module_validator.database import Database
+from module_validator.main import execute_command
+from tests.helpers import DatabaseTestCase, FakeRegistry
+
+
+class TestAsyncDatabase(DatabaseTestCase):
+
+    def test_async_url(self):
+        self.assertEqual(str(async_url("sqlite:///a.db")), "sqlite+aiosqlite:///a.db")
+        self.assertEqual(str(async_url("sqlite+aiosqlite:///a.db")), "sqlite+aiosqlite:///a.db")
+
+    def test_module_and_command_api(self):
+        async def run():
+            db = AsyncDatabase(self.settings)
+            try:
+                await db.create_tables()
+                await db.add_module("echo", "1.0", "json:dumps")
+                await db.update_module("echo", version="1.1")
+                await db.upsert_commands(
+                    [{"name": "say", "module_name": "echo"}, {"name": "shout", "module_name": "echo"}]
+                )
+                await db.delete_command("shout")
+                lookups = await asyncio.gather(*(db.get_command("say") for _ in range(10)))
+                self.assertEqual({command.module_name for command in lookups}, {"echo"})
+                self.assertEqual((await db.get_module("echo")).version, "1.1")
+                self.assertEqual([c.name for c in await db.list_commands()], ["say"])
+                self.assertEqual(await db.routes.resolve("say"), "echo")
+
+                result = await execute_command(FakeRegistry(), db, "say", "hi", {})
+                self.assertEqual(result, {"input": "hi"})
+            finally:
+                await db.close()
+
+        asyncio.run(run())
+        # Written through the async engine, visible to the synchronous one.
+        self.assertEqual(Database(self.settings).get_module("echo").version, "1.1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from module_validator.database import Database
+
+try:
+    from module_validator import cli
+except ImportError:  # custom_modules needs requests
+    cli = None
+
+SETUP_PY = """setup(
+    entry_points={
+        "module_validator.inference": [
+            "translation = module_validator.modules.translation.translation:process",
+        ],
+    },
+)
+"""
+
+
+@unittest.skipIf(cli is None, "requests is not installed")
+class TestCommandCli(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        with open("setup.py", "w") as f:
+            f.write(SETUP_PY)
+        self.db = Database({"database_url": "sqlite://"})
+        self.db.create_tables()
+        self.db.add_command("say", "echo", "original")
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_add_command_asks_before_overwriting(self):
+        answers = ["say", "n", "new", "echo", "", ""]
+        with patch("builtins.input", side_effect=answers), patch("builtins.print"):
+            cli.add_command(self.db)
+        self.assertEqual(self.db.get_command("say").description, "original")
+        self.assertEqual(self.db.get_command("new").module_name, "echo")
+
+        answers = ["say", "y", "other", "replaced", ""]
+        with patch("builtins.input", side_effect=answers), patch("builtins.print"):
+            cli.add_command(self.db)
+        self.assertEqual(self.db.get_command("say").module_name, "other")
+
+    def test_register_module_does_not_add_commands(self):
+        with patch("builtins.input", side_effect=["first", "n"]), patch("builtins.print"):
+            cli.register_module(self.db)
+        self.assertEqual(self.db.get_module("first").name, "first")
+        self.assertIsNone(self.db.get_command("first"))
+        with open("setup.py") as f:
+            self.assertIn("first = module_validator.modules.first.first:process", f.read())
+
+    def test_failed_setup_edit_registers_nothing(self):
+        original_update = cli.update_setup_py
+
+        def update_setup_py(module_name, module_path):
+            return module_name != "second" and original_update(module_name, module_path)
+
+        answers = ["first, second", "n", "n"]
+        with patch("builtins.input", side_effect=answers), patch("builtins.print"), patch(
+            "module_validator.cli.update_setup_py", side_effect=update_setup_py
+        ):
+            cli.register_module(self.db)
+        self.assertIsNone(self.db.get_module("first"))
+        with open("setup.py") as f:
+            self.assertEqual(f.read(), SETUP_PY)
+
+
+if __name__ == "__main__":
+    unittest.main()
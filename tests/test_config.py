@@ -0,0 +1,244 @@
+import argparse
+import os
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import yaml
+
+from module_validator.config import Config
+from module_validator.config.base_configuration import GenericConfig
+from module_validator.config.layered_config import LayeredConfig
+from module_validator.config.config_view import ConfigView
+
+
+class TestConfigSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.config_dir = os.path.join(self.tmp.name, "config")
+        os.makedirs(os.path.join(self.config_dir, "development"))
+        self.write("global.yaml", "database_url: 'sqlite://'\nglobal_requirements: [numpy]\n")
+        self.write("translation.yaml", "model:\n  batch_size: 8\n")
+        patcher = patch(
+            "module_validator.config.inference_module_config.CACHE_DIR",
+            os.path.join(self.tmp.name, "cache"),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        environment = patch.dict(os.environ, {"MODULE_VALIDATOR_ENV": "development"})
+        environment.start()
+        self.addCleanup(environment.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, filename, content, mtime=None):
+        path = os.path.join(self.config_dir, "development", filename)
+        with open(path, "w") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def load(self):
+        config = Config(self.config_dir)
+        config.load_configs()
+        return config
+
+    def test_snapshot_skips_yaml_parsing(self):
+        path = Config(self.config_dir).compile()
+        self.assertTrue(os.path.exists(path))
+        with patch("module_validator.config.inference_module_config.yaml.safe_load") as safe_load:
+            config = self.load()
+            safe_load.assert_not_called()
+        self.assertEqual(config.get_config("translation")["model"], {"batch_size": 8})
+        self.assertEqual(config.get_requirements(), ["numpy"])
+
+    def test_changed_files_invalidate_the_snapshot(self):
+        self.load()
+        self.write("translation.yaml", "model:\n  batch_size: 16\n", mtime=1)
+        self.assertEqual(self.load().get_module_config("translation")["model"]["batch_size"], 16)
+
+        self.write("embedding.yaml", "cache_results: false\n")
+        self.assertEqual(self.load().get_module_config("embedding"), {"cache_results": False})
+
+        os.remove(os.path.join(self.config_dir, "development", "embedding.yaml"))
+        self.assertEqual(self.load().get_module_config("embedding"), {})
+
+    def test_corrupt_snapshot_is_ignored(self):
+        config = Config(self.config_dir)
+        config.compile()
+        with open(config.snapshot_path, "wb") as f:
+            f.write(b"not a pickle")
+        self.assertEqual(self.load().get_global_config()["database_url"], "sqlite://")
+
+
+    def test_lazy_mode_parses_module_files_on_first_access(self):
+        self.write("embedding.yaml", "cache_results: false\n")
+        config = Config(self.config_dir, lazy=True)
+        config.load_configs()
+        self.assertEqual(config.module_configs, {})
+
+        with patch(
+            "module_validator.config.inference_module_config.yaml.safe_load",
+            wraps=yaml.safe_load,
+        ) as safe_load:
+            self.assertEqual(config.get_config("translation")["model"], {"batch_size": 8})
+            config.get_config("translation")
+            self.assertEqual(safe_load.call_count, 1)
+        self.assertEqual(list(config.module_configs), ["translation"])
+        self.assertEqual(config.get_module_config("missing"), {})
+        self.assertEqual(config.get_requirements("translation"), ["numpy"])
+
+    def test_lazy_mode_reads_a_fresh_snapshot(self):
+        # One-shot commands load their config like this (see main).
+        Config(self.config_dir).compile()
+        with patch("module_validator.config.inference_module_config.yaml.safe_load") as safe_load:
+            config = Config(self.config_dir, lazy=True)
+            config.load_configs()
+            self.assertEqual(config.get_config("translation")["model"], {"batch_size": 8})
+            safe_load.assert_not_called()
+
+        self.write("translation.yaml", "model:\n  batch_size: 16\n", mtime=1)
+        config = Config(self.config_dir, lazy=True)
+        config.load_configs()
+        self.assertEqual(config.module_configs, {})
+        self.assertEqual(config.get_config("translation")["model"], {"batch_size": 16})
+
+    def test_merged_views_are_computed_once_per_load(self):
+        config = self.load()
+        view = config.get_config("translation")
+        self.assertIs(config.get_config("translation"), view)
+        self.assertEqual(view.get("model.batch_size"), 8)
+        self.assertEqual(view.get("database_url"), "sqlite://")
+
+        self.write("translation.yaml", "model:\n  batch_size: 16\n", mtime=1)
+        config.load_configs()
+        self.assertEqual(config.get_config("translation").get("model.batch_size"), 16)
+        config.global_config = {"database_url": "sqlite:///other.db"}
+        self.assertEqual(config.get_config().get("database_url"), "sqlite:///other.db")
+
+
+    def test_watcher_reparses_changed_files_and_notifies_subscribers(self):
+        self.write("embedding.yaml", "cache_results: false\n")
+        config = self.load()
+        notified = []
+        config.subscribe("translation", lambda name, changes: notified.append((name, changes)))
+        self.assertEqual(config.check_for_changes(), {})
+
+        self.write(
+            "translation.yaml", "model:\n  batch_size: 16\nperformance:\n  num_workers: 2\n", mtime=1
+        )
+        with patch(
+            "module_validator.config.inference_module_config.yaml.safe_load", wraps=yaml.safe_load
+        ) as safe_load:
+            changes = config.check_for_changes()
+            self.assertEqual(safe_load.call_count, 1)
+        expected = {"model": {"batch_size": 16}, "performance": {"num_workers": 2}}
+        self.assertEqual(changes, {"translation": expected})
+        self.assertEqual(notified, [("translation", expected)])
+
+        self.write("global.yaml", "database_url: 'sqlite://'\n", mtime=2)
+        self.assertEqual(config.check_for_changes(), {"translation": {"global_requirements": None}})
+
+
+class TestConfigView(unittest.TestCase):
+
+    def test_dotted_lookups_and_immutability(self):
+        view = ConfigView({"model": {"name": "m", "sizes": {"max": 4}}, "debug": None})
+        self.assertEqual(view.get("model.sizes.max"), 4)
+        self.assertEqual(view.get("model").get("sizes.max"), 4)
+        self.assertEqual(view["model"]["name"], "m")
+        self.assertIsNone(view.get("debug"))
+        self.assertEqual(view.get("model.missing", 1), 1)
+        with self.assertRaises(TypeError):
+            view["debug"] = True
+        with self.assertRaises(TypeError):
+            view["model"].update(name="other")
+
+    def test_views_pickle_and_thaw(self):
+        view = ConfigView({"model": {"name": "m"}})
+        copy = pickle.loads(pickle.dumps(view))
+        self.assertIsInstance(copy["model"], ConfigView)
+        self.assertEqual(copy.get("model.name"), "m")
+        self.assertEqual(type(view.to_dict()["model"]), dict)
+
+    def test_generic_config_get_resolves_dotted_keys(self):
+        class SubnetConfig(GenericConfig):
+            pass
+
+        config = SubnetConfig({"axon": {"port": 8091}})
+        self.assertEqual(config._get("axon.port"), 8091)
+        config._set("axon.port", 8092)
+        self.assertEqual(config._get("axon.port"), 8092)
+        self.assertEqual(config._get("axon.ip", "0.0.0.0"), "0.0.0.0")
+
+
+class TestLayeredConfig(unittest.TestCase):
+    def test_higher_layers_win_and_sections_merge(self):
+        config = LayeredConfig(
+            defaults={"model": {"name": "base", "batch_size": 8}, "debug": False},
+            yaml={"model": {"name": "large"}},
+            cli={"debug": True},
+        )
+        self.assertEqual(config.get("model.name"), "large")
+        self.assertEqual(config.get("model.batch_size"), 8)
+        self.assertEqual(config["model"]["batch_size"], 8)
+        self.assertIs(config.get("debug"), True)
+        self.assertEqual(config.get("missing", 1), 1)
+        self.assertEqual(
+            config.to_dict(), {"model": {"name": "large", "batch_size": 8}, "debug": True}
+        )
+        with self.assertRaises(ValueError):
+            LayeredConfig(other={})
+
+    def test_set_shares_untouched_sections(self):
+        axon, model = {"port": 8091}, {"name": "m"}
+        config = LayeredConfig(cli={"axon": axon, "model": model})
+        updated = config.set("axon.port", 8092)
+        self.assertEqual(config.get("axon.port"), 8091)
+        self.assertEqual(updated.get("axon.port"), 8092)
+        self.assertIs(updated.layer("cli")["model"], model)
+        self.assertEqual(axon, {"port": 8091})
+
+    def test_env_and_args_layers(self):
+        env = LayeredConfig.from_env(
+            "MV", {"MV_MODEL__BATCH_SIZE": "16", "MV_DEBUG": "true", "OTHER": "x"}
+        )
+        self.assertEqual(env, {"model": {"batch_size": 16}, "debug": True})
+        args = argparse.Namespace(**{"axon.port": 9000, "netuid": None})
+        self.assertEqual(LayeredConfig.from_args(args), {"axon": {"port": 9000}})
+
+    def test_generic_configs_do_not_share_state(self):
+        first = GenericConfig({"axon": {"port": 1}})
+        second = GenericConfig({"axon": {"port": 2}})
+        first._set("axon.port", 3)
+        first._parse_env("MV", {"MV_AXON__IP": "1.2.3.4"})
+        second._parse_args(argparse.Namespace(**{"axon.port": 4}))
+        self.assertEqual(first._get("axon.port"), 3)
+        self.assertEqual(first._get("axon.ip"), "1.2.3.4")
+        self.assertEqual(second._get("axon.port"), 4)
+        self.assertIsNone(second._get("axon.ip"))
+        first._merge_layer({"axon": {"ip": "0.0.0.0"}}, "defaults")
+        self.assertEqual(first._get("axon.ip"), "1.2.3.4")
+
+    def test_assigned_fields_reach_the_yaml_layer(self):
+        from module_validator.config.pydantic_config import Config as SubnetConfig
+
+        config = SubnetConfig({"config": {"axon": {"port": 1}}})
+        config._parse_env("MV", {"MV_CONFIG__AXON__IP": "1.2.3.4"})
+        config.config = {"axon": {"port": 2}}
+        self.assertEqual(config.get("config.axon.port"), 2)
+        self.assertEqual(config._get("config.axon.port"), 2)
+        self.assertEqual(config._get("config.axon.ip"), "1.2.3.4")
+        self.assertEqual(config.get("config.axon.ip"), "1.2.3.4")
+        config._set("config.axon.port", 3)
+        config.config = {"axon": {"port": 4}}
+        self.assertEqual(config._get("config.axon.port"), 3)
+        self.assertEqual(config.get("config.axon.port"), 3)
+        self.assertEqual(config.get("config.axon.missing", "default"), "default")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from module_validator.client import cli, forward_command, is_running, parse_params, send_request
+from module_validator.daemon import InferenceDaemon
+from tests.helpers import DatabaseTestCase, FakeRegistry
+
+
+class TestInferenceDaemon(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.socket_path = os.path.join(self.tmp.name, "daemon.sock")
+
+    def test_execute_over_socket(self):
+        async def run():
+            daemon = InferenceDaemon(FakeRegistry(), self.db, self.socket_path)
+            await daemon.start()
+            try:
+                self.assertTrue(await is_running(self.socket_path))
+                response = await send_request(
+                    {"command": "say", "data": "hi", "params": {"task_string": "t"}},
+                    self.socket_path,
+                )
+                self.assertEqual(response, {"result": {"input": "hi", "task_string": "t"}})
+                response = await send_request({"op": "stats", "kind": "db"}, self.socket_path)
+                self.assertIsInstance(response["result"], list)
+                response = await send_request({"op": "nope"}, self.socket_path)
+                self.assertIn("error", response)
+                response = await send_request({"command": "missing"}, self.socket_path)
+                self.assertEqual(response, {"error": "Command 'missing' not found"})
+            finally:
+                daemon.server.close()
+                await daemon.server.wait_closed()
+
+        asyncio.run(run())
+
+    def test_forward_command_prints_daemon_errors(self):
+        async def run():
+            daemon = InferenceDaemon(FakeRegistry(), self.db, self.socket_path)
+            await daemon.start()
+            try:
+                with patch("builtins.print") as printed:
+                    response = await forward_command("missing", "", {}, self.socket_path)
+                self.assertIn("error", response)
+                printed.assert_called_once_with("Daemon error: Command 'missing' not found")
+            finally:
+                daemon.server.close()
+                await daemon.server.wait_closed()
+
+        asyncio.run(run())
+
+    def test_requests_to_a_hung_daemon_time_out(self):
+        async def hang(reader, writer):
+            await asyncio.sleep(10)
+
+        async def run():
+            server = await asyncio.start_unix_server(hang, path=self.socket_path)
+            try:
+                with self.assertRaises(asyncio.TimeoutError):
+                    await send_request({"op": "ping"}, self.socket_path, timeout=0.1)
+                with patch("module_validator.client.CONNECT_TIMEOUT", 0.1):
+                    self.assertFalse(await is_running(self.socket_path))
+            finally:
+                server.close()
+
+        asyncio.run(run())
+
+
+class TestClient(unittest.TestCase):
+    def test_parse_params(self):
+        self.assertEqual(parse_params("{'task_string': 'en-fr'}"), {"task_string": "en-fr"})
+        with self.assertRaises(ValueError):
+            parse_params("__import__('os').getcwd()")
+        with self.assertRaises(ValueError):
+            parse_params("[1, 2]")
+        with self.assertRaises(SyntaxError):
+            parse_params("{'a':")
+
+    def test_cli_exits_with_the_status_of_main(self):
+        async def main():
+            return 1
+
+        with patch("module_validator.client.main", main):
+            with self.assertRaises(SystemExit) as exited:
+                cli()
+        self.assertEqual(exited.exception.code, 1)
+
+    def test_client_does_not_import_the_registry(self):
+        code = (
+            "import sys, module_validator.client; "
+            "print(any(m.startswith(('sqlalchemy', 'module_validator.registry')) for m in sys.modules))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
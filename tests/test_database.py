@@ -0,0 +1,252 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy.dialects import mysql
+
+from module_validator.database import (
+    SCHEMA_VERSION,
+    Database,
+    ModuleEntry,
+    sqlite_pragmas,
+    upsert_statement,
+)
+
+
+class TestDatabaseSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_url = f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"
+        self.db = Database({"database_url": self.database_url})
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_engine_is_shared_per_url(self):
+        other = Database({"database_url": self.database_url})
+        self.assertIs(other.engine, self.db.engine)
+        memory = Database({"database_url": "sqlite://"})
+        self.assertIsNot(memory.engine, Database({"database_url": "sqlite://"}).engine)
+
+    def test_lookups_reuse_the_enclosing_session(self):
+        self.db.add_command("say", "echo")
+        with self.db.session() as session:
+            command = self.db.get_command("say")
+            self.assertIs(self.db.get_command("say"), command)
+            self.assertIn(command, session)
+        self.assertEqual(command.module_name, "echo")
+
+    def test_session_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with self.db.session():
+                self.db.add_command("say", "echo")
+                raise RuntimeError("abort")
+        self.assertIsNone(self.db.get_command("say"))
+
+
+class TestRoutingTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        settings = {
+            "database_url": f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}",
+            "database": {"routing_refresh_interval": 60},
+        }
+        self.db = Database(settings)
+        self.db.create_tables()
+        self.db.add_module("echo", "1.0", "json:dumps")
+        self.db.add_command("say", "echo")
+        # Another process writing to the same database.
+        self.other = Database(settings)
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_lookups_do_not_touch_the_database(self):
+        self.assertEqual(self.db.routes.resolve("say"), "echo")
+        with patch.object(Database, "session", side_effect=AssertionError("I/O")):
+            self.assertEqual(self.db.routes.resolve("say"), "echo")
+            self.assertEqual(self.db.routes.get_module("echo").version, "1.0")
+            self.assertIsNone(self.db.routes.get_command("missing"))
+
+    def test_local_writes_invalidate_immediately(self):
+        self.assertIsNone(self.db.routes.get_command("shout"))
+        self.db.add_command("shout", "echo")
+        self.assertEqual(self.db.routes.resolve("shout"), "echo")
+        self.db.delete_command("shout")
+        self.assertIsNone(self.db.routes.get_command("shout"))
+
+    def test_revision_counter_picks_up_other_writers(self):
+        self.assertEqual(self.db.routes.resolve("say"), "echo")
+        self.other.update_command("say", module_name="other")
+        self.assertEqual(self.db.routes.resolve("say"), "echo")
+
+        self.db.routes.refresh_interval = 0
+        self.db.routes._next_check = 0.0
+        self.assertEqual(self.db.routes.resolve("say"), "other")
+
+        # An unchanged counter keeps the snapshot.
+        commands = self.db.routes.commands
+        self.db.routes.get_command("say")
+        self.assertIs(self.db.routes.commands, commands)
+
+
+class TestBulkOperations(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database({"database_url": "sqlite://"})
+        self.db.create_tables()
+
+    def test_bulk_insert_and_delete(self):
+        self.db.add_commands(
+            [{"name": f"command_{index}", "module_name": "echo"} for index in range(50)]
+        )
+        self.assertEqual(len(self.db.list_commands()), 50)
+        self.assertEqual(self.db.delete_commands([f"command_{index}" for index in range(40)]), 40)
+        self.assertEqual(len(self.db.list_commands()), 10)
+        self.assertEqual(self.db.routes.resolve("command_45"), "echo")
+
+    def test_upsert_updates_existing_rows(self):
+        self.db.add_command("say", "echo", "Says things")
+        self.db.upsert_commands(
+            [{"name": "say", "module_name": "other"}, {"name": "shout", "module_name": "echo"}]
+        )
+        say = self.db.get_command("say")
+        self.assertEqual((say.module_name, say.description), ("other", "Says things"))
+        self.assertEqual(self.db.get_command("shout").module_name, "echo")
+
+        self.db.upsert_modules([{"name": "echo", "version": "1.0", "entry_point": "json:dumps"}])
+        self.db.upsert_modules([{"name": "echo", "version": "1.1", "entry_point": "json:dumps"}])
+        self.assertEqual([module.version for module in self.db.list_modules()], ["1.1"])
+
+    def test_upsert_keeps_values_that_are_none(self):
+        self.db.upsert_modules(
+            [{"name": "echo", "version": "1.0", "entry_point": "json:dumps", "config": {"a": 1}}]
+        )
+        self.db.upsert_modules(
+            [{"name": "echo", "version": None, "entry_point": "json:loads", "config": None}]
+        )
+        echo = self.db.get_module("echo")
+        self.assertEqual((echo.version, echo.entry_point, echo.config), ("1.0", "json:loads", {"a": 1}))
+
+        self.db.upsert_modules(
+            [
+                {"name": "echo", "version": None, "entry_point": "json:dumps", "config": None},
+                {"name": "other", "version": "2.0", "entry_point": "json:dumps", "config": {}},
+            ]
+        )
+        echo, other = sorted(self.db.list_modules(), key=lambda module: module.name)
+        self.assertEqual((echo.version, echo.config), ("1.0", {"a": 1}))
+        self.assertEqual((other.version, other.config), ("2.0", {}))
+
+    def test_upsert_on_mysql(self):
+        statement, _ = upsert_statement(
+            "mysql", ModuleEntry, [{"name": "echo", "version": None, "entry_point": "json:dumps"}],
+            ["version", "entry_point", "config"],
+        )
+        sql = str(statement.compile(dialect=mysql.dialect()))
+        self.assertIn("ON DUPLICATE KEY UPDATE", sql)
+        self.assertIn("entry_point = VALUES(entry_point)", sql)
+        self.assertNotIn("version = ", sql)
+
+    def test_bulk_write_is_one_transaction(self):
+        with self.assertRaises(Exception):
+            self.db.add_commands(
+                [{"name": "say", "module_name": "echo"}, {"name": "say", "module_name": "echo"}]
+            )
+        self.assertEqual(self.db.list_commands(), [])
+
+    def test_update_in_one_statement(self):
+        self.db.add_module("echo", "1.0", "json:dumps")
+        self.db.update_module("echo", version="2.0")
+        module = self.db.get_module("echo")
+        self.assertEqual((module.version, module.entry_point), ("2.0", "json:dumps"))
+
+
+class TestSchemaMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.database_url = f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"
+        self.db = Database({"database_url": self.database_url})
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def indexes(self):
+        with self.db.engine.connect() as connection:
+            return {
+                row[1] for row in connection.exec_driver_sql("PRAGMA index_list(commands)")
+            }
+
+    def test_unversioned_database_is_migrated_in_place(self):
+        # The commands table as created before schema versions existed.
+        with self.db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "CREATE TABLE commands (id INTEGER PRIMARY KEY, name VARCHAR UNIQUE NOT NULL, "
+                "module_name VARCHAR NOT NULL, description VARCHAR, created_at DATETIME, "
+                "updated_at DATETIME)"
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO commands (name, module_name) VALUES ('say', 'echo')"
+            )
+        self.assertNotIn("ix_commands_module_name_name", self.indexes())
+
+        self.assertEqual(self.db.create_tables(), SCHEMA_VERSION)
+        self.assertIn("ix_commands_module_name_name", self.indexes())
+        self.assertEqual(self.db.list_module_commands("echo"), ["say"])
+        self.assertEqual(self.db.create_tables(), SCHEMA_VERSION)
+
+    def test_module_commands_use_the_index(self):
+        self.db.create_tables()
+        self.db.add_commands(
+            [{"name": f"command_{index}", "module_name": f"module_{index % 3}"} for index in range(30)]
+        )
+        self.assertEqual(len(self.db.list_module_commands("module_1")), 10)
+        with self.db.engine.connect() as connection:
+            plan = " ".join(
+                str(row[-1])
+                for row in connection.exec_driver_sql(
+                    "EXPLAIN QUERY PLAN SELECT name FROM commands WHERE module_name = 'module_1'"
+                )
+            )
+        self.assertIn("COVERING INDEX ix_commands_module_name_name", plan)
+
+        self.assertEqual(self.db.delete_module_commands("module_1"), 10)
+        self.assertEqual(self.db.list_module_commands("module_1"), [])
+        self.assertIsNone(self.db.routes.get_command("command_1"))
+
+
+class TestSqliteProfile(unittest.TestCase):
+
+    def test_profile_pragmas_are_applied(self):
+        with tempfile.TemporaryDirectory() as root:
+            db = Database(
+                {
+                    "database_url": f"sqlite:///{os.path.join(root, 'test.db')}",
+                    "database": {"sqlite": {"profile": "balanced", "busy_timeout": 1234}},
+                }
+            )
+            with db.engine.connect() as connection:
+                pragma = lambda name: connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+                self.assertEqual(pragma("journal_mode"), "wal")
+                self.assertEqual(pragma("synchronous"), 1)
+                self.assertEqual(pragma("busy_timeout"), 1234)
+            db.engine.dispose()
+
+    def test_unknown_settings_are_rejected(self):
+        self.assertEqual(sqlite_pragmas(), ())
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({"profile": "turbo"})
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({"journal": "WAL"})
+
+
+if __name__ == "__main__":
+    unittest.main()
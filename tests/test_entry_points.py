@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from module_validator.entry_points import EntryPointIndex
+
+
+def write_distribution(root, name, version, entry_points):
+    dist_info = os.path.join(root, f"{name}-{version}.dist-info")
+    os.makedirs(dist_info, exist_ok=True)
+    with open(os.path.join(dist_info, "METADATA"), "w") as f:
+        f.write(f"Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n")
+    with open(os.path.join(dist_info, "entry_points.txt"), "w") as f:
+        f.write("[module_validator.inference]\n" + "\n".join(entry_points) + "\n")
+    return dist_info
+
+
+class TestEntryPointIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.site = os.path.join(self.tmp.name, "site-packages")
+        os.makedirs(self.site)
+        self.index_path = os.path.join(self.tmp.name, "cache", "index.json")
+        write_distribution(self.site, "fake_modules", "1.0", ["echo = json:dumps"])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_index_reads_entry_points(self):
+        index = EntryPointIndex(self.index_path, paths=[self.site])
+        (entry_point,) = index.iter_entry_points("module_validator.inference")
+        self.assertEqual(entry_point.name, "echo")
+        self.assertEqual(entry_point.module, "json")
+        self.assertEqual(entry_point.attr, "dumps")
+        self.assertEqual(entry_point.dist, "fake_modules")
+        self.assertEqual(entry_point.version, "1.0")
+        self.assertEqual(entry_point.load()([1]), "[1]")
+        self.assertTrue(os.path.exists(self.index_path))
+
+    def test_index_is_reused_until_packages_change(self):
+        EntryPointIndex(self.index_path, paths=[self.site]).load()
+
+        with patch.object(EntryPointIndex, "rebuild", return_value=[]) as rebuild:
+            EntryPointIndex(self.index_path, paths=[self.site]).load()
+            rebuild.assert_not_called()
+
+        # Rewritten in place, as `setup.py develop` does: the folder mtime does not change.
+        write_distribution(
+            self.site, "fake_modules", "1.0", ["echo = json:dumps", "load = json:loads"]
+        )
+
+        index = EntryPointIndex(self.index_path, paths=[self.site])
+        names = [ep.name for ep in index.iter_entry_points("module_validator.inference")]
+        self.assertEqual(names, ["echo", "load"])
+
+    def test_fingerprint_skips_the_working_directory(self):
+        elsewhere = os.path.join(self.tmp.name, "elsewhere")
+        os.makedirs(elsewhere)
+        write_distribution(elsewhere, "unrelated", "1.0", ["other = json:loads"])
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(elsewhere)
+        with patch("sys.path", ["", self.site]), patch(
+            "module_validator.entry_points._site_packages", return_value=[self.site]
+        ):
+            index = EntryPointIndex(self.index_path)
+            self.assertEqual([ep.name for ep in index.load()], ["echo"])
+            self.assertNotIn(elsewhere, str(index.fingerprint(index.sources)))
+
+            os.chdir(self.tmp.name)
+            with patch.object(EntryPointIndex, "rebuild", return_value=[]) as rebuild:
+                EntryPointIndex(self.index_path).load()
+                rebuild.assert_not_called()
+
+            # A new package changes the mtime of its site-packages folder.
+            write_distribution(self.site, "more_modules", "1.0", ["more = json:loads"])
+            os.utime(self.site, ns=(0, 0))
+            names = [ep.name for ep in EntryPointIndex(self.index_path).load()]
+            self.assertEqual(sorted(names), ["echo", "more"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+from module_validator.config import Config
+from module_validator.database import Database
+from module_validator.journal import RequestJournal, payload_size
+from module_validator.main import CommandNotFound, execute_command, open_journal
+from tests.helpers import DatabaseTestCase, FakeRegistry
+
+
+class TestRequestJournal(DatabaseTestCase):
+
+    def test_rows_are_written_in_batches(self):
+        journal = RequestJournal(self.db, batch_size=100, flush_interval=5)
+        with patch.object(self.db, "add_requests", wraps=self.db.add_requests) as add_requests:
+            for index in range(250):
+                journal.record("say", "ok", datetime.utcnow(), latency_ms=index)
+            journal.start()
+            journal.close()
+        self.assertEqual([len(call.args[0]) for call in add_requests.call_args_list], [100, 100, 50])
+        self.assertEqual(len(self.db.list_requests(limit=1000)), 250)
+
+    def test_writer_does_not_migrate(self):
+        with patch.object(self.db, "create_tables") as create_tables:
+            journal = RequestJournal(self.db).start()
+            journal.record("say", "ok", datetime.utcnow())
+            journal.close()
+        create_tables.assert_not_called()
+        self.assertEqual(journal.written, 1)
+
+    def test_flush_interval_bounds_the_delay(self):
+        journal = RequestJournal(self.db, batch_size=100, flush_interval=0.05).start()
+        self.addCleanup(journal.close)
+        journal.record("say", "ok", datetime.utcnow())
+        time.sleep(0.3)
+        self.assertEqual(journal.written, 1)
+
+    def test_full_queue_sheds_rows(self):
+        journal = RequestJournal(self.db, max_queue=5)
+        results = [journal.record("say", "ok", datetime.utcnow()) for _ in range(8)]
+        self.assertEqual(results, [True] * 5 + [False] * 3)
+        self.assertEqual(journal.dropped, 3)
+
+    def test_execute_command_records_requests(self):
+        journal = RequestJournal(self.db)
+        registry = FakeRegistry()
+        asyncio.run(execute_command(registry, self.db, "say", "hello", {}, journal))
+        with self.assertRaises(CommandNotFound):
+            asyncio.run(execute_command(registry, self.db, "missing", "hello", {}, journal))
+        with self.assertRaises(RuntimeError):
+            asyncio.run(execute_command(registry, self.db, "say", "fail", {}, journal))
+        journal.close()
+
+        fail, missing, ok = self.db.list_requests()
+        self.assertEqual((ok.command, ok.module_name, ok.status), ("say", "echo", "ok"))
+        self.assertEqual((ok.input_size, ok.output_size), (5, payload_size({"input": "hello"})))
+        self.assertGreaterEqual(ok.latency_ms, 0)
+        self.assertEqual(missing.status, "command_not_found")
+        self.assertEqual((fail.status, fail.error), ("error", "RuntimeError: boom"))
+
+    def test_one_shot_journal_writes_synchronously(self):
+        config = Config()
+        journal = open_journal(self.db, config, daemon=False)
+        self.assertIsNone(journal._thread)
+        self.assertIsNone(journal.metrics.compact_interval)
+        with patch.object(journal.metrics, "compact") as compact:
+            journal.record("say", "ok", datetime.utcnow(), latency_ms=1.0)
+            journal.close()
+        compact.assert_not_called()
+        self.assertEqual(journal.written, 1)
+
+        daemon_journal = open_journal(self.db, config, daemon=True)
+        self.addCleanup(daemon_journal.close)
+        self.assertIsNotNone(daemon_journal._thread)
+
+    def test_one_shot_commands_skip_journaling_before_migration(self):
+        old_db = Database({"database_url": f"sqlite:///{os.path.join(self.tmp.name, 'old.db')}"})
+        self.addCleanup(old_db.engine.dispose)
+        with patch("builtins.print"):
+            self.assertIsNone(open_journal(old_db, Config(), daemon=False))
+        self.assertIsNotNone(open_journal(self.db, Config(), daemon=False))
+
+    def test_payload_size(self):
+        self.assertEqual(payload_size({"input": "abc", "task": b"de"}), 14)
+        self.assertEqual(payload_size(None), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
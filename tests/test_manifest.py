@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import unittest
+
+from module_validator.entry_points import IndexedEntryPoint
+from module_validator.manifest import ModuleManifest, find_manifest, load_manifest
+
+GROUP = "module_validator.inference"
+
+
+class TestModuleManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.package = os.path.join(self.tmp.name, "manifest_package")
+        os.makedirs(self.package)
+        open(os.path.join(self.package, "__init__.py"), "w").close()
+        with open(os.path.join(self.package, "model.py"), "w") as f:
+            f.write("raise RuntimeError('must not be imported')\n")
+        self.entry_point = IndexedEntryPoint(
+            "model", "manifest_package.model:process", GROUP, "fake", "1.0"
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_manifest(self, content):
+        with open(os.path.join(self.package, "manifest.yaml"), "w") as f:
+            f.write(content)
+
+    def test_manifest_is_read_without_importing(self):
+        self.write_manifest(
+            "task_strings: [text2text, speech2text]\n"
+            "max_batch_size: 8\n"
+            "thread_safe: true\n"
+            "device: cuda\n"
+        )
+        manifest = load_manifest(self.entry_point, paths=[self.tmp.name])
+        self.assertEqual(
+            manifest,
+            ModuleManifest(("text2text", "speech2text"), 8, True, None, "cuda"),
+        )
+        self.assertNotIn("manifest_package", sys.modules)
+
+    def test_manifest_keyed_by_entry_point(self):
+        self.write_manifest("model:\n  max_batch_size: 4\nother:\n  max_batch_size: 2\n")
+        manifest = load_manifest(self.entry_point, paths=[self.tmp.name])
+        self.assertEqual(manifest.max_batch_size, 4)
+        self.assertFalse(manifest.thread_safe)
+
+    def test_missing_or_invalid_manifest(self):
+        self.assertIsNone(find_manifest(self.entry_point, paths=[self.tmp.name]))
+        self.write_manifest("max_batch_size: 4\ngpu: true\n")
+        self.assertIsNone(load_manifest(self.entry_point, paths=[self.tmp.name]))
+
+
+if __name__ == "__main__":
+    unittest.main()
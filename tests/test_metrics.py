@@ -0,0 +1,131 @@
+import calendar
+import os
+import random
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from module_validator import metrics
+from module_validator.database import Database, HourRollup, MinuteRollup
+from module_validator.metrics import MetricsStore, QuantileSketch
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        values = [random.lognormvariate(3, 1) for _ in range(5000)]
+        sketch = QuantileSketch(0.01)
+        for value in values[:2500]:
+            sketch.add(value)
+        other = QuantileSketch.from_dict(QuantileSketch(0.01).to_dict())
+        for value in values[2500:]:
+            other.add(value)
+        sketch.merge(other)
+
+        values.sort()
+        for q in (0.5, 0.95, 0.99):
+            expected = values[int(q * (len(values) - 1))]
+            self.assertAlmostEqual(sketch.quantile(q) / expected, 1, delta=0.02)
+        self.assertEqual(sketch.count, 5000)
+
+
+class TestMetricsStore(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database({"database_url": "sqlite://"})
+        self.db.create_tables()
+        self.metrics = MetricsStore(self.db)
+        self.start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+
+    def sample(self, minutes, latency_ms, task_string="text2text"):
+        return {
+            "module_name": "translation",
+            "task_string": task_string,
+            "latency_ms": latency_ms,
+            "started_at": self.start + timedelta(minutes=minutes),
+        }
+
+    def test_rollups_are_merged_incrementally(self):
+        self.metrics.record_many([self.sample(minute, 10.0) for minute in range(90)])
+        self.metrics.record_many([self.sample(minute, 100.0) for minute in range(90)])
+        self.metrics.record_many([self.sample(0, 1000.0, "speech2text")])
+
+        hours = self.metrics.query("translation", "text2text", since=self.start)
+        self.assertEqual([hour["count"] for hour in hours], [120, 60])
+        self.assertEqual((hours[0]["min"], hours[0]["max"], hours[0]["mean"]), (10.0, 100.0, 55.0))
+        self.assertAlmostEqual(hours[0]["p95"], 100.0, delta=1.0)
+        self.assertAlmostEqual(hours[0]["p50"], 10.0, delta=0.1)
+
+        merged = self.metrics.query("translation", resolution="day")
+        self.assertEqual((merged[0]["count"], merged[0]["max"]), (181, 1000.0))
+        with self.db.session() as session:
+            self.assertEqual(session.query(MinuteRollup).count(), 91)
+
+    def test_compaction_applies_retention(self):
+        self.metrics.record_many([self.sample(0, 10.0), self.sample(3 * 24 * 60, 10.0)])
+        self.db.add_requests(
+            [{"command": "translate", "status": "ok", **self.sample(0, 10.0)}]
+        )
+        now = calendar.timegm((self.start + timedelta(days=4)).utctimetuple())
+        deleted = self.metrics.compact(now)
+        # Minute rollups keep two days, the journal a week, hours 90 days.
+        self.assertEqual(deleted, 1)
+        with self.db.session() as session:
+            self.assertEqual(session.query(MinuteRollup).count(), 1)
+            self.assertEqual(session.query(HourRollup).count(), 2)
+        self.assertEqual(len(self.db.list_requests()), 1)
+
+    def test_unknown_retention_is_rejected(self):
+        with self.assertRaises(ValueError):
+            MetricsStore(self.db, retention={"week": 1})
+
+    def test_only_successful_requests_are_rolled_up(self):
+        self.metrics.record_many(
+            [
+                {**self.sample(0, 10.0), "status": "ok"},
+                {**self.sample(0, 0.1), "status": "command_not_found"},
+                {**self.sample(0, 5000.0), "status": "error"},
+            ]
+        )
+        [hour] = self.metrics.query("translation", "text2text", since=self.start)
+        self.assertEqual((hour["count"], hour["min"], hour["max"]), (1, 10.0, 10.0))
+
+    def test_concurrent_writers_do_not_lose_samples(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        url = f"sqlite:///{os.path.join(tmp.name, 'metrics.db')}"
+        db = Database({"database_url": url})
+        db.create_tables()
+        store = MetricsStore(db)
+        other = MetricsStore(Database({"database_url": url}))
+        store.record_many([self.sample(0, 10.0)])
+
+        upsert_insert = metrics.upsert_insert
+        interleaved = []
+
+        def record_in_between(*args):
+            # Another writer commits after `store` read the rows but before it writes.
+            if not interleaved:
+                interleaved.append(True)
+                thread = threading.Thread(target=other.record_many, args=([self.sample(0, 30.0)],))
+                thread.start()
+                thread.join()
+            return upsert_insert(*args)
+
+        with patch.object(metrics, "upsert_insert", side_effect=record_in_between):
+            store.record_many([self.sample(0, 20.0)])
+
+        [minute] = store.query("translation", "text2text", resolution="minute")
+        self.assertEqual(minute["count"], 3)
+        self.assertEqual((minute["min"], minute["max"], minute["mean"]), (10.0, 30.0, 20.0))
+        with db.session() as session:
+            row = session.scalars(select(MinuteRollup)).one()
+            self.assertEqual(QuantileSketch.from_dict(row.sketch).count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import gc
+import unittest
+import weakref
+
+from module_validator.database import Database
+from module_validator.query_stats import Histogram, _stats, format_snapshots, snapshot_all
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_quantiles_come_from_bucket_bounds(self):
+        histogram = Histogram([1, 2, 4, 8])
+        for value in [0.5, 1.5, 1.5, 3, 7]:
+            histogram.record(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 5)
+        self.assertEqual(snapshot["min"], 0.5)
+        self.assertEqual(snapshot["max"], 7)
+        self.assertEqual(snapshot["p50"], 2)
+        self.assertEqual(snapshot["p99"], 7)
+        self.assertIsNone(Histogram([1]).quantile(0.5))
+
+
+class TestQueryStats(unittest.TestCase):
+
+    def setUp(self):
+        self.db = Database({"database_url": "sqlite://"})
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.stats.disable()
+
+    def test_disabled_stats_attach_nothing(self):
+        self.db.add_commands([{"name": "a", "module_name": "m"}])
+        self.assertFalse(self.db.stats.enabled)
+        self.assertNotIn("raw_connection", vars(self.db.engine))
+        self.assertEqual(self.db.stats.snapshot()["statements"], {})
+
+    def test_statements_rows_and_pool_waits_are_recorded(self):
+        self.db.enable_stats()
+        self.db.add_commands([{"name": name, "module_name": "m"} for name in "abc"])
+        self.assertEqual(len(self.db.list_commands()), 3)
+        self.db.delete_commands(["a", "b"])
+
+        snapshot = self.db.stats.snapshot()
+        statements = snapshot["statements"]
+        self.assertEqual(statements["SELECT"]["rows"]["max"], 3)
+        self.assertEqual(statements["DELETE"]["rows"]["max"], 2)
+        self.assertGreater(statements["INSERT"]["latency_ms"]["count"], 0)
+        self.assertGreater(snapshot["pool_wait_ms"]["count"], 0)
+        self.assertIn(snapshot, snapshot_all())
+        self.assertIn("SELECT", format_snapshots([snapshot]))
+
+    def test_disable_removes_the_hooks(self):
+        self.db.enable_stats()
+        self.db.list_commands()
+        self.db.stats.disable()
+        count = self.db.stats.snapshot()["statements"]["SELECT"]["latency_ms"]["count"]
+        self.db.list_commands()
+        self.assertEqual(
+            self.db.stats.snapshot()["statements"]["SELECT"]["latency_ms"]["count"], count
+        )
+        self.assertNotIn("raw_connection", vars(self.db.engine))
+
+    def test_stats_do_not_keep_engines_alive(self):
+        db = Database({"database_url": "sqlite://"})
+        db.create_tables()
+        db.enable_stats()
+        db.list_commands()
+        engine = weakref.ref(db.engine)
+        session_factory = weakref.ref(db.Session)
+        self.assertIn(db.engine, _stats)
+        db.engine.dispose()
+        del db
+        gc.collect()
+        self.assertIsNone(engine())
+        self.assertIsNone(session_factory())
+        self.assertEqual(len([stats for stats in _stats.values() if stats.engine is None]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
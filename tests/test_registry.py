@@ -0,0 +1,604 @@
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+import unittest
+from unittest.mock import patch
+
+from module_validator.config import Config
+from module_validator.database import Database
+from module_validator.entry_points import FailedEntryPointCache, IndexedEntryPoint
+from module_validator.registry import ModuleRegistry
+
+
+def fake_entry_points():
+    group = "module_validator.inference"
+    return [
+        IndexedEntryPoint("dumps", "json:dumps", group, "fake", "1.0"),
+        IndexedEntryPoint("colorsys", "colorsys:rgb_to_hsv", group, "fake", "1.0"),
+        IndexedEntryPoint("broken", "not_a_real_module:process", group, "fake", "1.0"),
+    ]
+
+
+class TestModuleRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database({"database_url": "sqlite://"})
+        self.entry_points = fake_entry_points()
+        self.patcher = patch(
+            "module_validator.registry.iter_entry_points",
+            side_effect=lambda group: self.entry_points,
+        )
+        self.patcher.start()
+        sys.modules.pop("colorsys", None)
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp.cleanup()
+
+    def make_registry(self, **kwargs):
+        failed_entry_points = FailedEntryPointCache(os.path.join(self.tmp.name, "failed.json"))
+        return ModuleRegistry(
+            Config(), self.db, failed_entry_points=failed_entry_points, **kwargs
+        )
+
+    def test_eager_load_imports_every_module(self):
+        registry = self.make_registry()
+        registry.load_modules()
+        self.assertIn("colorsys", sys.modules)
+        self.assertEqual(sorted(registry.list_modules()), ["colorsys", "dumps"])
+
+    def test_failed_entry_points_are_skipped_until_version_changes(self):
+        self.make_registry().load_modules()
+
+        with patch.object(ModuleRegistry, "_import_entry_point") as import_entry_point:
+            registry = self.make_registry(lazy=True)
+            registry.load_modules()
+            self.assertNotIn("broken", registry.list_modules())
+            import_entry_point.assert_not_called()
+
+        self.entry_points[2] = self.entry_points[2]._replace(version="1.1")
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertIn("broken", registry.list_modules())
+
+    def test_only_deterministic_failures_are_cached(self):
+        with open(os.path.join(self.tmp.name, "flaky_module.py"), "w") as f:
+            f.write("raise RuntimeError('device busy')\n")
+        with open(os.path.join(self.tmp.name, "needs_dep.py"), "w") as f:
+            f.write("import not_installed_dependency\n")
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+        group = "module_validator.inference"
+        self.entry_points = [
+            IndexedEntryPoint("flaky", "flaky_module:process", group, "fake", "1.0"),
+            IndexedEntryPoint("needs_dep", "needs_dep:process", group, "fake", "1.0"),
+        ]
+        self.make_registry().load_modules()
+
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertEqual(registry.list_modules(), ["flaky"])
+
+        # Editing the module's source invalidates its cached failure.
+        with open(os.path.join(self.tmp.name, "needs_dep.py"), "w") as f:
+            f.write("def process(data):\n    return data\n")
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertEqual(sorted(registry.list_modules()), ["flaky", "needs_dep"])
+
+    def test_retry_failed_modules_clears_the_cache(self):
+        self.make_registry().load_modules()
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertNotIn("broken", registry.list_modules())
+
+        self.assertEqual(registry.retry_failed_modules(), ["broken"])
+        self.assertIn("broken", registry.list_modules())
+        self.assertIsNone(registry.failed_entry_points.get_failure(self.entry_points[2]))
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertIn("broken", registry.list_modules())
+
+    def test_slow_imports_time_out(self):
+        with open(os.path.join(self.tmp.name, "slow_module.py"), "w") as f:
+            f.write("import time\ntime.sleep(0.5)\ndef process(data):\n    return data\n")
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+        self.entry_points = [
+            IndexedEntryPoint("slow", "slow_module:process", "module_validator.inference", "fake", "1.0"),
+            IndexedEntryPoint("dumps", "json:dumps", "module_validator.inference", "fake", "1.0"),
+        ]
+
+        registry = self.make_registry(load_timeout=0.1)
+        start = time.perf_counter()
+        registry.load_modules()
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(list(registry.modules), ["dumps"])
+        self.assertIn("slow", registry.entry_points)
+        time.sleep(0.5)
+        self.assertIsNotNone(registry.get_module("slow"))
+
+    def test_lazy_load_defers_imports(self):
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertNotIn("colorsys", sys.modules)
+        self.assertEqual(registry.list_modules(), ["dumps", "colorsys", "broken"])
+
+        module = registry.get_module("colorsys")
+        self.assertIn("colorsys", sys.modules)
+        self.assertEqual(asyncio.run(module(1, 0, 0)), (0.0, 1.0, 1))
+        self.assertIs(registry.modules["colorsys"], sys.modules["colorsys"].rgb_to_hsv)
+
+    def test_lazy_load_failed_import(self):
+        registry = self.make_registry(lazy=True)
+        registry.load_modules()
+        self.assertIsNone(registry.get_module("broken"))
+        self.assertNotIn("broken", registry.list_modules())
+
+
+def make_hooks_module():
+    hooks = types.ModuleType("fake_instance_module")
+    hooks.events = []
+
+    def construct(config):
+        hooks.events.append("construct")
+        return {"model": "loaded"}
+
+    def warmup(instance):
+        hooks.events.append("warmup")
+
+    def close(instance):
+        hooks.events.append("close")
+        instance["model"] = None
+
+    def process(data, instance=None):
+        hooks.threads.add(threading.current_thread().name)
+        time.sleep(0.05)
+        return instance["model"], data
+
+    async def async_process(data):
+        return threading.current_thread().name
+
+    hooks.threads = set()
+    for function in (construct, warmup, close, process, async_process):
+        function.__module__ = hooks.__name__
+        setattr(hooks, function.__name__, function)
+    return hooks
+
+
+@unittest.skipIf(
+    importlib.util.find_spec("torch") is None or importlib.util.find_spec("transformers") is None,
+    "the translation module needs torch and transformers",
+)
+class TestTranslationHooks(unittest.TestCase):
+
+    def setUp(self):
+        from module_validator.modules.translation import translation
+
+        self.translation = translation
+        # configure never touches the weights, so the instance does not need any.
+        self.instance = object()
+
+    def test_unrelated_changes_keep_the_instance(self):
+        configure = self.translation.configure
+        self.assertTrue(configure(self.instance, {"performance": {"num_workers": 2}}))
+        self.assertTrue(configure(self.instance, {"model": {"batch_size": 16, "max_length": 512}}))
+
+    def test_model_changes_need_a_new_instance(self):
+        configure = self.translation.configure
+        self.assertFalse(configure(self.instance, {"model": {"model_name_or_card": "facebook/hf-seamless-m4t-medium"}}))
+        self.assertFalse(configure(self.instance, {"model": None}))
+
+
+class TestModuleInstances(unittest.TestCase):
+
+    def setUp(self):
+        self.hooks = make_hooks_module()
+        sys.modules[self.hooks.__name__] = self.hooks
+        group = "module_validator.inference"
+        entry_points = [
+            IndexedEntryPoint("fake", "fake_instance_module:process", group, "fake", "1.0"),
+            IndexedEntryPoint("native", "fake_instance_module:async_process", group, "fake", "1.0"),
+            IndexedEntryPoint("other", "fake_instance_module:process", group, "fake", "1.0"),
+        ]
+        self.patcher = patch(
+            "module_validator.registry.iter_entry_points", return_value=entry_points
+        )
+        self.patcher.start()
+        config = Config()
+        config.global_config = {"performance": {"num_workers": 4}}
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = ModuleRegistry(
+            config,
+            Database({"database_url": "sqlite://"}),
+            failed_entry_points=FailedEntryPointCache(os.path.join(self.tmp.name, "failed.json")),
+        )
+        self.registry.load_modules()
+
+    def tearDown(self):
+        self.registry.close()
+        self.patcher.stop()
+        sys.modules.pop(self.hooks.__name__, None)
+        self.tmp.cleanup()
+
+    def test_instance_is_constructed_once(self):
+        self.assertEqual(asyncio.run(self.registry.get_module("fake")("a")), ("loaded", "a"))
+        self.assertEqual(asyncio.run(self.registry.get_module("fake")("b")), ("loaded", "b"))
+        self.assertEqual(self.hooks.events, ["construct"])
+
+    def slow_construct(self, seconds):
+        construct = self.hooks.construct
+
+        def slow(config):
+            time.sleep(seconds)
+            return construct(config)
+
+        self.hooks.construct = slow
+
+    def test_first_call_constructs_off_the_event_loop(self):
+        self.slow_construct(0.5)
+
+        async def run():
+            lags = []
+
+            async def tick():
+                while True:
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.01)
+                    lags.append(time.perf_counter() - start - 0.01)
+
+            ticker = asyncio.ensure_future(tick())
+            await asyncio.sleep(0.02)
+            result = await self.registry.get_module("fake")("a")
+            ticker.cancel()
+            return result, max(lags)
+
+        result, lag = asyncio.run(run())
+        self.assertEqual(result, ("loaded", "a"))
+        self.assertLess(lag, 0.2)
+
+    def test_warmup_does_not_block_other_modules(self):
+        asyncio.run(self.registry.get_module("other")("a"))
+        self.slow_construct(1.0)
+        warmup = threading.Thread(target=self.registry.warmup_module, args=("fake",))
+        warmup.start()
+        try:
+            time.sleep(0.1)
+            start = time.perf_counter()
+            self.assertEqual(asyncio.run(self.registry.get_module("other")("b")), ("loaded", "b"))
+            self.assertLess(time.perf_counter() - start, 0.5)
+        finally:
+            warmup.join()
+        self.assertEqual(self.hooks.events, ["construct", "construct", "warmup"])
+
+    def test_concurrent_first_calls_construct_once(self):
+        self.slow_construct(0.2)
+
+        async def run():
+            module = self.registry.get_module("fake")
+            return await asyncio.gather(*(module(i) for i in range(4)))
+
+        self.assertEqual(asyncio.run(run()), [("loaded", i) for i in range(4)])
+        self.assertEqual(self.hooks.events, ["construct"])
+
+    def test_sync_modules_run_concurrently_in_executor(self):
+        async def run():
+            module = self.registry.get_module("fake")
+            return await asyncio.gather(*(module(i) for i in range(4)))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 0.15)
+        self.assertEqual(results, [("loaded", i) for i in range(4)])
+        self.assertNotIn(threading.main_thread().name, self.hooks.threads)
+
+    def test_async_modules_run_on_the_loop(self):
+        thread_name = asyncio.run(self.registry.get_module("native")("a"))
+        self.assertEqual(thread_name, threading.main_thread().name)
+        self.assertNotIn("native", self.registry.executors)
+
+    def test_warmup_inputs_run_once_per_task_string(self):
+        calls = []
+        original_process = self.hooks.process
+        self.hooks.warmup_inputs = lambda config: {"text2text": "a", "text2speech": "b"}
+
+        def process(data, instance=None):
+            calls.append(data)
+            return original_process(data, instance)
+
+        process.__module__ = self.hooks.__name__
+        self.registry.modules["fake"] = process
+
+        self.assertFalse(self.registry.is_ready("fake"))
+        self.registry.warmup_module("fake")
+        self.assertEqual(calls, ["a", "b"])
+        self.assertTrue(self.registry.is_ready("fake"))
+        self.assertEqual(self.registry.readiness_status()["fake"], "ready")
+        self.assertEqual(self.registry.readiness_status()["native"], "cold")
+
+    def test_calls_wait_for_warmup(self):
+        self.registry.get_module("fake")
+        self.registry._readiness_event("fake")
+
+        async def run():
+            call = asyncio.ensure_future(self.registry.get_module("fake")("a"))
+            await asyncio.sleep(0.1)
+            self.assertFalse(call.done())
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.registry.warmup_module, "fake"
+            )
+            return await call
+
+        self.assertEqual(asyncio.run(run()), ("loaded", "a"))
+        self.assertTrue(self.registry.wait_ready("fake", timeout=0))
+
+    def test_performance_changes_replace_the_executor(self):
+        asyncio.run(self.registry.get_module("fake")("a"))
+        executor = self.registry.executors["fake"]
+
+        self.registry.config.module_configs = {"fake": {"performance": {"num_workers": 2}}}
+        self.registry._configure_module("fake", {"performance": {"num_workers": 2}})
+        self.assertNotIn("fake", self.registry.executors)
+        asyncio.run(self.registry.get_module("fake")("b"))
+        self.assertIsNot(self.registry.executors["fake"], executor)
+        self.assertEqual(self.registry.executors["fake"]._max_workers, 2)
+        self.assertEqual(self.hooks.events, ["construct"])
+        self.assertIn(self.registry._configure_module, self.registry.config._subscribers["fake"])
+
+    def test_config_changes_reach_configure_hook(self):
+        changes = []
+        self.hooks.configure = lambda instance, change: changes.append((instance, change)) or True
+        asyncio.run(self.registry.get_module("fake")("a"))
+        [instance] = self.registry.instances.values()
+
+        self.registry._configure_module("fake", {"model": {"batch_size": 16}})
+        self.assertEqual(changes, [(instance, {"model": {"batch_size": 16}})])
+        self.assertEqual(self.hooks.events, ["construct"])
+        self.assertEqual(list(self.registry.instances.values()), [instance])
+
+    def use_model_name_as_instance_key(self):
+        self.hooks.instance_key = lambda config: (config.get("model") or {}).get("name", "default")
+        self.registry.config.module_configs = {"fake": {"model": {"name": "small"}}}
+
+    def test_instance_is_replaced_when_it_can_not_be_reconfigured(self):
+        self.use_model_name_as_instance_key()
+        self.hooks.configure = lambda instance, changes: False
+        asyncio.run(self.registry.get_module("fake")("a"))
+
+        self.registry.config.module_configs = {"fake": {"model": {"name": "large"}}}
+        self.registry._configure_module("fake", {"model": {"name": "large"}})
+        self.assertEqual(self.hooks.events, ["construct", "close"])
+        self.assertEqual(self.registry.instances, {})
+        asyncio.run(self.registry.get_module("fake")("b"))
+        self.assertEqual(self.hooks.events, ["construct", "close", "construct"])
+        self.assertEqual(list(self.registry.instances), [(self.hooks.__name__, "large")])
+
+    def test_warmed_instance_is_replaced_before_it_is_closed(self):
+        self.use_model_name_as_instance_key()
+        self.registry.warmup_module("fake")
+
+        self.registry.config.module_configs = {"fake": {"model": {"name": "large"}}}
+        self.registry._configure_module("fake", {"model": {"name": "large"}})
+        self.assertEqual(self.hooks.events, ["construct", "warmup", "construct", "warmup", "close"])
+        self.assertEqual(list(self.registry.instances), [(self.hooks.__name__, "large")])
+        self.assertEqual(asyncio.run(self.registry.get_module("fake")("a")), ("loaded", "a"))
+        self.assertEqual(self.hooks.events.count("construct"), 2)
+
+    def test_lifecycle_hooks(self):
+        instance = self.registry.warmup_module("fake")
+        self.assertEqual(self.hooks.events, ["construct", "warmup"])
+        self.assertTrue(self.registry.close_module("fake"))
+        self.assertEqual(self.hooks.events, ["construct", "warmup", "close"])
+        self.assertIsNone(instance["model"])
+        self.assertEqual(self.registry.instances, {})
+
+
+
+WARM_POOL_MODULE = """
+import os
+
+MARKERS = {markers!r}
+
+
+def _mark(kind):
+    open(os.path.join(MARKERS, "%s-%d" % (kind, os.getpid())), "w").close()
+
+
+def construct(config):
+    _mark("construct")
+    return {{}}
+
+
+def warmup_inputs(config):
+    return {{"text2text": "hello"}}
+
+
+def process(data, instance=None):
+    if data == "hello":
+        _mark("warmup")
+    return os.getpid()
+"""
+
+
+class TestProcessPoolWarmup(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.markers = os.path.join(self.tmp.name, "markers")
+        os.makedirs(self.markers)
+        with open(os.path.join(self.tmp.name, "warm_pool_module.py"), "w") as f:
+            f.write(WARM_POOL_MODULE.format(markers=self.markers))
+        sys.path.insert(0, self.tmp.name)
+        group = "module_validator.inference"
+        self.patcher = patch(
+            "module_validator.registry.iter_entry_points",
+            return_value=[
+                IndexedEntryPoint("pooled", "warm_pool_module:process", group, "fake", "1.0")
+            ],
+        )
+        self.patcher.start()
+        config = Config()
+        config.module_configs = {"pooled": {"performance": {"executor": "process", "num_workers": 2}}}
+        self.registry = ModuleRegistry(
+            config,
+            Database({"database_url": "sqlite://"}),
+            failed_entry_points=FailedEntryPointCache(os.path.join(self.tmp.name, "failed.json")),
+        )
+        self.registry.load_modules()
+
+    def tearDown(self):
+        self.registry.close()
+        self.patcher.stop()
+        sys.path.remove(self.tmp.name)
+        sys.modules.pop("warm_pool_module", None)
+        self.tmp.cleanup()
+
+    def test_warmup_runs_in_the_pool_workers(self):
+        self.registry.warmup_module("pooled")
+        self.assertTrue(self.registry.is_ready("pooled"))
+        self.assertEqual(self.registry.instances, {})
+
+        pid = asyncio.run(self.registry.get_module("pooled")("hi"))
+        markers = os.listdir(self.markers)
+        self.assertNotEqual(pid, os.getpid())
+        self.assertIn(f"warmup-{pid}", markers)
+        self.assertNotIn(f"construct-{os.getpid()}", markers)
+        self.assertNotIn(f"warmup-{os.getpid()}", markers)
+
+    def test_resized_pool_is_warm_before_it_is_swapped_in(self):
+        self.registry.warmup_module("pooled")
+        old_pool = self.registry.executors["pooled"]
+        self.assertEqual(len(os.listdir(self.markers)), 2)
+
+        performance = {"executor": "process", "num_workers": 3}
+        self.registry.config.module_configs = {"pooled": {"performance": performance}}
+        self.registry._configure_module("pooled", {"performance": {"num_workers": 3}})
+        new_pool = self.registry.executors["pooled"]
+        self.assertIsNot(new_pool, old_pool)
+        self.assertEqual(new_pool._max_workers, 3)
+        self.assertEqual(len([m for m in os.listdir(self.markers) if m.startswith("warmup-")]), 5)
+
+        pid = asyncio.run(self.registry.get_module("pooled")("hi"))
+        self.assertIn(f"warmup-{pid}", os.listdir(self.markers))
+
+
+HOT_MODULE = """
+events = []
+
+
+def construct(config):
+    events.append("construct {version}")
+    return {{"version": {version}}}
+
+
+def close(instance):
+    events.append("close %s" % instance["version"])
+
+
+def process(data, instance=None):
+    import time
+    time.sleep(data)
+    return instance["version"]
+"""
+
+
+class TestModuleReload(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.package = os.path.join(self.tmp.name, "hot_package")
+        os.makedirs(self.package)
+        open(os.path.join(self.package, "__init__.py"), "w").close()
+        self.write_module(1)
+        sys.path.insert(0, self.tmp.name)
+
+        self.hooks = make_hooks_module()
+        sys.modules[self.hooks.__name__] = self.hooks
+        group = "module_validator.inference"
+        self.entry_points = [
+            IndexedEntryPoint("hot", "hot_package.model:process", group, "hot", "1.0"),
+            IndexedEntryPoint("fake", "fake_instance_module:process", group, "fake", "1.0"),
+        ]
+        self.patcher = patch(
+            "module_validator.registry.iter_entry_points",
+            side_effect=lambda group: self.entry_points,
+        )
+        self.patcher.start()
+        self.registry = ModuleRegistry(
+            Config(),
+            Database({"database_url": "sqlite://"}),
+            failed_entry_points=FailedEntryPointCache(os.path.join(self.tmp.name, "failed.json")),
+        )
+        self.registry.load_modules()
+
+    def tearDown(self):
+        self.registry.close()
+        self.patcher.stop()
+        sys.path.remove(self.tmp.name)
+        for name in ("hot_package", "hot_package.model", self.hooks.__name__):
+            sys.modules.pop(name, None)
+        self.tmp.cleanup()
+
+    def write_module(self, version):
+        path = os.path.join(self.package, "model.py")
+        with open(path, "w") as f:
+            f.write(HOT_MODULE.format(version=version))
+        later = time.time() + version
+        os.utime(path, (later, later))
+
+    def test_changed_module_is_swapped_in(self):
+        self.assertEqual(asyncio.run(self.registry.get_module("hot")(0)), 1)
+        asyncio.run(self.registry.get_module("fake")("a"))
+        fake_instance = self.registry.construct_module("fake")
+        self.assertEqual(self.registry.check_for_changes(), [])
+
+        old_hooks = sys.modules["hot_package.model"]
+        self.write_module(2)
+        self.assertEqual(self.registry.check_for_changes(), ["hot"])
+
+        self.assertEqual(asyncio.run(self.registry.get_module("hot")(0)), 2)
+        self.assertEqual(old_hooks.events, ["construct 1", "close 1"])
+        self.assertIs(self.registry.construct_module("fake"), fake_instance)
+        self.assertEqual(self.hooks.events, ["construct"])
+
+    def test_in_flight_calls_finish_on_old_instance(self):
+        old_hooks = None
+
+        async def run():
+            nonlocal old_hooks
+            module = self.registry.get_module("hot")
+            slow_call = asyncio.ensure_future(module(0.3))
+            await asyncio.sleep(0.1)
+            old_hooks = sys.modules["hot_package.model"]
+            self.write_module(2)
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.registry.check_for_changes
+            )
+            self.assertEqual(old_hooks.events, ["construct 1"])
+            self.assertEqual(await module(0), 2)
+            return await slow_call
+
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertEqual(old_hooks.events, ["construct 1", "close 1"])
+
+    def test_broken_version_keeps_old_one_running(self):
+        self.assertEqual(asyncio.run(self.registry.get_module("hot")(0)), 1)
+        path = os.path.join(self.package, "model.py")
+        with open(path, "w") as f:
+            f.write("raise ImportError('broken')\n")
+        later = time.time() + 5
+        os.utime(path, (later, later))
+
+        self.assertEqual(self.registry.check_for_changes(), [])
+        self.assertEqual(asyncio.run(self.registry.get_module("hot")(0)), 1)
+        self.assertEqual(self.registry.check_for_changes(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import types
+import unittest
+from unittest.mock import patch
+
+from module_validator.config import Config
+from module_validator.database import Database
+from module_validator.entry_points import FailedEntryPointCache, IndexedEntryPoint
+from module_validator.registry import ModuleRegistry
+from module_validator.database import ResultCacheEntry
+from module_validator.result_cache import ResultCache, cache_key, dumps, loads
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        # Cache reads and writes run in executor threads, in-memory databases are per thread.
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database({"database_url": f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"})
+        self.db.create_tables()
+
+    def tearDown(self):
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_key_hashes_content(self):
+        key = cache_key("m", "1.0", ({"b": 1, "a": "hi"},), {"x": b"\x00"})
+        self.assertEqual(key, cache_key("m", "1.0", ({"a": "hi", "b": 1},), {"x": b"\x00"}))
+        self.assertNotEqual(key, cache_key("m", "1.0", ({"a": " hi ", "b": 1},), {"x": b"\x00"}))
+        self.assertNotEqual(key, cache_key("m", "1.1", ({"a": "hi", "b": 1},), {"x": b"\x00"}))
+        self.assertNotEqual(key, cache_key("m", "1.0", ({"a": "hi", "b": 1},), {"x": b"\x01"}))
+        self.assertNotEqual(cache_key("m", "1", (1,), {}), cache_key("m", "1", ("1",), {}))
+        self.assertNotEqual(cache_key("m", "1", (1,), {}), cache_key("m", "1", (True,), {}))
+
+    def test_objects_without_content_hash_are_not_cached(self):
+        self.assertIsNone(cache_key("m", "1.0", (object(),), {}))
+        self.assertIsNone(cache_key("m", "1.0", ({object(): 1},), {}))
+
+    def test_arrays_are_hashed_by_data(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        zeros = numpy.zeros(10000)
+        changed = zeros.copy()
+        changed[5000] = 1
+        # Both reprs are the same truncated "array([0., 0., 0., ..., 0., 0., 0.])".
+        self.assertNotEqual(cache_key("m", "1", (zeros,), {}), cache_key("m", "1", (changed,), {}))
+        self.assertNotEqual(
+            cache_key("m", "1", (zeros,), {}), cache_key("m", "1", (zeros.reshape(100, 100),), {})
+        )
+        self.assertEqual(cache_key("m", "1", (zeros,), {}), cache_key("m", "1", (zeros.copy(),), {}))
+
+    def test_persistent_tier_survives_a_new_cache(self):
+        ResultCache(self.db).put("k", "m", {"out": [1, 2]}, ttl=60)
+        cache = ResultCache(self.db)
+        with self.assertRaises(KeyError):
+            cache.get_memory("k")
+        self.assertEqual(cache.get("k"), {"out": [1, 2]})
+        self.assertEqual(cache.get_memory("k"), {"out": [1, 2]})
+
+    def test_hits_return_copies(self):
+        cache = ResultCache(self.db)
+        cache.put("k", "m", {"out": [1, 2]}, ttl=60)
+        cache.get_memory("k")["out"].append(3)
+        self.assertEqual(cache.get_memory("k"), {"out": [1, 2]})
+
+    def test_rows_are_json(self):
+        value = {"text": "hi", "audio": b"\x00\x01", "pair": (1, None), 3: [1.5, {"$type": "x"}]}
+        self.assertEqual(loads(dumps(value)), value)
+        with self.assertRaises(TypeError):
+            dumps(object())
+
+        ResultCache(self.db).put("k", "m", value, ttl=60)
+        with self.db.session() as session:
+            row = session.get(ResultCacheEntry, "k")
+            self.assertEqual(json.loads(row.value)["$type"], "dict")
+            # A pickle planted in the shared table is a miss, not code to run.
+            row.value = pickle.dumps(value)
+        with self.assertRaises(KeyError), patch("module_validator.result_cache.logger"):
+            ResultCache(self.db).get("k")
+
+    def test_arrays_round_trip(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        array = numpy.arange(6, dtype=numpy.float32).reshape(2, 3)
+        result = loads(dumps({"embedding": array}))["embedding"]
+        numpy.testing.assert_array_equal(result, array)
+        self.assertEqual(result.dtype, array.dtype)
+        result[0, 0] = 1
+        with self.assertRaises(TypeError):
+            dumps(numpy.array([object()]))
+
+    def test_entries_expire(self):
+        cache = ResultCache(self.db)
+        cache.put("k", "m", "value", ttl=0.05)
+        time.sleep(0.1)
+        with self.assertRaises(KeyError):
+            cache.get("k")
+        self.assertEqual(cache.misses, 1)
+
+    def test_memory_tier_is_lru_bounded(self):
+        cache = ResultCache(self.db, memory_entries=2)
+        for key in "abc":
+            cache.put_memory(key, dumps(key), time.time() + 60)
+        self.assertEqual(list(cache.memory), ["b", "c"])
+
+    def test_eviction_keeps_newest_rows(self):
+        cache = ResultCache(self.db, max_rows=3, evict_every=1000)
+        for index in range(5):
+            cache.put(f"k{index}", "m", index, ttl=60)
+        cache.put("expired", "m", "value", ttl=-1)
+        self.assertEqual(cache.evict(), 3)
+        cache.memory.clear()
+        self.assertEqual([cache.get(f"k{index}") for index in range(2, 5)], [2, 3, 4])
+        with self.assertRaises(KeyError):
+            cache.get("k0")
+
+
+class TestRegistryResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        module = types.ModuleType("fake_cached_module")
+
+        def process(data):
+            self.calls.append(data)
+            return data.upper()
+
+        module.process = process
+        sys.modules[module.__name__] = module
+        self.addCleanup(sys.modules.pop, module.__name__, None)
+
+        group = "module_validator.inference"
+        entry_points = [
+            IndexedEntryPoint("cached", "fake_cached_module:process", group, "fake", "1.0"),
+            IndexedEntryPoint("uncached", "fake_cached_module:process", group, "fake", "1.0"),
+        ]
+        self.patcher = patch(
+            "module_validator.registry.iter_entry_points", return_value=entry_points
+        )
+        self.patcher.start()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Database({"database_url": f"sqlite:///{os.path.join(self.tmp.name, 'test.db')}"})
+        self.db.create_tables()
+        config = Config()
+        config.global_config = {"default_module_settings": {"cache_results": True, "cache_ttl": 60}}
+        config.module_configs = {"uncached": {"cache_results": False}}
+        self.registry = ModuleRegistry(
+            config,
+            self.db,
+            failed_entry_points=FailedEntryPointCache(os.path.join(self.tmp.name, "failed.json")),
+        )
+        self.registry.load_modules()
+
+    def tearDown(self):
+        self.registry.close()
+        self.patcher.stop()
+        self.db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_modules_opt_in_through_config(self):
+        async def run(name):
+            module = self.registry.get_module(name)
+            return [await module("a"), await module(" a "), await module("b")]
+
+        self.assertEqual(asyncio.run(run("cached")), ["A", " A ", "B"])
+        self.assertEqual(asyncio.run(run("cached")), ["A", " A ", "B"])
+        self.assertEqual(self.calls, ["a", " a ", "b"])
+        self.calls.clear()
+        self.assertEqual(asyncio.run(run("uncached")), ["A", " A ", "B"])
+        self.assertEqual(self.calls, ["a", " a ", "b"])
+
+    def test_failed_writes_are_logged(self):
+        async def run():
+            with patch.object(self.registry.result_cache, "write", side_effect=RuntimeError("disk full")):
+                result = await self.registry.get_module("cached")("a")
+                self.assertEqual(len(self.registry._cache_writes), 1)
+                await asyncio.gather(*self.registry._cache_writes, return_exceptions=True)
+                await asyncio.sleep(0)
+            return result
+
+        with patch("builtins.print") as print_:
+            self.assertEqual(asyncio.run(run()), "A")
+        self.assertEqual(self.registry._cache_writes, set())
+        print_.assert_any_call("Failed to write the cached result of module cached: disk full")
+
+    def test_config_changes_miss_the_cache(self):
+        async def run():
+            return await self.registry.get_module("cached")("a")
+
+        asyncio.run(run())
+        self.registry.config.module_configs = {
+            "uncached": {"cache_results": False},
+            "cached": {"model": {"max_length": 16}},
+        }
+        self.assertEqual(asyncio.run(run()), "A")
+        self.assertEqual(asyncio.run(run()), "A")
+        self.assertEqual(self.calls, ["a", "a"])
+
+        self.registry.config.module_configs = {
+            "uncached": {"cache_results": False},
+            "cached": {"model": {"max_length": 16}, "performance": {"num_workers": 2}},
+        }
+        self.assertEqual(asyncio.run(run()), "A")
+        self.assertEqual(self.calls, ["a", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,141 @@
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+import unittest
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import patch
+
+from module_validator.config import Config
+from module_validator.database import Database
+from module_validator.entry_points import FailedEntryPointCache, IndexedEntryPoint
+from module_validator.registry import ModuleRegistry
+from module_validator.workers import (
+    SHARED_MEMORY_THRESHOLD,
+    ModuleWorker,
+    SharedBuffer,
+    WorkerError,
+    close_borrowed,
+    pack,
+    release,
+    unpack,
+)
+
+GROUP = "module_validator.inference"
+
+
+class TestSharedMemoryTransport(unittest.TestCase):
+
+    def test_large_payloads_use_shared_memory(self):
+        audio = b"\x01\x02" * SHARED_MEMORY_THRESHOLD
+        message = {"data": {"input": base64.b64encode(audio).decode(), "task_string": "s"}}
+        packed = pack((message, audio))
+        self.assertIsInstance(packed[0]["data"]["input"], SharedBuffer)
+        self.assertEqual(packed[0]["data"]["task_string"], "s")
+        # Bytes pickle through the pipe faster than a block is set up.
+        self.assertIs(packed[1], audio)
+        self.assertEqual(unpack(packed), (message, audio))
+
+    def test_numpy_arrays_use_shared_memory(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        waveform = numpy.arange(SHARED_MEMORY_THRESHOLD, dtype=numpy.float32).reshape(2, -1)
+        packed = pack(waveform)
+        self.assertEqual(packed.kind, "ndarray")
+        numpy.testing.assert_array_equal(unpack(packed), waveform)
+
+    def test_borrowed_arrays_are_views_of_the_block(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        waveform = numpy.arange(SHARED_MEMORY_THRESHOLD, dtype=numpy.float32)
+        packed = pack({"input": waveform})
+        self.addCleanup(release, packed)
+        borrowed = []
+        view = unpack(packed, unlink=False, borrowed=borrowed)["input"]
+        numpy.testing.assert_array_equal(view, waveform)
+        self.assertFalse(view.flags.owndata)
+        self.assertEqual(len(borrowed), 1)
+        del view
+        close_borrowed(borrowed)
+        self.assertEqual(borrowed, [])
+
+    def test_small_payloads_are_left_alone(self):
+        self.assertEqual(pack({"input": "hello"}), {"input": "hello"})
+
+
+class TestModuleWorker(unittest.TestCase):
+
+    def test_call_in_worker_process(self):
+        worker = ModuleWorker(IndexedEntryPoint("decode", "base64:b64decode", GROUP, "", ""))
+        self.addCleanup(worker.stop)
+        audio = os.urandom(SHARED_MEMORY_THRESHOLD)
+        self.assertEqual(worker.call(base64.b64encode(audio).decode()), audio)
+        self.assertNotEqual(worker.process.pid, os.getpid())
+
+    def test_array_arguments_in_worker_process(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("numpy is not installed")
+        worker = ModuleWorker(IndexedEntryPoint("sum", "numpy:sum", GROUP, "", ""))
+        self.addCleanup(worker.stop)
+        waveform = numpy.ones(SHARED_MEMORY_THRESHOLD // 8)
+        self.assertEqual(worker.call(waveform), waveform.size)
+
+    def test_errors_are_reported(self):
+        worker = ModuleWorker(IndexedEntryPoint("encode", "base64:b64encode", GROUP, "", ""))
+        self.addCleanup(worker.stop)
+        with self.assertRaises(WorkerError):
+            worker.call("not bytes")
+        self.assertEqual(worker.call(b"a"), b"YQ==")
+
+    def test_argument_blocks_are_unlinked_when_the_worker_dies(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "crashing_module.py"), "w") as f:
+                f.write("import os\n\ndef process(data):\n    os._exit(1)\n")
+            with patch("sys.path", [tmp] + sys.path):
+                worker = ModuleWorker(IndexedEntryPoint("crash", "crashing_module:process", GROUP, "", ""))
+                self.addCleanup(worker.stop)
+                released = []
+
+                def recording_release(message):
+                    released.append(message)
+                    release(message)
+
+                with patch("module_validator.workers.release", side_effect=recording_release):
+                    with self.assertRaises(WorkerError):
+                        worker.call("a" * SHARED_MEMORY_THRESHOLD)
+
+        # release recurses into the message; its first call gets the whole message.
+        (argument,), _ = released[0]
+        self.assertIsInstance(argument, SharedBuffer)
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=argument.name)
+
+    def test_isolated_registry(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        entry_points = [IndexedEntryPoint("encode", "base64:b64encode", GROUP, "", "")]
+        with patch("module_validator.registry.iter_entry_points", return_value=entry_points):
+            registry = ModuleRegistry(
+                Config(),
+                Database({"database_url": "sqlite://"}),
+                isolated=True,
+                failed_entry_points=FailedEntryPointCache(os.path.join(tmp.name, "f.json")),
+            )
+            registry.load_modules()
+        self.addCleanup(registry.close)
+
+        self.assertEqual(registry.modules, {})
+        registry.warmup_module("encode")
+        self.assertTrue(registry.is_ready("encode"))
+        self.assertEqual(asyncio.run(registry.get_module("encode")(b"a")), b"YQ==")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from module_validator.async_database import AsyncDatabase
+from module_validator.database import Database
+
+
+async def measure_lag(stop: asyncio.Event, interval: float, lags: list) -> None:
+    """Records how late a periodic timer fires while lookups are running."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_lookups(lookup, names, concurrency: int, iterations: int, interval: float):
+    async def worker(offset):
+        for index in range(iterations):
+            await lookup(names[(offset + index) % len(names)])
+
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.ensure_future(measure_lag(stop, interval, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(offset) for offset in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticker
+    return elapsed, sorted(lags) or [0.0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure event loop lag under concurrent command lookups."
+    )
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=40)
+    parser.add_argument("--interval-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    interval = args.interval_ms / 1000
+
+    with tempfile.TemporaryDirectory() as root:
+        settings = {"database_url": f"sqlite:///{os.path.join(root, 'bench.db')}"}
+        db = Database(settings)
+        db.create_tables()
+        names = [f"command_{index}" for index in range(args.commands)]
+        db.add_commands([{"name": name, "module_name": "module"} for name in names])
+
+        async def blocking_lookup(name):
+            db.get_command(name)
+
+        async def run():
+            async_db = AsyncDatabase(settings)
+            try:
+                results = {
+                    "Database": await run_lookups(
+                        blocking_lookup, names, args.concurrency, args.iterations, interval
+                    ),
+                    "AsyncDatabase": await run_lookups(
+                        async_db.get_command, names, args.concurrency, args.iterations, interval
+                    ),
+                }
+            finally:
+                await async_db.close()
+            return results
+
+        results = asyncio.run(run())
+
+    lookups = args.concurrency * args.iterations
+    print(f"{lookups} get_command lookups from {args.concurrency} concurrent tasks")
+    print(f"{'backend':<16}{'total (ms)':>12}{'lag p50 (ms)':>14}{'lag p99 (ms)':>14}{'lag max (ms)':>14}")
+    for backend, (elapsed, lags) in results.items():
+        print(
+            f"{backend:<16}{elapsed * 1000:>12.1f}"
+            f"{lags[len(lags) // 2] * 1000:>14.2f}"
+            f"{lags[int(len(lags) * 0.99)] * 1000:>14.2f}"
+            f"{lags[-1] * 1000:>14.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from module_validator.database import CommandEntry, Database
+
+
+def per_call_session_lookup(database_url: str):
+    """The lookup as Database.get_command did it before sessions were pooled."""
+    Session = sessionmaker(bind=create_engine(database_url))
+
+    def get_command(name):
+        session = Session()
+        command = session.query(CommandEntry).filter_by(name=name).first()
+        session.close()
+        return command
+
+    return get_command
+
+
+def time_lookups(get_command, names, iterations: int) -> float:
+    start = time.perf_counter()
+    for index in range(iterations):
+        get_command(names[index % len(names)])
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure Database.get_command throughput with per-call and scoped sessions."
+    )
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        database_url = f"sqlite:///{os.path.join(root, 'bench.db')}"
+        db = Database({"database_url": database_url})
+        db.create_tables()
+        names = [f"command_{index}" for index in range(args.commands)]
+        with db.session():
+            for name in names:
+                db.add_command(name, "module")
+
+        before = time_lookups(per_call_session_lookup(database_url), names, args.iterations)
+        pooled = time_lookups(db.get_command, names, args.iterations)
+        with db.session():
+            scoped = time_lookups(db.get_command, names, args.iterations)
+
+    print(f"{args.iterations} get_command lookups over {args.commands} commands")
+    print(f"{'mode':<28}{'lookups/s':>12}{'us/lookup':>12}")
+    for mode, elapsed in (
+        ("per-call session (before)", before),
+        ("per-call session, shared", pooled),
+        ("scoped session", scoped),
+    ):
+        print(
+            f"{mode:<28}{args.iterations / elapsed:>12.0f}"
+            f"{elapsed / args.iterations * 1e6:>12.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from module_validator.config import Config
+from module_validator.database import Database
+from module_validator.registry import ModuleRegistry
+
+DIST_NAME = "bench_inference_modules"
+PACKAGE_NAME = "bench_inference_modules"
+
+MODULE_TEMPLATE = """import time
+
+# Simulate the import cost of a heavy inference module (torch, transformers, ...)
+time.sleep({import_cost})
+
+
+def process(data):
+    return data
+"""
+
+
+def create_fake_distribution(root: str, num_modules: int, import_cost: float) -> None:
+    """
+    Writes a package with `num_modules` inference modules and a dist-info folder
+    registering each of them in the module_validator.inference group.
+    """
+    package_dir = os.path.join(root, PACKAGE_NAME)
+    os.makedirs(package_dir)
+    with open(os.path.join(package_dir, "__init__.py"), "w") as f:
+        f.write("")
+
+    entries = []
+    for index in range(num_modules):
+        module_name = f"module_{index}"
+        with open(os.path.join(package_dir, f"{module_name}.py"), "w") as f:
+            f.write(MODULE_TEMPLATE.format(import_cost=import_cost))
+        entries.append(f"{module_name} = {PACKAGE_NAME}.{module_name}:process")
+
+    dist_info = os.path.join(root, f"{DIST_NAME}-0.0.0.dist-info")
+    os.makedirs(dist_info)
+    with open(os.path.join(dist_info, "METADATA"), "w") as f:
+        f.write(f"Metadata-Version: 2.1\nName: {DIST_NAME}\nVersion: 0.0.0\n")
+    with open(os.path.join(dist_info, "entry_points.txt"), "w") as f:
+        f.write("[module_validator.inference]\n" + "\n".join(entries) + "\n")
+
+
+def unload_fake_modules() -> None:
+    for name in list(sys.modules):
+        if name == PACKAGE_NAME or name.startswith(f"{PACKAGE_NAME}."):
+            del sys.modules[name]
+
+
+def time_registry(config: Config, db: Database, lazy: bool) -> tuple:
+    unload_fake_modules()
+    registry = ModuleRegistry(config, db, lazy=lazy)
+
+    start = time.perf_counter()
+    registry.load_modules()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    registry.get_module("module_0")
+    first_call_time = time.perf_counter() - start
+    return load_time, first_call_time
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure ModuleRegistry.load_modules startup cost in eager and lazy mode."
+    )
+    parser.add_argument("--modules", type=int, default=20)
+    parser.add_argument("--import-cost", type=float, default=0.05)
+    parser.add_argument("--budget-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        create_fake_distribution(root, args.modules, args.import_cost)
+        sys.path.insert(0, root)
+
+        config = Config()
+        db = Database({"database_url": "sqlite://"})
+
+        eager_load, eager_first = time_registry(config, db, lazy=False)
+        lazy_load, lazy_first = time_registry(config, db, lazy=True)
+
+    print()
+    print(f"{args.modules} modules, {args.import_cost * 1000:.0f} ms import cost each")
+    print(f"{'mode':<8}{'load_modules (ms)':>20}{'first get_module (ms)':>24}")
+    print(f"{'eager':<8}{eager_load * 1000:>20.2f}{eager_first * 1000:>24.2f}")
+    print(f"{'lazy':<8}{lazy_load * 1000:>20.2f}{lazy_first * 1000:>24.2f}")
+
+    if lazy_load * 1000 > args.budget_ms:
+        print(f"Lazy registry load exceeded the {args.budget_ms} ms budget")
+        return 1
+    print(f"Lazy registry load is within the {args.budget_ms} ms budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
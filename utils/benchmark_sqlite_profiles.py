@@ -0,0 +1,93 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from module_validator.database import SQLITE_PROFILES, Database
+
+
+def open_database(root: str, profile: str) -> Database:
+    settings = {
+        "database_url": f"sqlite:///{os.path.join(root, f'{profile}.db')}",
+        "database": {"sqlite": {"profile": profile, "busy_timeout": 30000}},
+    }
+    db = Database(settings)
+    db.create_tables()
+    db.add_commands([{"name": f"seed_{index}", "module_name": "module"} for index in range(100)])
+    return db
+
+
+def run_round(db: Database, tag: str, writers: int, readers: int, writes: int, reads: int):
+    """
+    Runs `writers` threads committing one command per transaction while
+    `readers` threads look commands up, the way a validator and its miners
+    share one database file. Returns commits/s and lookups/s over the round.
+    """
+    barrier = threading.Barrier(writers + readers + 1)
+
+    def write(worker):
+        barrier.wait()
+        for index in range(writes):
+            db.add_command(f"{tag}_{worker}_{index}", "module")
+
+    def read(worker):
+        barrier.wait()
+        for index in range(reads):
+            db.get_command(f"seed_{(worker + index) % 100}")
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+    threads += [threading.Thread(target=read, args=(worker,)) for worker in range(readers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return writers * writes / elapsed, readers * reads / elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Measure SQLite commit and lookup throughput of each database.sqlite profile."
+    )
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5, help="Rounds per profile; the median is reported")
+    parser.add_argument("--dir", default=None, help="Directory for the database files")
+    args = parser.parse_args()
+
+    print(
+        f"Median of {args.repeat} rounds: one writer thread alone, then {args.writers} writer"
+        f" and {args.readers} reader threads on one database file"
+    )
+    print(f"{'profile':<10}{'commits/s':>12}{'shared commits/s':>18}{'lookups/s':>12}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as root:
+        databases = {profile: open_database(root, profile) for profile in SQLITE_PROFILES}
+        results = {profile: [] for profile in SQLITE_PROFILES}
+        # Warms the connection pools and page caches, then interleaves the
+        # profiles so that disk and CPU noise is spread over all of them.
+        for profile, db in databases.items():
+            run_round(db, "warmup", args.writers, args.readers, 20, 100)
+        for round_index in range(args.repeat):
+            for profile, db in databases.items():
+                alone, _ = run_round(db, f"alone{round_index}", 1, 0, args.writes, 0)
+                shared, lookups = run_round(
+                    db, f"shared{round_index}", args.writers, args.readers, args.writes, args.reads
+                )
+                results[profile].append((alone, shared, lookups))
+        for profile, rounds in results.items():
+            alone, shared, lookups = (statistics.median(column) for column in zip(*rounds))
+            print(f"{profile:<10}{alone:>12.0f}{shared:>18.0f}{lookups:>12.0f}")
+        for db in databases.values():
+            db.engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+import argparse
+import multiprocessing
+import sys
+import time
+
+from module_validator import workers
+from module_validator.workers import close_borrowed, pack, release, unpack
+
+SIZES = (64 * 1024, 256 * 1024, 1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+
+
+def consume(payload) -> int:
+    """Stands in for a module that reads a large input (such as audio) and returns a small result."""
+    return len(payload)
+
+
+def serve_pickled(connection):
+    while (message := connection.recv()) is not None:
+        connection.send(consume(message))
+
+
+def serve_shared(connection):
+    """The message handling of workers._worker_main around consume."""
+    workers.SHARED_MEMORY_THRESHOLD = 0
+    while (message := connection.recv()) is not None:
+        borrowed = []
+        result = pack(consume(unpack(message, unlink=False, borrowed=borrowed)))
+        close_borrowed(borrowed)
+        connection.send(result)
+
+
+def round_trips(target, payload, iterations: int, shared: bool) -> float:
+    context = multiprocessing.get_context("spawn")
+    connection, child_connection = context.Pipe()
+    process = context.Process(target=target, args=(child_connection,), daemon=True)
+    process.start()
+    try:
+        # Waits for the child to start, so spawning is not measured.
+        connection.send(b"")
+        connection.recv()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            if shared:
+                message = pack(payload)
+                connection.send(message)
+                result = connection.recv()
+                release(message)
+                unpack(result)
+            else:
+                connection.send(payload)
+                connection.recv()
+        return (time.perf_counter() - start) / iterations
+    finally:
+        connection.send(None)
+        process.join()
+
+
+def payloads(size: int):
+    yield "str", "a" * size
+    try:
+        import numpy
+    except ImportError:
+        return
+    yield "ndarray", numpy.ones(size // 8)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Compare a worker round trip through shared memory with pickling over the Pipe."
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    # Measures every size through shared memory, to show where the threshold belongs.
+    workers.SHARED_MEMORY_THRESHOLD = 0
+
+    print(f"{'payload':<10}{'size':>10}{'pipe ms':>12}{'shared ms':>12}")
+    for size in SIZES:
+        for kind, payload in payloads(size):
+            pickled = round_trips(serve_pickled, payload, args.iterations, shared=False)
+            shared = round_trips(serve_shared, payload, args.iterations, shared=True)
+            print(f"{kind:<10}{size // 1024:>8}KiB{pickled * 1000:>12.3f}{shared * 1000:>12.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
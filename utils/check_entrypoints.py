@@ -1,4 +1,4 @@
-import pkg_resources
+from module_validator.entry_points import iter_entry_points
 
 
 def check_entry_points(package_name):
@@ -10,11 +10,8 @@ def check_entry_points(package_name):
     ]
     for group in groups:
         print(f"\nGroup: {group}")
-        for entry_point in pkg_resources.iter_entry_points(group):
-            if entry_point.dist.project_name == package_name:
-                print(
-                    f"  {entry_point.name} = {entry_point.module_name}:{entry_point.attrs[1]}"
-                )
+        for entry_point in iter_entry_points(group, dist=package_name):
+            print(f"  {entry_point.name} = {entry_point.value}")
 
 
 if __name__ == "__main__":
@@ -30,7 +30,7 @@ async def main(
 
     db = Database(config)
 
-    registry = ModuleRegistry(config, db)
+    registry = ModuleRegistry(config, db, lazy=True)
 
     registry.load_modules()
 